@@ -22,6 +22,8 @@ class Configuration:
     vision_model: str = "qwen-vl-max"
     analysis_model_provider: AnalysisModel = AnalysisModel.OPENAI
     analysis_model: str = "qwen3-32b"
+    # 分析模式：fast 一次结构化调用生成全部结果；thorough 分步调用（营养提取、依据生成、建议生成）
+    mode: str = "thorough"
 
     @classmethod
     def from_runnable_config(
@@ -0,0 +1,133 @@
+"""
+向量模型工具
+按 Settings 选择向量模型（OpenAI 或本地CPU句向量模型），外包一层按内容哈希的持久化向量缓存（本地磁盘或Redis），
+相同文本（如"米饭"、"鸡蛋"）只计算一次向量；每次调用记录耗时
+"""
+
+import re
+import time
+from functools import lru_cache
+from typing import List
+
+from dotenv import load_dotenv
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from shared.config.settings import settings
+
+# 各提供方未配置模型名时使用的默认模型
+DEFAULT_EMBEDDINGS_MODELS = {
+    "openai": "text-embedding-ada-002",
+    "local": "BAAI/bge-small-zh-v1.5",
+}
+
+
+def create_base_embeddings(provider: str, model_name: str = None) -> Embeddings:
+    """创建未加缓存的向量模型"""
+    model_name = model_name or DEFAULT_EMBEDDINGS_MODELS.get(provider)
+    match provider:
+        case "openai":
+            load_dotenv(".env", override=True)
+            return OpenAIEmbeddings(model=model_name)
+        case "local":
+            # 本地模型需安装可选依赖: pip install "dietai[local-embeddings]"
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+
+            return HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={"device": "cpu"},
+                encode_kwargs={"normalize_embeddings": True}
+            )
+        case _:
+            raise ValueError(f"Unsupported embeddings provider: {provider}")
+
+
+def create_embeddings_store(backend: str):
+    """创建向量缓存存储：local 为本地目录，redis 为共享Redis，none 不缓存"""
+    match backend:
+        case "local":
+            return LocalFileStore(settings.EMBEDDINGS_CACHE_PATH)
+        case "redis":
+            import redis
+            from langchain_community.storage import RedisStore
+
+            # 与其他Redis客户端使用相同的主机、端口、库与密码（redis_url 默认值不含这些配置）；
+            # 缓存值为序列化后的字节，不解码响应
+            client = redis.Redis(
+                host=settings.redis_host,
+                port=settings.redis_port,
+                db=settings.redis_db,
+                password=settings.redis_password
+            )
+            return RedisStore(
+                client=client,
+                ttl=settings.EMBEDDINGS_CACHE_TTL or None,
+                namespace="embeddings"
+            )
+        case "none":
+            return None
+        case _:
+            raise ValueError(f"Unsupported embeddings cache: {backend}")
+
+
+class TimedEmbeddings(Embeddings):
+    """记录每次调用耗时与累计统计的向量模型包装"""
+
+    def __init__(self, embeddings: Embeddings, name: str):
+        self.embeddings = embeddings
+        self.name = name
+        self.calls = 0
+        self.texts = 0
+        self.total_seconds = 0.0
+
+    def _record(self, method: str, count: int, start: float):
+        elapsed = time.perf_counter() - start
+        self.calls += 1
+        self.texts += count
+        self.total_seconds += elapsed
+        print(f"Embedding {self.name} {method}: {count}条, 耗时{elapsed * 1000:.1f}ms")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        try:
+            return self.embeddings.embed_documents(texts)
+        finally:
+            self._record("embed_documents", len(texts), start)
+
+    def embed_query(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        try:
+            return self.embeddings.embed_query(text)
+        finally:
+            self._record("embed_query", 1, start)
+
+    def stats(self) -> dict:
+        """累计调用统计"""
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "texts": self.texts,
+            "avg_ms": round(self.total_seconds / self.calls * 1000, 3) if self.calls else 0,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> TimedEmbeddings:
+    """获取按配置创建并加缓存的向量模型（进程内复用）"""
+    provider = settings.EMBEDDINGS_PROVIDER
+    model_name = settings.EMBEDDINGS_MODEL or DEFAULT_EMBEDDINGS_MODELS.get(provider)
+    embeddings = create_base_embeddings(provider, model_name)
+    # 缓存按提供方与模型区分命名空间，切换模型后不会读到其他模型的向量（本地目录只允许部分字符）
+    namespace = re.sub(r"[^a-zA-Z0-9_.\-/]", "_", f"{provider}/{model_name}/")
+    store = create_embeddings_store(settings.EMBEDDINGS_CACHE)
+    if store is not None:
+        embeddings = CacheBackedEmbeddings.from_bytes_store(
+            embeddings,
+            store,
+            namespace=namespace,
+            query_embedding_cache=True,
+            key_encoder="sha256"
+        )
+    return TimedEmbeddings(embeddings, f"{provider}:{model_name}")
@@ -1,7 +1,15 @@
 import base64
 
+import aiofiles
+
 
 def encode_image_to_base64(image_path: str) -> str:
     """将图片文件编码为base64字符串"""
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode("utf-8")
+
+
+async def aencode_image_to_base64(image_path: str) -> str:
+    """将图片文件编码为base64字符串（异步读取文件，不阻塞事件循环）"""
+    async with aiofiles.open(image_path, "rb") as image_file:
+        return base64.b64encode(await image_file.read()).decode("utf-8")
@@ -0,0 +1,167 @@
+"""
+营养知识检索结果缓存
+缓存键由规范化的查询标识生成（食物项目去重排序、数值分档），带命名空间与向量集合版本，
+重新导入知识库后版本递增，旧缓存不再命中；可选按查询向量的余弦相似度复用近似查询的结果
+"""
+
+import base64
+import json
+import re
+import time
+import unicodedata
+from typing import Iterable, List, Optional
+
+import numpy as np
+from redis.asyncio import Redis as AsyncRedis
+
+from shared.config.settings import get_settings
+from shared.utils.hashing import json_fingerprint
+
+settings = get_settings()
+
+RAG_CACHE_PREFIX = "rag:retrieval"
+
+# 数值分档宽度：热量按100大卡，宏量营养素按10克
+CALORIE_BUCKET = 100
+MACRO_BUCKET = 10
+
+_PUNCTUATION = re.compile(r"[\s\W_]+", re.UNICODE)
+
+# 图片分析输出中列出食物名称的行（由图片分析提示词要求模型输出），如"食物清单：米饭、红烧肉"
+FOOD_LIST_LABEL = "食物清单"
+_FOOD_LIST_SEPARATORS = re.compile(r"[、,;/|]+")
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：全角转半角、小写、去除空白与标点"""
+    return _PUNCTUATION.sub("", unicodedata.normalize("NFKC", text or "").lower())
+
+
+def bucket(value: Optional[float], width: float) -> Optional[int]:
+    """数值分档，相近的估算值落在同一档"""
+    return None if value is None else int(round(float(value) / width))
+
+
+def food_items_identity(food_items: Iterable[str], total_calories: float = None, macronutrients=None) -> dict:
+    """由食物项目集合（规范化、去重、排序）与分档后的热量、宏量营养素构成的查询标识"""
+    identity = {"items": sorted({normalize_text(item) for item in food_items if normalize_text(item)})}
+    if total_calories is not None:
+        identity["calories"] = bucket(total_calories, CALORIE_BUCKET)
+    if macronutrients is not None:
+        values = macronutrients.model_dump() if hasattr(macronutrients, "model_dump") else dict(macronutrients)
+        identity["macros"] = {name: bucket(value, MACRO_BUCKET) for name, value in sorted(values.items())}
+    return identity
+
+
+def parse_food_names(image_analysis: str) -> List[str]:
+    """从图片分析文本的食物清单行解析食物名称（去除Markdown标记与括号中的说明），没有该行时返回空列表"""
+    for line in unicodedata.normalize("NFKC", image_analysis or "").splitlines():
+        line = line.strip().strip("*#- ")
+        if not line.startswith(FOOD_LIST_LABEL):
+            continue
+        names = line[len(FOOD_LIST_LABEL):].lstrip("*: ")
+        names = re.sub(r"\([^)]*\)", "", names).rstrip("。.")
+        return [name.strip("* ") for name in _FOOD_LIST_SEPARATORS.split(names) if name.strip("* ")]
+    return []
+
+
+def text_identity(text: str) -> dict:
+    """自由文本查询的标识"""
+    return {"text": normalize_text(text)}
+
+
+def collection_version_key(collection_name: str = None) -> str:
+    return f"rag:collection_version:{collection_name or settings.VECTOR_COLLECTION_NAME}"
+
+
+async def get_collection_version(redis_client: AsyncRedis, collection_name: str = None) -> str:
+    """获取向量集合版本，不存在时以当前毫秒时间戳初始化（计数器丢失后不会与旧版本号重复）"""
+    key = collection_version_key(collection_name)
+    version = await redis_client.get(key)
+    if version is None:
+        await redis_client.set(key, int(time.time() * 1000), nx=True)
+        version = await redis_client.get(key)
+    return str(version)
+
+
+async def bump_collection_version(redis_client: AsyncRedis, collection_name: str = None) -> int:
+    """递增向量集合版本（重新导入知识库后调用），该集合的检索缓存随之失效"""
+    key = collection_version_key(collection_name)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.set(key, int(time.time() * 1000), nx=True)
+        pipe.incr(key)
+        return (await pipe.execute())[1]
+
+
+def _encode_vector(vector: List[float]) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _decode_vector(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+class RetrievalCache:
+    """单个向量集合版本下的检索结果缓存"""
+
+    def __init__(self, redis_client: AsyncRedis, version: str, collection_name: str = None, variant: str = None):
+        self.redis = redis_client
+        self.namespace = f"{RAG_CACHE_PREFIX}:{collection_name or settings.VECTOR_COLLECTION_NAME}:{version}"
+        if variant:
+            self.namespace = f"{self.namespace}:{variant}"
+
+    @classmethod
+    async def open(cls, redis_client: AsyncRedis, collection_name: str = None, variant: str = None) -> "RetrievalCache":
+        """按向量集合的当前版本创建缓存，variant 区分检索方式"""
+        version = await get_collection_version(redis_client, collection_name)
+        return cls(redis_client, version, collection_name, variant)
+
+    def key(self, identity: dict, k: int) -> str:
+        return f"{self.namespace}:k{k}:{json_fingerprint(identity)}"
+
+    @property
+    def vectors_key(self) -> str:
+        return f"{self.namespace}:vectors"
+
+    async def get(self, identity: dict, k: int) -> Optional[List[str]]:
+        """按查询标识精确查找"""
+        cached = await self.redis.get(self.key(identity, k))
+        return json.loads(cached) if cached else None
+
+    async def find_similar(self, embedding: List[float], k: int) -> Optional[List[str]]:
+        """在最近缓存的查询向量中查找余弦相似度不低于阈值的查询，返回其结果"""
+        threshold = settings.rag_cache_similarity_threshold
+        if threshold <= 0:
+            return None
+        entries = [json.loads(entry) for entry in await self.redis.lrange(self.vectors_key, 0, -1)]
+        entries = [entry for entry in entries if entry["k"] == k]
+        if not entries:
+            return None
+
+        query = np.asarray(embedding, dtype=np.float32)
+        # 切换向量模型后维度可能不同，只比较同维度的向量
+        pairs = [(entry, _decode_vector(entry["vector"])) for entry in entries]
+        pairs = [(entry, vector) for entry, vector in pairs if len(vector) == len(query)]
+        if not pairs:
+            return None
+        entries = [entry for entry, _ in pairs]
+        matrix = np.stack([vector for _, vector in pairs])
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        similarities = np.divide(matrix @ query, norms, out=np.zeros(len(entries)), where=norms > 0)
+        best = int(np.argmax(similarities))
+        if similarities[best] < threshold:
+            return None
+        cached = await self.redis.get(entries[best]["key"])
+        return json.loads(cached) if cached else None
+
+    async def set(self, identity: dict, k: int, contents: List[str], embedding: List[float] = None):
+        """写入检索结果；提供查询向量时登记到近似查询列表（保留最近的若干条）"""
+        key = self.key(identity, k)
+        ttl = settings.rag_cache_ttl
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, json.dumps(contents, ensure_ascii=False), ex=ttl)
+            if embedding is not None and settings.rag_cache_similarity_threshold > 0:
+                pipe.lpush(self.vectors_key, json.dumps({"key": key, "k": k, "vector": _encode_vector(embedding)}))
+                pipe.ltrim(self.vectors_key, 0, settings.rag_cache_similarity_max_entries - 1)
+                pipe.expire(self.vectors_key, ttl)
+            await pipe.execute()
@@ -0,0 +1,278 @@
+"""
+混合检索
+向量检索与BM25关键词检索（中文按单字与双字切分，字母数字按整词）的结果按倒数排名融合(RRF)，
+再由本地重排序（查询词覆盖率，或可选的交叉编码器）选出前 k 条；
+BM25倒排索引在知识库导入时构建，按CSR数组序列化到向量存储目录，加载时以内存映射方式读取
+"""
+
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+
+from agents.common_utils.rag_utils import SearchHit, search_by_vectors
+from shared.config.settings import settings
+
+_TOKEN = re.compile(r"[㐀-鿿]+|[a-z0-9]+(?:\.[0-9]+)?")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# RRF常数：排名靠后的结果贡献迅速减小，同时避免头部结果权重过大
+RRF_K = 60
+
+BM25_FILES = ("indptr", "postings", "tf", "doc_len")
+
+
+def tokenize(text: str) -> List[str]:
+    """切分检索词：中文连续片段取单字与相邻双字，字母与数字取整词"""
+    tokens = []
+    for piece in _TOKEN.findall(unicodedata.normalize("NFKC", text or "").lower()):
+        if piece[0].isascii():
+            tokens.append(piece)
+            continue
+        tokens.extend(piece)
+        tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+    return tokens
+
+
+class BM25Index:
+    """BM25倒排索引：词项的倒排列表以CSR格式存放（indptr 为各词项在 postings/tf 中的起止位置）"""
+
+    def __init__(self, ids: List[str], vocab: Dict[str, int], indptr: np.ndarray, postings: np.ndarray,
+                 tf: np.ndarray, doc_len: np.ndarray):
+        self.ids = ids
+        self.vocab = vocab
+        self.indptr = indptr
+        self.postings = postings
+        self.tf = tf
+        self.doc_len = doc_len
+        self.avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+
+    @classmethod
+    def build(cls, ids: Sequence[str], documents: Sequence[str]) -> "BM25Index":
+        """由文档构建索引"""
+        counts = [Counter(tokenize(document)) for document in documents]
+        vocab = {term: i for i, term in enumerate(sorted({term for count in counts for term in count}))}
+        postings = [[] for _ in vocab]
+        for doc_index, count in enumerate(counts):
+            for term, frequency in count.items():
+                postings[vocab[term]].append((doc_index, frequency))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(entries) for entries in postings])
+        flat = [entry for entries in postings for entry in entries]
+        return cls(
+            list(ids),
+            vocab,
+            indptr,
+            np.array([doc_index for doc_index, _ in flat], dtype=np.int32),
+            np.array([frequency for _, frequency in flat], dtype=np.float32),
+            np.array([sum(count.values()) for count in counts], dtype=np.float32)
+        )
+
+    def save(self, path: str):
+        """
+        数组写为 .npy，文档ID与词表写入 meta.json；全部写入 path 同级的新目录后，
+        用 os.replace 把 path 原子替换为指向新目录的符号链接，读取方不会看到新旧文件混合的索引
+        旧目录随后删除（已内存映射的数组不受影响）
+        """
+        path = os.path.abspath(path)
+        parent, name = os.path.split(path)
+        os.makedirs(parent, exist_ok=True)
+        directory = tempfile.mkdtemp(prefix=f".{name}-", dir=parent)
+        for array_name in BM25_FILES:
+            np.save(os.path.join(directory, f"{array_name}.npy"), getattr(self, array_name))
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "vocab": self.vocab}, f, ensure_ascii=False)
+
+        link = f"{directory}.link"
+        os.symlink(os.path.basename(directory), link)
+        if os.path.isdir(path) and not os.path.islink(path):
+            # 早期版本的索引为普通目录，不能被符号链接替换
+            shutil.rmtree(path)
+        os.replace(link, path)
+        for entry in os.listdir(parent):
+            stale = os.path.join(parent, entry)
+            if entry.startswith(f".{name}-") and stale != directory and os.path.isdir(stale) \
+                    and not os.path.islink(stale):
+                shutil.rmtree(stale, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """加载索引，数组以只读内存映射方式打开"""
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in BM25_FILES}
+        return cls(meta["ids"], meta["vocab"], **arrays)
+
+    def idf(self, term: str) -> float:
+        term_index = self.vocab.get(term)
+        df = 0 if term_index is None else int(self.indptr[term_index + 1] - self.indptr[term_index])
+        return math.log(1 + (len(self.ids) - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: str) -> np.ndarray:
+        """查询对全部文档的BM25得分"""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term, query_frequency in Counter(tokenize(query)).items():
+            term_index = self.vocab.get(term)
+            if term_index is None:
+                continue
+            start, end = self.indptr[term_index], self.indptr[term_index + 1]
+            docs, tf = self.postings[start:end], self.tf[start:end]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[docs] / self.avgdl)
+            scores[docs] += query_frequency * self.idf(term) * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, k: int) -> List[tuple]:
+        """返回得分大于0的前 k 条 (文档ID, 得分)"""
+        scores = self.scores(query)
+        k = min(k, len(scores))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+def bm25_index_path() -> str:
+    return settings.RAG_BM25_INDEX_PATH or os.path.join(settings.VECTOR_STORE_PATH, "bm25")
+
+
+def build_bm25_index(vectorstore: Chroma) -> BM25Index:
+    """由向量集合中的全部文档重建BM25索引并保存（知识库导入后调用）"""
+    result = vectorstore._collection.get(include=["documents"])
+    index = BM25Index.build(result["ids"], result["documents"])
+    index.save(bm25_index_path())
+    return index
+
+
+def bm25_index_exists() -> bool:
+    return os.path.exists(os.path.join(bm25_index_path(), "meta.json"))
+
+
+@lru_cache(maxsize=1)
+def _load_bm25_index(directory: str, mtime: float) -> BM25Index:
+    return BM25Index.load(directory)
+
+
+def get_bm25_index() -> Optional[BM25Index]:
+    """
+    获取BM25索引（按索引的实际目录与修改时间复用，重新导入切换目录后自动重新加载）
+    索引只在知识库导入时构建，不存在或加载失败时返回None，检索只使用向量结果
+    """
+    try:
+        # 先解析符号链接，加载期间索引被切换也只读取同一个目录
+        directory = os.path.realpath(bm25_index_path())
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        return _load_bm25_index(directory, os.path.getmtime(meta_path))
+    except Exception as e:
+        print(f"BM25索引加载失败，仅使用向量检索: {e}")
+        return None
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], rrf_k: int = RRF_K) -> Dict[str, float]:
+    """倒数排名融合：每个排名列表中第 r 名（从1开始）贡献 1 / (rrf_k + r)，按得分从高到低返回"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return dict(sorted(scores.items(), key=lambda item: item[1], reverse=True))
+
+
+def coverage_scores(index: Optional[BM25Index], query: str, documents: Sequence[str]) -> List[float]:
+    """查询词覆盖率：文档包含的查询词的IDF之和占查询词IDF总和的比例（只计索引词表中的词，跨词的双字不计）"""
+    terms = set(tokenize(query))
+    if index is not None:
+        terms &= index.vocab.keys()
+    weights = {term: index.idf(term) if index is not None else 1.0 for term in terms}
+    total = sum(weights.values())
+    if not total:
+        return [0.0] * len(documents)
+    return [sum(weights[term] for term in terms & set(tokenize(document))) / total for document in documents]
+
+
+@lru_cache(maxsize=1)
+def get_cross_encoder(model_name: str):
+    """本地交叉编码器（需安装可选依赖: pip install "dietai[local-embeddings]"）"""
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(model_name, device="cpu")
+
+
+def rerank_scores(index: Optional[BM25Index], query: str, documents: Sequence[str]) -> List[float]:
+    """按 settings.RAG_RERANKER 计算 0~1 的相关性得分：overlap（查询词覆盖率）/ cross_encoder / none"""
+    match settings.RAG_RERANKER:
+        case "overlap":
+            return coverage_scores(index, query, documents)
+        case "cross_encoder":
+            logits = get_cross_encoder(settings.RAG_RERANKER_MODEL).predict([(query, document) for document in documents])
+            return [float(score) for score in 1 / (1 + np.exp(-np.asarray(logits, dtype=float)))]
+        case "none":
+            return [0.0] * len(documents)
+        case _:
+            raise ValueError(f"Unsupported reranker: {settings.RAG_RERANKER}")
+
+
+def fuse_and_rerank(index: Optional[BM25Index], query: str, vector_hits: Sequence[SearchHit],
+                    keyword_hits: Sequence[tuple], documents: Dict[str, Document], k: int) -> List[Document]:
+    """
+    融合向量与关键词排名，重排序后返回前 k 条
+    最终得分 = (1 - 权重) × 归一化RRF得分 + 权重 × 重排序得分；低于 RAG_RERANK_MIN_SCORE 的文档不返回
+    """
+    fused = reciprocal_rank_fusion([[hit.id for hit in vector_hits], [doc_id for doc_id, _ in keyword_hits]])
+    candidates = [doc_id for doc_id in fused if doc_id in documents]
+    if not candidates:
+        return []
+    best = max(fused[doc_id] for doc_id in candidates)
+    relevance = rerank_scores(index, query, [documents[doc_id].page_content for doc_id in candidates])
+    weight = settings.RAG_RERANK_WEIGHT
+    scored = [
+        ((1 - weight) * fused[doc_id] / best + weight * score, doc_id)
+        for doc_id, score in zip(candidates, relevance)
+    ]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [documents[doc_id] for score, doc_id in scored[:k] if score >= settings.RAG_RERANK_MIN_SCORE]
+
+
+def hybrid_search_by_vectors(vectorstore: Chroma, queries: Sequence[str], vectors: Sequence[List[float]],
+                             k: int) -> List[List[Document]]:
+    """
+    混合检索（查询向量已计算）：每个查询取 RAG_HYBRID_FETCH_K 条向量结果与关键词结果融合、重排序后返回前 k 条
+    向量检索为一次集合查询，关键词结果中缺少的文档一次批量读取；BM25索引不可用时只使用向量结果
+    """
+    fetch_k = max(settings.RAG_HYBRID_FETCH_K, k)
+    vector_hits_list = search_by_vectors(vectorstore, vectors, fetch_k)
+    index = get_bm25_index()
+    keyword_hits_list = [index.search(query, fetch_k) if index is not None else [] for query in queries]
+
+    documents = {hit.id: hit.document for hits in vector_hits_list for hit in hits}
+    missing = list(dict.fromkeys(
+        doc_id for hits in keyword_hits_list for doc_id, _ in hits if doc_id not in documents
+    ))
+    if missing:
+        result = vectorstore._collection.get(ids=missing, include=["documents", "metadatas"])
+        for doc_id, content, metadata in zip(result["ids"], result["documents"], result["metadatas"]):
+            documents[doc_id] = Document(page_content=content, metadata=metadata or {})
+
+    return [
+        fuse_and_rerank(index, query, vector_hits, keyword_hits, documents, k)
+        for query, vector_hits, keyword_hits in zip(queries, vector_hits_list, keyword_hits_list)
+    ]
+
+
+def retrieval_variant() -> str:
+    """检索方式标识，作为检索缓存命名空间的一部分，切换检索方式后不会读到旧结果"""
+    if not settings.RAG_HYBRID_SEARCH:
+        return "vector"
+    return f"hybrid-{settings.RAG_HYBRID_FETCH_K}-{settings.RAG_RERANKER}-{settings.RAG_RERANK_WEIGHT}-{settings.RAG_RERANK_MIN_SCORE}"
@@ -0,0 +1,258 @@
+"""
+营养知识库导入
+清洗OCR文本（去除逐字加空格的重复行与残片、合并被折断的段落），按段落带重叠切块，
+按规范化内容哈希去重后写入向量集合；清单记录每个源文件的哈希与块ID，重新导入时只计算新增块的向量、删除失效块，
+向量按批次并行计算；集合内容变化后重建BM25索引并递增集合版本，检索缓存随之失效
+
+用法: python -m agents.common_utils.rag_ingest docs/nutrition_knowledge.txt [--rebuild] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Sequence
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from agents.common_utils.embedding_utils import get_embeddings
+from agents.common_utils.rag_cache import bump_collection_version, normalize_text
+from agents.common_utils.rag_hybrid import bm25_index_exists, build_bm25_index
+from agents.common_utils.rag_utils import rag_loader
+from shared.config.settings import settings
+from shared.utils.hashing import content_hash
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# 句末标点（NFKC规范化后全角标点已转为半角）：行尾不是这些字符时视为段落被折行，与下一行合并
+_SENTENCE_END = tuple("。.!?;:)”\"")
+_CJK = re.compile(r"[㐀-鿿]")
+# 标题行：不含句末标点的短行
+HEADING_MAX_LENGTH = 20
+# 去除空白后不超过该长度且不以句末标点结尾的行视为OCR残片
+FRAGMENT_MAX_LENGTH = 2
+
+# 切块时优先在段落、句子处断开
+CHUNK_SEPARATORS = ["\n\n", "\n", "。", "!", "?", ";", ",", " ", ""]
+
+
+class Chunk(NamedTuple):
+    """待写入向量集合的文本块，id 为规范化内容的哈希"""
+    id: str
+    text: str
+    metadata: dict
+
+
+def is_spaced_line(line: str) -> bool:
+    """OCR逐字加空格的行（如"中 国 居 民 膳 食 指 南"）：中文行中多数词元为单个字符"""
+    tokens = line.split()
+    if len(tokens) < 2 or not _CJK.search(line):
+        return False
+    return sum(len(token) == 1 for token in tokens) / len(tokens) >= 0.5
+
+
+def clean_lines(text: str) -> Iterator[str]:
+    """规范化字符（全角转半角等）并去除项目符号（私用区字符）、逐字加空格的重复行与残片"""
+    for line in unicodedata.normalize("NFKC", text).splitlines():
+        line = "".join(char for char in line if unicodedata.category(char) != "Co").strip()
+        if not line or is_spaced_line(line):
+            continue
+        if len(re.sub(r"\s", "", line)) <= FRAGMENT_MAX_LENGTH and not line.endswith(_SENTENCE_END):
+            continue
+        # 中文之间残留的空格为排版产物
+        yield re.sub(r"(?<=[㐀-鿿])\s+(?=[㐀-鿿])", "", line)
+
+
+def split_sections(text: str) -> List[dict]:
+    """清洗文本并按标题分节，节内被折断的行合并为段落，返回 [{"heading", "text"}]"""
+    sections = [{"heading": "", "paragraphs": []}]
+    paragraph = ""
+    for line in clean_lines(text):
+        if not paragraph and len(line) <= HEADING_MAX_LENGTH and not line.endswith(_SENTENCE_END):
+            # 不含中文或以逗号结尾的短行为OCR重复行的残片（如"index,BMI),"）
+            if _CJK.search(line) and not line.endswith(","):
+                sections.append({"heading": line, "paragraphs": []})
+            continue
+        paragraph += line
+        if line.endswith(_SENTENCE_END):
+            sections[-1]["paragraphs"].append(paragraph)
+            paragraph = ""
+    if paragraph:
+        sections[-1]["paragraphs"].append(paragraph)
+    return [
+        {"heading": section["heading"], "text": "\n\n".join(section["paragraphs"])}
+        for section in sections if section["paragraphs"]
+    ]
+
+
+def chunk_text(text: str, source: str, chunk_size: int = None, chunk_overlap: int = None) -> List[Chunk]:
+    """清洗并按节切块（块前附节标题），同一文件内内容重复的块只保留一份"""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size or settings.RAG_CHUNK_SIZE,
+        chunk_overlap=settings.RAG_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
+        separators=CHUNK_SEPARATORS,
+        keep_separator="end"
+    )
+    chunks = {}
+    for section in split_sections(text):
+        for piece in splitter.split_text(section["text"]):
+            content = f"{section['heading']}\n{piece}" if section["heading"] else piece
+            chunk_id = content_hash(normalize_text(content).encode("utf-8"))
+            if chunk_id not in chunks:
+                chunks[chunk_id] = Chunk(chunk_id, content, {
+                    "source": source,
+                    "section": section["heading"],
+                    "chunk_index": len(chunks)
+                })
+    return list(chunks.values())
+
+
+def manifest_path() -> str:
+    return settings.RAG_INGEST_MANIFEST or os.path.join(settings.VECTOR_STORE_PATH, "ingest_manifest.json")
+
+
+def load_manifest() -> dict:
+    """读取导入清单，不存在或损坏时返回None"""
+    try:
+        with open(manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"导入清单读取失败: {e}")
+        return None
+
+
+def save_manifest(manifest: dict):
+    """原子写入导入清单"""
+    path = manifest_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def manifest_settings() -> dict:
+    """影响块ID或向量的配置，与清单记录不一致时需要重建集合"""
+    return {
+        "version": MANIFEST_VERSION,
+        "embeddings": get_embeddings().name,
+        "chunk_size": settings.RAG_CHUNK_SIZE,
+        "chunk_overlap": settings.RAG_CHUNK_OVERLAP,
+    }
+
+
+def embed_in_batches(texts: Sequence[str], batch_size: int, workers: int) -> Iterator[tuple]:
+    """按批次并行计算向量，按批次顺序逐批返回 (起始下标, 向量列表)"""
+    embeddings = get_embeddings()
+    starts = range(0, len(texts), batch_size)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [executor.submit(embeddings.embed_documents, list(texts[start:start + batch_size])) for start in starts]
+        for start, future in zip(starts, futures):
+            yield start, future.result()
+
+
+async def bump_version():
+    """递增集合版本使检索缓存失效；Redis不可用时只记录警告"""
+    from agents.common_utils.redis_util import close_redis_pool, get_redis_client
+
+    try:
+        version = await bump_collection_version(await get_redis_client())
+        logger.info(f"集合版本已更新: {version}")
+    except Exception as e:
+        logger.warning(f"集合版本更新失败，检索缓存需等待过期: {e}")
+    finally:
+        await close_redis_pool()
+
+
+def ingest(paths: Sequence[str], rebuild: bool = False, dry_run: bool = False) -> dict:
+    """
+    导入知识库文件，返回统计；paths 为完整的知识库文件列表，此前导入但不在列表中的文件的块会被删除
+    清单缺失或配置（向量模型、切块参数）变化时重建集合；否则只写入新增块、删除不再出现的块
+    """
+    start_time = time.perf_counter()
+    old_manifest = load_manifest()
+    current_settings = manifest_settings()
+    if old_manifest is None or old_manifest.get("settings") != current_settings:
+        # 无清单时集合中的内容来源未知，同样重建
+        rebuild = True
+    old_files: Dict[str, dict] = {} if rebuild else old_manifest.get("files", {})
+
+    files, chunks = {}, {}
+    for path in paths:
+        source = os.path.relpath(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        file_hash = content_hash(data)
+        previous = old_files.get(source)
+        if previous and previous["sha256"] == file_hash:
+            files[source] = previous
+            continue
+        file_chunks = chunk_text(data.decode("utf-8"), source)
+        files[source] = {"sha256": file_hash, "chunks": [chunk.id for chunk in file_chunks]}
+        # 不同文件中内容相同的块只写入一次
+        for chunk in file_chunks:
+            chunks.setdefault(chunk.id, chunk)
+
+    old_ids = {chunk_id for entry in old_files.values() for chunk_id in entry["chunks"]}
+    new_ids = {chunk_id for entry in files.values() for chunk_id in entry["chunks"]}
+    to_add = [chunk for chunk_id, chunk in chunks.items() if chunk_id not in old_ids]
+    to_delete = sorted(old_ids - new_ids)
+    stats = {
+        "files": len(files),
+        "chunks": len(new_ids),
+        "added": len(to_add),
+        "deleted": len(to_delete),
+        "rebuild": rebuild,
+    }
+    if dry_run:
+        return stats
+
+    vectorstore = rag_loader()
+    if rebuild:
+        vectorstore.reset_collection()
+    collection = vectorstore._collection
+    if to_delete:
+        collection.delete(ids=to_delete)
+    for start, vectors in embed_in_batches([chunk.text for chunk in to_add], settings.RAG_INGEST_BATCH_SIZE,
+                                           settings.RAG_INGEST_WORKERS):
+        batch = to_add[start:start + len(vectors)]
+        collection.upsert(
+            ids=[chunk.id for chunk in batch],
+            embeddings=vectors,
+            documents=[chunk.text for chunk in batch],
+            metadatas=[chunk.metadata for chunk in batch]
+        )
+
+    # 检索时不再构建BM25索引，集合未变化但索引缺失时（如早期导入的集合）同样构建
+    if rebuild or to_add or to_delete or not bm25_index_exists():
+        build_bm25_index(vectorstore)
+        asyncio.run(bump_version())
+    # 清单最后写入：中途失败时下次导入按旧清单重新计算差异（写入为 upsert，可重复执行）
+    save_manifest({"settings": current_settings, "files": files})
+    stats["seconds"] = round(time.perf_counter() - start_time, 2)
+    stats["embeddings"] = get_embeddings().stats()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="营养知识库导入：清洗、切块、去重并增量写入向量集合")
+    parser.add_argument("paths", nargs="+", help="知识库文本文件（UTF-8）")
+    parser.add_argument("--rebuild", action="store_true", help="清空集合后全部重新导入")
+    parser.add_argument("--dry-run", action="store_true", help="只统计新增与删除的块，不写入")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    stats = ingest(args.paths, rebuild=args.rebuild, dry_run=args.dry_run)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
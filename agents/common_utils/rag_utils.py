@@ -1,8 +1,12 @@
 import os
 from functools import lru_cache
+from typing import List, NamedTuple, Optional, Sequence
 
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+from agents.common_utils.embedding_utils import get_embeddings
 from shared.config.settings import settings
 # from langchain_community.embeddings import OpenAIEmbeddings
 
@@ -10,10 +14,88 @@ from shared.config.settings import settings
 @lru_cache(maxsize=1)
 def rag_loader():
     persist_directory = settings.VECTOR_STORE_PATH
-    embeddings = OpenAIEmbeddings()  # 这里后期可以根据 settings.EMBEDDINGS_MODEL 切换
+    embeddings = get_embeddings()  # 按 settings.EMBEDDINGS_PROVIDER / EMBEDDINGS_MODEL 选择，带持久化向量缓存
     vector_store = Chroma(
         collection_name=settings.VECTOR_COLLECTION_NAME,
         embedding_function=embeddings,
         persist_directory=persist_directory
     )
     return vector_store
+
+
+class SearchHit(NamedTuple):
+    """向量检索命中的文档"""
+    id: str
+    document: Document
+    distance: float
+    embedding: Optional[np.ndarray] = None
+
+
+def embed_queries(vectorstore: Chroma, queries: Sequence[str]) -> List[List[float]]:
+    """一次 embed_documents 调用计算全部查询向量"""
+    if not queries:
+        return []
+    return vectorstore.embeddings.embed_documents(list(queries))
+
+
+def search_by_vectors(vectorstore: Chroma, vectors: Sequence[List[float]], k: int,
+                      with_embeddings: bool = False) -> List[List[SearchHit]]:
+    """一次集合查询检索全部查询向量，返回每个查询的前 k 条命中"""
+    if not vectors:
+        return []
+    include = ["documents", "metadatas", "distances"] + (["embeddings"] if with_embeddings else [])
+    result = vectorstore._collection.query(query_embeddings=list(vectors), n_results=k, include=include)
+    hits = []
+    for i in range(len(vectors)):
+        embeddings = result.get("embeddings")
+        hits.append([
+            SearchHit(
+                id=doc_id,
+                document=Document(page_content=result["documents"][i][j], metadata=result["metadatas"][i][j] or {}),
+                distance=result["distances"][i][j],
+                embedding=np.asarray(embeddings[i][j]) if with_embeddings and embeddings is not None else None
+            )
+            for j, doc_id in enumerate(result["ids"][i])
+        ])
+    return hits
+
+
+def dedupe_hits(hits_list: Sequence[Sequence[SearchHit]]) -> List[SearchHit]:
+    """合并多个查询的命中，按查询顺序与排名保留每个文档的首次出现"""
+    seen = set()
+    merged = []
+    for hits in hits_list:
+        for hit in hits:
+            if hit.id not in seen:
+                seen.add(hit.id)
+                merged.append(hit)
+    return merged
+
+
+def mmr_merge(query_vectors: Sequence[List[float]], hits_list: Sequence[Sequence[SearchHit]], k: int,
+              lambda_mult: float = 0.5) -> List[SearchHit]:
+    """以各查询向量的均值为目标，对去重后的全部命中做最大边际相关性(MMR)选择，需 with_embeddings=True 的命中"""
+    candidates = dedupe_hits(hits_list)
+    if not candidates:
+        return []
+    query = np.mean([np.asarray(vector) / (np.linalg.norm(vector) or 1) for vector in query_vectors], axis=0)
+    selected = maximal_marginal_relevance(query, [hit.embedding for hit in candidates], lambda_mult=lambda_mult, k=k)
+    return [candidates[i] for i in selected]
+
+
+def batch_similarity_search(queries: Sequence[str], k: int = 2, merge: str = None, fetch_k: int = None,
+                            lambda_mult: float = 0.5, vectorstore: Chroma = None):
+    """
+    批量检索：一次计算全部查询向量，一次查询向量库
+    merge 为空时返回每个查询的前 k 条文档；为 "dedupe" 时返回合并去重后的文档；
+    为 "mmr" 时每个查询取 fetch_k 条候选，合并后按 MMR 选出 k 条
+    """
+    vectorstore = vectorstore or rag_loader()
+    vectors = embed_queries(vectorstore, queries)
+    if merge == "mmr":
+        hits_list = search_by_vectors(vectorstore, vectors, fetch_k or k * 2, with_embeddings=True)
+        return [hit.document for hit in mmr_merge(vectors, hits_list, k, lambda_mult)]
+    hits_list = search_by_vectors(vectorstore, vectors, k)
+    if merge == "dedupe":
+        return [hit.document for hit in dedupe_hits(hits_list)]
+    return [[hit.document for hit in hits] for hits in hits_list]
@@ -1,14 +1,94 @@
-from redis.asyncio import Redis as AsyncRedis
+import asyncio
+import time
+from typing import Optional
+
+from redis.asyncio import Redis as AsyncRedis, BlockingConnectionPool
 from shared.config.settings import get_settings
 
 settings = get_settings()
 
 
-async def get_redis_client():
-    return await AsyncRedis(
-        host=settings.redis_host,
-        port=settings.redis_port,
-        db=settings.redis_db,
-        decode_responses=True,
-        password=settings.redis_password)
+class InstrumentedConnectionPool(BlockingConnectionPool):
+    """记录获取连接等待时间的阻塞连接池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.acquire_errors = 0
+
+    async def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().get_connection(*args, **kwargs)
+        except Exception:
+            self.acquire_errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.wait_count += 1
+            self.wait_total += elapsed
+            self.wait_max = max(self.wait_max, elapsed)
+
+    def stats(self) -> dict:
+        """连接池统计：使用中、空闲连接数与等待时间"""
+        in_use = len(getattr(self, "_in_use_connections", ()))
+        idle = len(getattr(self, "_available_connections", ()))
+        return {
+            "max_connections": self.max_connections,
+            "in_use": in_use,
+            "idle": idle,
+            "created": in_use + idle,
+            "wait_count": self.wait_count,
+            "wait_avg_ms": round(self.wait_total / self.wait_count * 1000, 3) if self.wait_count else 0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "acquire_errors": self.acquire_errors
+        }
+
+
+_pool: Optional[InstrumentedConnectionPool] = None
+_client: Optional[AsyncRedis] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+async def get_redis_client() -> AsyncRedis:
+    """获取共享的异步Redis客户端（首次调用时创建连接池，进程内复用）"""
+    global _pool, _client, _loop
+    loop = asyncio.get_running_loop()
+    # 连接绑定事件循环；在新的循环中使用时重新创建
+    if _client is None or _loop is not loop:
+        _pool = InstrumentedConnectionPool(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            password=settings.redis_password,
+            decode_responses=True,
+            max_connections=settings.agent_redis_max_connections,
+            timeout=settings.agent_redis_pool_timeout,
+            health_check_interval=settings.agent_redis_health_check_interval,
+            socket_keepalive=True
+        )
+        _client = AsyncRedis(connection_pool=_pool)
+        _loop = loop
+    return _client
+
+
+def get_redis_pool_stats() -> dict:
+    """获取连接池统计，未初始化时返回空字典"""
+    return _pool.stats() if _pool is not None else {}
+
+
+async def close_redis_pool():
+    """关闭共享连接池（LangGraph服务关闭时由 agents.webapp 的 lifespan 调用）"""
+    global _pool, _client, _loop
+    if _client is not None:
+        try:
+            await _client.aclose()
+            await _pool.disconnect()
+        except Exception as e:
+            print(f"Redis pool close error: {e}")
+    _pool = None
+    _client = None
+    _loop = None
 
@@ -3,29 +3,55 @@ from langgraph.graph import StateGraph, END
 from agents.nutrition_agent.utils.nodes import *
 from agents.nutrition_agent.utils.states import AgentState, InputState, OutputState
 
-workflow = StateGraph(
-    state_schema=AgentState,
-    config_schema=Configuration,
-    input_schema=InputState,
-    output_schema=OutputState
-)
 
-workflow.add_node("state_init", state_init)
-# 添加节点
-workflow.add_node("analyze_image", analyze_image)
-workflow.add_node("extract_nutrition", extract_nutrition_info)
-workflow.add_node("retrieve_nutrition_knowledge", retrieve_nutrition_knowledge)
-workflow.add_node("generate_advice", generate_nutrition_advice)
-workflow.add_node("format_response", format_final_response)
-workflow.add_node("generate_dependencies", generate_dependencies)
+def build_workflow(parallel: bool = True) -> StateGraph:
+    """
+    构建营养分析工作流
+    parallel=True 时：图片分析与偏好整理并行；营养提取与"知识检索+依据生成"分支并行，在生成建议前汇合
+    快速模式(mode=fast)：检索完成后一次调用生成营养分析、依据与建议，跳过分步的三次结构化调用
+    parallel=False 时为原有的线性链路，仅用于基准对比
+    """
+    workflow = StateGraph(
+        state_schema=AgentState,
+        config_schema=Configuration,
+        input_schema=InputState,
+        output_schema=OutputState
+    )
 
-# 定义工作流
-workflow.set_entry_point("state_init")
-workflow.add_edge("state_init", "analyze_image")
-workflow.add_edge("analyze_image", "extract_nutrition")
-workflow.add_edge("extract_nutrition", "retrieve_nutrition_knowledge")
-workflow.add_edge("retrieve_nutrition_knowledge", "generate_dependencies")
-workflow.add_edge("generate_dependencies", "generate_advice")
-workflow.add_edge("generate_advice", "format_response")
-workflow.add_edge("format_response", END)
-graph = workflow.compile()
+    workflow.add_node("state_init", state_init)
+    # 添加节点
+    workflow.add_node("analyze_image", analyze_image)
+    workflow.add_node("summarize_preferences", summarize_preferences)
+    workflow.add_node("extract_nutrition", extract_nutrition_info)
+    workflow.add_node("generate_advice", generate_nutrition_advice)
+    workflow.add_node("format_response", format_final_response)
+
+    # 定义工作流
+    workflow.set_entry_point("state_init")
+    if parallel:
+        # 检索与依据生成合并为一个分支，避免按超步同步时等待营养提取
+        workflow.add_node("prepare_advice_dependencies", prepare_advice_dependencies)
+        workflow.add_node("generate_nutrition_report", generate_nutrition_report)
+        workflow.add_edge("state_init", "analyze_image")
+        workflow.add_edge("state_init", "summarize_preferences")
+        workflow.add_conditional_edges("analyze_image", route_after_image, ["extract_nutrition"])
+        workflow.add_edge(["analyze_image", "summarize_preferences"], "prepare_advice_dependencies")
+        workflow.add_conditional_edges("prepare_advice_dependencies", route_after_dependencies, ["generate_nutrition_report"])
+        # 分步模式：营养提取与依据分支汇合后生成建议；快速模式不经过营养提取，不会触发该汇合
+        workflow.add_edge(["extract_nutrition", "prepare_advice_dependencies"], "generate_advice")
+        workflow.add_edge("generate_nutrition_report", "format_response")
+    else:
+        workflow.add_node("retrieve_nutrition_knowledge", retrieve_nutrition_knowledge)
+        workflow.add_node("generate_dependencies", generate_dependencies)
+        workflow.add_edge("state_init", "summarize_preferences")
+        workflow.add_edge("summarize_preferences", "analyze_image")
+        workflow.add_edge("analyze_image", "extract_nutrition")
+        workflow.add_edge("extract_nutrition", "retrieve_nutrition_knowledge")
+        workflow.add_edge("retrieve_nutrition_knowledge", "generate_dependencies")
+        workflow.add_edge("generate_dependencies", "generate_advice")
+    workflow.add_edge("generate_advice", "format_response")
+    workflow.add_edge("format_response", END)
+    return workflow
+
+
+graph = build_workflow().compile()
@@ -0,0 +1,233 @@
+"""
+营养分析 Agent 基准测试
+使用带固定延迟的桩模型与桩向量库，对比线性链路、并行链路与快速模式的端到端耗时，不产生真实的模型调用
+
+用法: python -m agents.nutrition_agent.benchmark --runs 5 --llm-delay 1.0 --vision-delay 2.0 --retrieval-delay 0.5
+--concurrency N 时每轮同时发起 N 个分析，耗时为整轮的墙钟时间，用于验证单进程下的并发能力
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from unittest.mock import patch
+
+from langchain.schema import Document
+from langchain_core.messages import AIMessage
+
+from agents.common_utils.rag_hybrid import BM25Index
+from agents.nutrition_agent.agent import build_workflow
+from agents.nutrition_agent.utils.sturcts import NutritionAnalysis, NutritionAdvice, AdviceDependencies, NutritionReport
+from shared.config.settings import settings
+
+NODES_MODULE = "agents.nutrition_agent.utils.nodes"
+HYBRID_MODULE = "agents.common_utils.rag_hybrid"
+
+SAMPLE_OUTPUTS = {
+    NutritionAnalysis: NutritionAnalysis(
+        food_items=["米饭", "清炒西兰花"],
+        total_calories=420,
+        macronutrients={"protein": 12, "fat": 8, "carbohydrates": 75, "dietary_fiber": 5, "sugar": 3},
+        vitamins_minerals={
+            "vitamin_a": 0.1, "vitamin_c": 60, "vitamin_d": 0, "calcium": 80,
+            "iron": 2, "sodium": 400, "potassium": 500, "cholesterol": 0
+        },
+        health_level=4
+    ),
+    AdviceDependencies: AdviceDependencies(
+        nutrition_facts=["西兰花富含维生素C"],
+        health_guidelines=["每餐搭配蔬菜"],
+        food_interactions=["无"]
+    ),
+    NutritionAdvice: NutritionAdvice(
+        recommendations=["适当增加蛋白质"],
+        dietary_tips=["少油烹饪"],
+        warnings=["注意控制主食分量"],
+        alternative_foods=["糙米饭"]
+    )
+}
+SAMPLE_OUTPUTS[NutritionReport] = NutritionReport(
+    nutrition_analysis=SAMPLE_OUTPUTS[NutritionAnalysis],
+    advice_dependencies=SAMPLE_OUTPUTS[AdviceDependencies],
+    nutrition_advice=SAMPLE_OUTPUTS[NutritionAdvice]
+)
+
+SAMPLE_PREFERENCES = {
+    "dietary_restrictions": [{"allergen_name": "花生", "severity_level": 2}],
+    "health_goals": [{"goal_type": 1, "target_weight": 60, "current_status": 1}],
+    "language": "zh-CN"
+}
+
+
+class StubStructuredModel:
+    """桩结构化输出模型"""
+
+    def __init__(self, schema, delay: float):
+        self.schema = schema
+        self.delay = delay
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        return SAMPLE_OUTPUTS[self.schema]
+
+    def invoke(self, prompt, *args, **kwargs):
+        time.sleep(self.delay)
+        return SAMPLE_OUTPUTS[self.schema]
+
+
+class StubChatModel:
+    """桩聊天模型"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        return AIMessage(content="一碗白米饭（约200克）和一份清炒西兰花（约150克）")
+
+    def invoke(self, messages, *args, **kwargs):
+        time.sleep(self.delay)
+        return AIMessage(content="一碗白米饭（约200克）和一份清炒西兰花（约150克）")
+
+    def with_structured_output(self, schema, *args, **kwargs):
+        return StubStructuredModel(schema, self.delay)
+
+
+class StubEmbeddings:
+    """桩向量模型：一次调用计算一批查询向量"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def embed_documents(self, texts):
+        time.sleep(self.delay)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class StubCollection:
+    """桩向量集合：一次查询检索全部查询向量"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def query(self, query_embeddings, n_results, include):
+        time.sleep(self.delay)
+        ids = [[f"{i}-{j}" for j in range(n_results)] for i in range(len(query_embeddings))]
+        return {
+            "ids": ids,
+            "documents": [[f"相关营养知识{doc_id}" for doc_id in row] for row in ids],
+            "metadatas": [[{} for _ in row] for row in ids],
+            "distances": [[0.0 for _ in row] for row in ids],
+        }
+
+    def get(self, ids, include):
+        return {"ids": ids, "documents": [f"相关营养知识{doc_id}" for doc_id in ids], "metadatas": [{} for _ in ids]}
+
+
+class StubVectorStore:
+    """桩向量库"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.embeddings = StubEmbeddings(delay)
+        self._collection = StubCollection(delay)
+
+    def similarity_search(self, query: str, k: int = 2):
+        time.sleep(self.delay)
+        return [Document(page_content=f"{query} 相关营养知识{i}") for i in range(k)]
+
+
+class StubPipeline:
+    """桩管道：命令不执行"""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        return [True, 1]
+
+
+class StubRedis:
+    """不命中的桩缓存"""
+
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, *args, **kwargs):
+        return True
+
+    async def lrange(self, key, start, end):
+        return []
+
+    def pipeline(self, *args, **kwargs):
+        return StubPipeline()
+
+    async def aclose(self):
+        return None
+
+
+async def measure(parallel: bool, mode: str, runs: int, vision_delay: float, llm_delay: float,
+                  retrieval_delay: float, concurrency: int = 1) -> list:
+    """运行若干次并返回每次耗时(秒)"""
+    models = {"vision": StubChatModel(vision_delay), "analysis": StubChatModel(llm_delay)}
+    vector_store = StubVectorStore(retrieval_delay)
+    # 内存中的BM25索引，不读写磁盘
+    doc_ids = [f"{i}-{j}" for i in range(2) for j in range(settings.RAG_HYBRID_FETCH_K)]
+    bm25_index = BM25Index.build(doc_ids, [f"相关营养知识{doc_id}" for doc_id in doc_ids])
+
+    async def stub_redis_client():
+        return StubRedis()
+
+    def stub_get_model(model_provider, model_name):
+        return models["vision"] if "vl" in model_name or "4.1" in model_name else models["analysis"]
+
+    graph = build_workflow(parallel=parallel).compile()
+    config = {"configurable": {"vision_model": "qwen-vl-max", "analysis_model": "qwen3-32b", "mode": mode}}
+    timings = []
+    with patch(f"{NODES_MODULE}.get_model", stub_get_model), \
+            patch(f"{NODES_MODULE}.rag_loader", lambda: vector_store), \
+            patch(f"{NODES_MODULE}.get_redis_client", stub_redis_client), \
+            patch(f"{HYBRID_MODULE}.get_bm25_index", lambda: bm25_index):
+        for _ in range(runs):
+            start = time.perf_counter()
+            results = await asyncio.gather(*[
+                graph.ainvoke({"image_data": "stub", "user_preferences": SAMPLE_PREFERENCES}, config)
+                for _ in range(concurrency)
+            ])
+            timings.append(time.perf_counter() - start)
+            for result in results:
+                if result.get("current_step") != "completed":
+                    raise RuntimeError(f"基准运行未完成: {result}")
+    return timings
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="营养分析 Agent 线性/并行/快速模式耗时对比")
+    parser.add_argument("--runs", type=int, default=5, help="每种链路运行次数")
+    parser.add_argument("--vision-delay", type=float, default=2.0, help="视觉模型单次调用延迟(秒)")
+    parser.add_argument("--llm-delay", type=float, default=1.0, help="分析模型单次调用延迟(秒)")
+    parser.add_argument("--retrieval-delay", type=float, default=0.5, help="单次向量检索延迟(秒)")
+    parser.add_argument("--concurrency", type=int, default=1, help="每轮同时发起的分析数")
+    args = parser.parse_args()
+
+    results = {}
+    for name, parallel, mode in (("linear", False, "thorough"), ("parallel", True, "thorough"), ("fast", True, "fast")):
+        timings = await measure(parallel, mode, args.runs, args.vision_delay, args.llm_delay, args.retrieval_delay,
+                                args.concurrency)
+        results[name] = timings
+        print(f"{name:<10} mean={statistics.mean(timings):.3f}s  p50={statistics.median(timings):.3f}s  "
+              f"min={min(timings):.3f}s  max={max(timings):.3f}s")
+
+    for name in ("parallel", "fast"):
+        speedup = statistics.median(results["linear"]) / statistics.median(results[name])
+        print(f"{name} 相对 linear 的 p50 加速比: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,21 +4,29 @@ from langchain.schema import Document
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.runnables import RunnableConfig
 
-import json
-
-from agents.common_utils.rag_utils import rag_loader
-
-from agents.common_utils.image_utils import encode_image_to_base64
+from agents.common_utils.rag_utils import rag_loader, embed_queries, search_by_vectors
+from agents.common_utils.rag_cache import (
+    FOOD_LIST_LABEL, RetrievalCache, food_items_identity, parse_food_names, text_identity
+)
+from agents.common_utils.rag_hybrid import hybrid_search_by_vectors, retrieval_variant
+from shared.config.settings import settings
+
+from agents.common_utils.image_utils import aencode_image_to_base64
 from agents.common_utils.redis_util import get_redis_client
 from agents.common_utils.configuration import Configuration
 from agents.nutrition_agent.utils.states import AgentState
-from agents.nutrition_agent.utils.sturcts import NutritionAnalysis, NutritionAdvice, AdviceDependencies
+from agents.nutrition_agent.utils.sturcts import NutritionAnalysis, NutritionAdvice, AdviceDependencies, NutritionReport
 from agents.common_utils.model_utils import get_model
-from agents.nutrition_agent.utils.prompts import create_nutrition_prompt
+from agents.nutrition_agent.utils.prompts import create_nutrition_prompt, create_nutrition_report_prompt
 
 
-def state_init(state: AgentState, config: RunnableConfig):
+async def state_init(state: AgentState, config: RunnableConfig):
     configurable = Configuration.from_runnable_config(config)
+    # 首次创建模型会读取 .env 并初始化客户端，放到线程中避免阻塞事件循环
+    vision_model, analysis_model = await asyncio.gather(
+        asyncio.to_thread(get_model, configurable.vision_model_provider, configurable.vision_model),
+        asyncio.to_thread(get_model, configurable.analysis_model_provider, configurable.analysis_model)
+    )
     if state.get("image_dir") is None:
         initial_state = AgentState(
             image_data=state['image_data'],
@@ -28,16 +36,16 @@ def state_init(state: AgentState, config: RunnableConfig):
             advice_dependencies=None,
             retrieved_documents=[],
             user_preferences=state['user_preferences'],  # 后续要添加 已添加
+            preference_summary=None,
+            analysis_mode=configurable.mode,
             conversation_history=[],
             current_step="starting",
             error_message=None,
-            vision_model=get_model(model_provider=configurable.vision_model_provider,
-                                   model_name=configurable.vision_model),
-            analysis_model=get_model(model_provider=configurable.analysis_model_provider,
-                                     model_name=configurable.analysis_model)
+            vision_model=vision_model,
+            analysis_model=analysis_model
         )
         return initial_state
-    image_data = encode_image_to_base64(str(state['image_dir']))
+    image_data = await aencode_image_to_base64(str(state['image_dir']))
     print(configurable.analysis_model)
     print(configurable.vision_model)
     initial_state = AgentState(
@@ -48,26 +56,28 @@ def state_init(state: AgentState, config: RunnableConfig):
         advice_dependencies=None,
         retrieved_documents=[],
         user_preferences=state['user_preferences'],  # 后续要添加 已添加
+        preference_summary=None,
+        analysis_mode=configurable.mode,
         conversation_history=[],
         current_step="starting",
         error_message=None,
-        vision_model=get_model(model_provider=configurable.vision_model_provider, model_name=configurable.vision_model),
-        analysis_model=get_model(model_provider=configurable.analysis_model_provider,
-                                 model_name=configurable.analysis_model)
+        vision_model=vision_model,
+        analysis_model=analysis_model
     )
     print(initial_state["current_step"])
     return initial_state
 
 
-def analyze_image(state: AgentState) -> AgentState:
+async def analyze_image(state: AgentState) -> dict:
     """第一步：分析图片中的食物"""
+    update = {}
     try:
         if not state.get("image_data"):
-            state["error_message"] = "未提供图片数据"
-            return state
+            update["error_message"] = "未提供图片数据"
+            return update
 
         # if not state.get("image_dir"):
-        #     state["error_message"] = "未提供图片数据"
+        #     update["error_message"] = "未提供图片数据"
         #     return state
 
         messages = [
@@ -78,7 +88,8 @@ def analyze_image(state: AgentState) -> AgentState:
             3. 烹饪方式（煎、炒、蒸、煮等）
             4. 食物的新鲜程度和外观
             5. 可能的调料和配菜
-            请用中文回答，尽可能详细和准确。"""),
+            请用中文回答，尽可能详细和准确。""" + f"""
+            回答的第一行按"{FOOD_LIST_LABEL}：食物1、食物2"的格式列出所有食物名称，之后再详细描述。"""),
 
             HumanMessage(content=[
                 {
@@ -94,25 +105,48 @@ def analyze_image(state: AgentState) -> AgentState:
             ])
         ]
 
-        response = state['vision_model'].invoke(messages)
+        response = await state['vision_model'].ainvoke(messages)
         # print(f"分析结果：{response.content}")
-        state["image_analysis"] = response.content
-        state["current_step"] = "image_analyzed"
-        print(state["current_step"])
+        update["image_analysis"] = response.content
+        update["current_step"] = "image_analyzed"
+        print(update["current_step"])
 
     except Exception as e:
-        state["error_message"] = f"图片分析失败: {str(e)}"
-    state['image_data'] = ""
-    return state
-
-
-def extract_nutrition_info(state: AgentState) -> AgentState:
+        update["error_message"] = f"图片分析失败: {str(e)}"
+    update['image_data'] = ""
+    return update
+
+
+GOAL_TYPE_NAMES = {1: "减重", 2: "增重", 3: "维持", 4: "增肌", 5: "减脂"}
+
+
+async def summarize_preferences(state: AgentState) -> dict:
+    """将用户偏好整理为简短文本（不依赖图片，与图片分析并行执行）"""
+    prefs = state.get("user_preferences") or {}
+    lines = []
+    for item in prefs.get("dietary_restrictions", []):
+        if item.get("allergen_name"):
+            lines.append(f"过敏: {item['allergen_name']}(严重程度{item.get('severity_level')})")
+        elif item.get("disease_name") and item.get("is_current", True):
+            lines.append(f"疾病: {item['disease_name']}(严重程度{item.get('severity_level')})")
+    for goal in prefs.get("health_goals", []):
+        if goal.get("current_status", 1) != 1:
+            continue
+        goal_text = f"健康目标: {GOAL_TYPE_NAMES.get(goal.get('goal_type'), '其他')}"
+        if goal.get("target_weight"):
+            goal_text += f"，目标体重{goal['target_weight']}kg"
+        lines.append(goal_text)
+    return {"preference_summary": "；".join(lines)}
+
+
+async def extract_nutrition_info(state: AgentState) -> dict:
     """第二步：提取营养信息"""
+    update = {}
     # 后期可以对食物营养分析也配一个rag
     try:
         if not state.get("image_analysis"):
-            state["error_message"] = "缺少图片分析结果"
-            return state
+            update["error_message"] = "缺少图片分析结果"
+            return update
 
         prompt = create_nutrition_prompt(
             image_analysis=state["image_analysis"]
@@ -144,57 +178,42 @@ def extract_nutrition_info(state: AgentState) -> AgentState:
             NutritionAnalysis
         )
 
-        nutrition_analysis = structured_model.invoke(prompt)
+        nutrition_analysis = await structured_model.ainvoke(prompt)
         print(f"分析结果：{nutrition_analysis}")
-        state["nutrition_analysis"] = nutrition_analysis
-        state["current_step"] = "nutrition_extracted"
-        print(state["current_step"])
+        update["nutrition_analysis"] = nutrition_analysis
+        update["current_step"] = "nutrition_extracted"
+        print(update["current_step"])
 
     except Exception as e:
-        state["error_message"] = f"营养分析失败: {str(e)}"
+        update["error_message"] = f"营养分析失败: {str(e)}"
 
-    return state
+    return update
 
 
-async def retrieve_nutrition_knowledge(state: AgentState) -> AgentState:
-    """第三步，检索营养知识"""
+async def retrieve_nutrition_knowledge(state: AgentState) -> dict:
+    """第二步（并行），检索营养知识"""
+    update = {}
     try:
-        if not state.get("nutrition_analysis"):
-            state["error_message"] = "缺少营养分析结果"
-            return state
-        analysis = state["nutrition_analysis"]
-
-        query_list = [
-            f"食物项目: {', '.join(analysis.food_items)}",
-            f"总热量: {analysis.total_calories} 大卡",
-            f"宏量营养素: {analysis.macronutrients}",
-            f"维生素和矿物质: {analysis.vitamins_minerals}"
-        ]
-        # 获取 Redis 客户端
+        if not state.get("image_analysis"):
+            update["error_message"] = "缺少图片分析结果"
+            return update
+
+        # 只依赖图片描述和用户偏好，与营养提取并行执行
+        food_query = f"食物描述: {state['image_analysis']}"
+        queries = [(food_query, retrieval_identity(state))]
+        if state.get("preference_summary"):
+            queries.append((
+                f"饮食限制与健康目标: {state['preference_summary']}", text_identity(state["preference_summary"])
+            ))
+        # 获取共享的 Redis 客户端（连接池复用，无需关闭）
         redis_client = await get_redis_client()
+        cache = await RetrievalCache.open(redis_client, variant=retrieval_variant())
 
-        # 使用 query_list 转换 JSON 字符串作为缓存 key
-        query_key = json.dumps(query_list, ensure_ascii=False)
-
-        # 检查缓存
-        cached_result = await redis_client.get(query_key)
-        if cached_result:
-            search_results = [Document(page_content=content) for content in json.loads(cached_result)]
-        else:
-            # 加载 vector store（异步包装）
-            vectorstore = await asyncio.to_thread(rag_loader)
-
-            search_results = []
-            for query in query_list:
-                # 同步方法转异步
-                docs = await asyncio.to_thread(vectorstore.similarity_search, query, 2)
-                search_results.extend(docs)
-
-            # 缓存结果
-            await redis_client.set(query_key, json.dumps([doc.page_content for doc in search_results]))
-
-        # 关闭 Redis 连接
-        await redis_client.aclose()
+        # 未命中缓存的查询一次计算向量、一次检索向量库；多个查询命中同一文档时只保留一份
+        contents_list = await cached_batch_search(cache, queries, 2)
+        search_results = [Document(page_content=content) for content in dict.fromkeys(
+            content for contents in contents_list for content in contents
+        )]
 
         result=[]
         for doc in search_results:
@@ -206,29 +225,85 @@ async def retrieve_nutrition_knowledge(state: AgentState) -> AgentState:
                 print(f"文档查询错误: {e}")
                 continue
 
-        state["retrieved_documents"] = result
-        state["current_step"] = "retrieve_nutrition_knowledge"
-        print(state["current_step"])
+        update["retrieved_documents"] = result
+        update["current_step"] = "retrieve_nutrition_knowledge"
+        print(update["current_step"])
 
     except Exception as e:
-        state["error_message"] = f"营养知识检索失败: {str(e)}"
+        update["error_message"] = f"营养知识检索失败: {str(e)}"
+
+    return update
 
-    return state
+
+def retrieval_identity(state: AgentState) -> dict:
+    """
+    食物查询的缓存标识：并行链路（分步与快速模式）中检索与营养提取同时执行，此时按图片分析中食物清单的
+    规范化名称集合；线性链路中营养分析已完成，按食物项目与分档营养值；都没有时按规范化的描述文本
+    """
+    nutrition_analysis = state.get("nutrition_analysis")
+    if nutrition_analysis:
+        return food_items_identity(
+            nutrition_analysis.food_items, nutrition_analysis.total_calories, nutrition_analysis.macronutrients
+        )
+    food_names = parse_food_names(state["image_analysis"])
+    if food_names:
+        return food_items_identity(food_names)
+    return text_identity(state["image_analysis"])
+
+
+async def cached_batch_search(cache: RetrievalCache, queries: list, k: int) -> list:
+    """
+    批量检索 [(查询, 缓存标识)]，返回每个查询的前 k 条文档内容
+    先按标识精确命中；其余查询一次计算向量，按向量匹配近似查询；仍未命中的一次检索向量库并写入缓存
+    """
+    results = list(await asyncio.gather(*[cache.get(identity, k) for _, identity in queries]))
+    missing = [i for i, contents in enumerate(results) if contents is None]
+    if not missing:
+        return results
+
+    # 加载 vector store（异步包装），查询向量只计算一次，近似匹配与检索共用
+    vectorstore = await asyncio.to_thread(rag_loader)
+    vectors = await asyncio.to_thread(embed_queries, vectorstore, [queries[i][0] for i in missing])
+    similar = await asyncio.gather(*[cache.find_similar(vector, k) for vector in vectors])
+
+    to_search = []
+    for i, vector, contents in zip(missing, vectors, similar):
+        if contents is not None:
+            results[i] = contents
+        else:
+            to_search.append((i, vector))
+    if to_search:
+        search_vectors = [vector for _, vector in to_search]
+        if settings.RAG_HYBRID_SEARCH:
+            # 向量与BM25关键词结果融合后重排序，短查询（如"总热量: 520 大卡"）也能匹配到相关内容
+            search_queries = [queries[i][0] for i, _ in to_search]
+            documents_list = await asyncio.to_thread(
+                hybrid_search_by_vectors, vectorstore, search_queries, search_vectors, k
+            )
+        else:
+            hits_list = await asyncio.to_thread(search_by_vectors, vectorstore, search_vectors, k)
+            documents_list = [[hit.document for hit in hits] for hits in hits_list]
+        for (i, vector), documents in zip(to_search, documents_list):
+            results[i] = [document.page_content for document in documents]
+            await cache.set(queries[i][1], k, results[i], vector)
+    return results
 
 
-def generate_dependencies(state: AgentState) -> AgentState:
+async def generate_dependencies(state: AgentState) -> dict:
+    """生成营养建议所需的知识依据"""
+    update = {}
     try:
         if not state.get("retrieved_documents"):
             advice_dependencies = AdviceDependencies(
                      nutrition_facts=[],
                      health_guidelines=[],
                      food_interactions=[])
-            state["advice_dependencies"] = advice_dependencies
+            update["advice_dependencies"] = advice_dependencies
             print("缺少相关营养知识文档")
-            return state
+            return update
 
         documents = state["retrieved_documents"]
-        user_prefs = state.get("user_preferences", {})
+        user_prefs = state.get("preference_summary") or "无"
         prompt = f"""
                 基于以下专业知识和用户信息，请提供相关营养知识参考：
                 专业知识：{documents}
@@ -248,29 +323,79 @@ def generate_dependencies(state: AgentState) -> AgentState:
         )
 
         try:
-            advice_dependencies = structured_model.invoke(prompt)
+            advice_dependencies = await structured_model.ainvoke(prompt)
             # print("调用成功，结果:", advice_dependencies)
-            state["advice_dependencies"] = advice_dependencies
-            state["current_step"] = "generate_dependencies"
-            print(state["current_step"])
+            update["advice_dependencies"] = advice_dependencies
+            update["current_step"] = "generate_dependencies"
+            print(update["current_step"])
         except Exception as e:
             print("invoke 调用异常:", e)
     except Exception as e:
         print("依赖项生成失败:", e)
 
-    return state
+    return update
+
+
+async def prepare_advice_dependencies(state: AgentState) -> dict:
+    """检索营养知识并生成建议依据（并行链路中作为一个分支，与营养提取重叠执行）"""
+    update = await retrieve_nutrition_knowledge(state)
+    # 快速模式下依据与建议在同一次调用中生成
+    if state.get("analysis_mode") != "fast":
+        update.update(await generate_dependencies({**state, **update}))
+    return update
+
+
+async def generate_nutrition_report(state: AgentState) -> dict:
+    """快速模式：一次结构化调用同时生成营养分析、建议依据与营养建议"""
+    update = {}
+    try:
+        if not state.get("image_analysis"):
+            update["error_message"] = "缺少图片分析结果"
+            return update
+
+        prompt = create_nutrition_report_prompt(
+            image_analysis=state["image_analysis"],
+            documents=state.get("retrieved_documents") or [],
+            user_prefs=state.get("preference_summary") or "无"
+        )
+        structured_model = state['analysis_model'].with_structured_output(
+            NutritionReport
+        )
+
+        report = await structured_model.ainvoke(prompt)
+        update["nutrition_analysis"] = report.nutrition_analysis
+        update["advice_dependencies"] = report.advice_dependencies
+        update["nutrition_advice"] = report.nutrition_advice
+        update["current_step"] = "advice_generated"
+        print(update["current_step"])
+
+    except Exception as e:
+        update["error_message"] = f"营养分析失败: {str(e)}"
+
+    return update
+
+
+def route_after_image(state: AgentState) -> list:
+    """图片分析完成后：分步模式进入营养提取，快速模式等待知识检索"""
+    return [] if state.get("analysis_mode") == "fast" else ["extract_nutrition"]
+
+
+def route_after_dependencies(state: AgentState) -> list:
+    """知识检索完成后：快速模式直接生成完整报告，分步模式等待与营养提取汇合"""
+    return ["generate_nutrition_report"] if state.get("analysis_mode") == "fast" else []
 
 
-def generate_nutrition_advice(state: AgentState) -> AgentState:
+async def generate_nutrition_advice(state: AgentState) -> dict:
     """第四步：生成营养建议"""
+    update = {}
     try:
         if not state.get("advice_dependencies"):
             print("缺少相关营养知识")
-            # state["error_message"] = "缺少相关营养知识"
+            # update["error_message"] = "缺少相关营养知识"
 
         analysis = state["nutrition_analysis"]
         advice_dependencies = state["advice_dependencies"]
-        user_prefs = state.get("user_preferences", {})
+        user_prefs = state.get("preference_summary") or "无"
 
         # prompt = f"""
         # 基于以下营养分析结果，请提供专业的营养建议：
@@ -332,31 +457,32 @@ def generate_nutrition_advice(state: AgentState) -> AgentState:
             NutritionAdvice
         )
 
-        nutrition_advice = structured_model.invoke(prompt)
+        nutrition_advice = await structured_model.ainvoke(prompt)
 
-        state["nutrition_advice"] = nutrition_advice
+        update["nutrition_advice"] = nutrition_advice
 
-        state["current_step"] = "advice_generated"
-        print(state["current_step"])
+        update["current_step"] = "advice_generated"
+        print(update["current_step"])
 
     except Exception as e:
         # state["error_message"] = f"建议生成失败: {str(e)}"
         print(f"建议生成失败: {str(e)}")
 
-    return state
+    return update
 
 
-def format_final_response(state: AgentState) -> AgentState:
+async def format_final_response(state: AgentState) -> dict:
     """第四步：格式化最终响应"""
+    update = {}
     try:
         if state.get("error_message"):
-            return state
+            return update
 
         # 这里可以添加响应格式化逻辑
-        state["current_step"] = "completed"
-        print(state["current_step"])
+        update["current_step"] = "completed"
+        print(update["current_step"])
 
     except Exception as e:
-        state["error_message"] = f"响应格式化失败: {str(e)}"
+        update["error_message"] = f"响应格式化失败: {str(e)}"
 
-    return state
+    return update
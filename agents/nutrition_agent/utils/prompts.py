@@ -45,6 +45,41 @@ def create_nutrition_prompt(image_analysis: str) -> str:
     """
 
 
+def create_nutrition_report_prompt(image_analysis: str, documents: list, user_prefs: str) -> str:
+    """快速模式：营养分析、建议依据与营养建议合并为一次调用的提示词"""
+    nutrition_prompt = create_nutrition_prompt(image_analysis=image_analysis)
+    knowledge = "\n".join(f"- {doc}" for doc in documents) if documents else "无"
+    return f"""
+    {nutrition_prompt}
+
+    ###  营养知识参考
+    {knowledge}
+
+    ###  用户偏好
+    {user_prefs}
+
+    ###  最终返回格式
+    请在一次回答中同时完成以下三部分，并按以下 JSON 结构返回：
+    ```json
+    {{
+        "nutrition_analysis": 按上述营养分析格式返回的对象,
+        "advice_dependencies": {{
+            "nutrition_facts": ["从营养知识参考中提炼的知识要点1", ...],
+            "health_guidelines": ["健康指南1", ...],
+            "food_interactions": ["相互作用1", ...]（如果没有内容则填“无”）
+        }},
+        "nutrition_advice": {{
+            "recommendations": ["具体建议1", ...],
+            "dietary_tips": ["饮食技巧1", ...],
+            "warnings": ["注意事项1", ...],
+            "alternative_foods": ["替代食物1", ...]
+        }}
+    }}
+    ```
+    营养建议需结合营养知识参考与用户偏好，具体、可执行。
+    """
+
+
 # def create_advice_prompt(analysis: NutritionAnalysis, advice_dependencies: AdviceDependencies = None, user_prefs: dict = None) -> str:
 #     """
 #     生成营养建议提示词
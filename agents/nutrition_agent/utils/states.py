@@ -1,11 +1,16 @@
 
-from typing import Dict, List, Optional, TypedDict
+from typing import Annotated, Dict, List, Optional, TypedDict
 
 from langchain_openai.chat_models.base import BaseChatOpenAI
 
 from agents.nutrition_agent.utils.sturcts import NutritionAnalysis, NutritionAdvice, AdviceDependencies
 
 
+def keep_last(current, new):
+    """并行分支同一步写入时保留最后一个值"""
+    return new
+
+
 class AgentState(TypedDict):
     """Agent状态管理"""
     image_dir: Optional[str]
@@ -15,10 +20,12 @@ class AgentState(TypedDict):
     nutrition_advice: Optional[NutritionAdvice]
     advice_dependencies: Optional[AdviceDependencies]
     user_preferences: Optional[Dict]
+    preference_summary: Optional[str]
     retrieved_documents: List[str]
     conversation_history: List[Dict]
-    current_step: str
-    error_message: Optional[str]
+    analysis_mode: str
+    current_step: Annotated[str, keep_last]
+    error_message: Annotated[Optional[str], keep_last]
     vision_model: BaseChatOpenAI
     analysis_model: BaseChatOpenAI
 
@@ -65,4 +65,8 @@ class AdviceDependencies(BaseModel):
     )
 
 
-
+class NutritionReport(BaseModel):
+    """快速模式下一次生成的完整分析结构"""
+    nutrition_analysis: NutritionAnalysis = Field(description="营养分析结果")
+    advice_dependencies: AdviceDependencies = Field(description="营养建议依据")
+    nutrition_advice: NutritionAdvice = Field(description="营养建议")
@@ -0,0 +1,29 @@
+"""
+LangGraph服务的自定义HTTP应用
+随服务启停管理智能体共享的Redis连接池，并提供连接池状态检查
+"""
+
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from agents.common_utils.redis_util import close_redis_pool, get_redis_pool_stats
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """服务关闭时关闭Redis连接池（连接池在首次使用时创建）"""
+    yield
+    await close_redis_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/health")
+async def health_check():
+    """健康检查：Redis连接池统计（使用中、空闲连接数与获取连接的等待时间）"""
+    return {
+        "status": "healthy",
+        "redis_pool": get_redis_pool_stats()
+    }
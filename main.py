@@ -11,7 +11,11 @@ from datetime import datetime
 
 # 导入配置
 from shared.config.settings import get_settings
-from shared.models.database import create_tables, engine
+from shared.models.database import create_tables, engine, dispose_async_engine
+from shared.config.langgraph_config import langgraph_manager
+from shared.config.redis_config import async_redis_manager
+from shared.utils.cache import start_cache_invalidation_listener, stop_cache_invalidation_listener
+from shared.utils.image_processing import shutdown_image_executor
 from shared.models import user_models, food_models, conversation_models, saved_meal_models
 
 # 导入路由
@@ -54,11 +58,25 @@ async def lifespan(app: FastAPI):
         logger.error(f"数据库连接测试失败: {e}")
         raise
     
+    # 初始化异步Redis连接池
+    await async_redis_manager.connect()
+
+    # 订阅进程内缓存失效广播
+    await start_cache_invalidation_listener()
+
+    # 初始化LangGraph客户端连接池
+    await langgraph_manager.startup()
+
     logger.info("DietAI后端服务启动完成")
     yield
     
     # 关闭时执行
     logger.info("正在关闭DietAI后端服务...")
+    await langgraph_manager.close()
+    await stop_cache_invalidation_listener()
+    await async_redis_manager.close()
+    await dispose_async_engine()
+    shutdown_image_executor()
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -3,22 +3,29 @@ LangGraph 聊天 Agent 路由
 集成聊天机器人功能，支持与后端对话系统的完整交互
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Form, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
 from typing import Optional, Dict, Any, List, AsyncGenerator
-from langgraph_sdk import get_client
 import asyncio
 import json
 
 from shared.models.database import get_db
 from shared.models import schemas, user_models, conversation_models
 from shared.utils.auth import get_current_user
-from shared.config.redis_config import cache_service
+from shared.config.redis_config import async_cache_service
+from shared.config.langgraph_config import langgraph_manager
+from shared.utils.pagination import paginate_keyset, filter_signature, cached_total
 
 router = APIRouter(prefix="/chat", tags=["AI对话"])
 
+# 聊天Agent模型配置
+CHAT_AGENT_CONFIGURABLE = {
+    "analysis_model_provider": "openai",
+    "analysis_model": "gpt-4o-mini"
+}
+
 
 
 @router.post("/send-message-stream")
@@ -77,7 +84,7 @@ async def send_chat_message_stream(
             conversation_history = await get_conversation_history(session.id, db)
             
             # 4. 调用 LangGraph Agent
-            client = get_client(url="http://127.0.0.1:2024")
+            client = langgraph_manager.get_client()
             
             # 创建或获取 LangGraph thread
             if not session.langgraph_thread_id:
@@ -85,16 +92,8 @@ async def send_chat_message_stream(
                 session.langgraph_thread_id = thread['thread_id']
                 db.commit()
             
-            # 创建助手（如果需要）
-            assistant = await client.assistants.create(
-                graph_id="chat_agent",
-                config={
-                    "configurable": {
-                        "analysis_model_provider": "openai",
-                        "analysis_model": "gpt-4o-mini"
-                    }
-                }
-            )
+            # 获取助手（进程内复用）
+            assistant_id = await langgraph_manager.get_assistant_id("chat_agent", CHAT_AGENT_CONFIGURABLE)
             
             # 5. 流式运行聊天 Agent
             yield f"data: {json.dumps({'type': 'status', 'message': '正在生成回复...'})}\n\n"
@@ -102,7 +101,7 @@ async def send_chat_message_stream(
             full_response = ""
             
             async for chunk in client.runs.stream(
-                assistant_id=assistant["assistant_id"],
+                assistant_id=assistant_id,
                 thread_id=session.langgraph_thread_id,
                 input={
                     "user_message": message,
@@ -136,7 +135,7 @@ async def send_chat_message_stream(
                 content=full_response,
                 message_metadata={
                     "stream_generated": True,
-                    "assistant_id": assistant["assistant_id"]
+                    "assistant_id": assistant_id
                 }
             )
             db.add(ai_message)
@@ -155,7 +154,8 @@ async def send_chat_message_stream(
                 "last_message_time": ai_message.created_at.isoformat(),
                 "session_type": session.session_type
             }
-            cache_service.cache_conversation_context(str(session.id), context_data)
+            await async_cache_service.cache_conversation_context(str(session.id), context_data)
+            await async_cache_service.clear_list_total(current_user.id, "chat_messages")
             
             # 发送完成信号
             yield f"data: {json.dumps({'type': 'complete', 'message_id': ai_message.id})}\n\n"
@@ -226,7 +226,7 @@ async def send_chat_message(
         conversation_history = await get_conversation_history(session.id, db)
         
         # 4. 调用 LangGraph Agent
-        client = get_client(url="http://127.0.0.1:2024")
+        client = langgraph_manager.get_client()
         
         # 创建或获取 LangGraph thread
         if not session.langgraph_thread_id:
@@ -234,16 +234,8 @@ async def send_chat_message(
             session.langgraph_thread_id = thread['thread_id']
             db.commit()
         
-        # 创建助手（如果需要）
-        assistant = await client.assistants.create(
-            graph_id="chat_agent",
-            config={
-                "configurable": {
-                    "analysis_model_provider": "openai",
-                    "analysis_model": "gpt-4o-mini"
-                }
-            }
-        )
+        # 获取助手（进程内复用）
+        assistant_id = await langgraph_manager.get_assistant_id("chat_agent", CHAT_AGENT_CONFIGURABLE)
         
         # 运行聊天 Agent (非流式版本，兼容现有API)
         full_response = ""
@@ -251,7 +243,7 @@ async def send_chat_message(
         suggestions = []
         
         async for chunk in client.runs.stream(
-            assistant_id=assistant["assistant_id"],
+            assistant_id=assistant_id,
             thread_id=session.langgraph_thread_id,
             input={
                 "user_message": message,
@@ -309,7 +301,8 @@ async def send_chat_message(
             "last_message_time": ai_message.created_at.isoformat(),
             "session_type": session.session_type
         }
-        cache_service.cache_conversation_context(str(session.id), context_data)
+        await async_cache_service.cache_conversation_context(str(session.id), context_data)
+        await async_cache_service.clear_list_total(current_user.id, "chat_messages")
         
         return schemas.BaseResponse(
             success=True,
@@ -362,7 +355,7 @@ async def start_chat_session(
         db.refresh(session)
         
         # 创建 LangGraph thread
-        client = get_client(url="http://127.0.0.1:2024")
+        client = langgraph_manager.get_client()
         thread = await client.threads.create()
         
         # 更新会话的 LangGraph thread ID
@@ -416,7 +409,7 @@ async def get_session_context(
         health_goals = await get_health_goals(current_user.id, db)
         
         # 获取缓存的对话上下文
-        cached_context = cache_service.get_conversation_context(str(session_id))
+        cached_context = await async_cache_service.get_conversation_context(str(session_id))
         
         return schemas.BaseResponse(
             success=True,
@@ -606,6 +599,8 @@ async def get_chat_sessions(
 async def get_session_messages(
         session_id: int,
         limit: int = 50,
+        cursor: Optional[str] = Query(None, description="分页游标，传入后启用游标分页（首页传空字符串）"),
+        include_total: bool = Query(False, description="游标分页时是否返回总数"),
         current_user: user_models.User = Depends(get_current_user),
         db: Session = Depends(get_db)
 ):
@@ -624,9 +619,29 @@ async def get_session_messages(
             )
 
         # 获取消息
-        messages = db.query(conversation_models.ConversationMessage).filter(
+        query = db.query(conversation_models.ConversationMessage).filter(
             conversation_models.ConversationMessage.session_id == session_id
-        ).order_by(conversation_models.ConversationMessage.created_at.asc()).limit(limit).all()
+        )
+
+        next_cursor = None
+        if cursor is not None:
+            # 游标分页，按 (created_at, id) 正序向后翻页
+            try:
+                messages, next_cursor = paginate_keyset(
+                    query,
+                    [conversation_models.ConversationMessage.created_at, conversation_models.ConversationMessage.id],
+                    cursor,
+                    limit,
+                    cursor_types=[datetime, int],
+                    descending=False
+                )
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+        else:
+            messages = query.order_by(conversation_models.ConversationMessage.created_at.asc()).limit(limit).all()
 
         messages_data = []
         for msg in messages:
@@ -638,15 +653,29 @@ async def get_session_messages(
                 "metadata": msg.message_metadata
             })
 
+        data = {
+            "session_id": session_id,
+            "session_title": session.title,
+            "session_type": session.session_type,
+            "messages": messages_data
+        }
+
+        if cursor is not None:
+            total = None
+            if include_total:
+                signature = filter_signature(session_id=session_id)
+                total = await cached_total(query, current_user.id, "chat_messages", signature)
+            data["pagination"] = {
+                "page_size": limit,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None,
+                "total": total
+            }
+
         return schemas.BaseResponse(
             success=True,
             message="获取消息历史成功",
-            data={
-                "session_id": session_id,
-                "session_title": session.title,
-                "session_type": session.session_type,
-                "messages": messages_data
-            }
+            data=data
         )
 
     except HTTPException:
@@ -686,6 +715,7 @@ async def delete_session(
         # 删除会话
         db.delete(session)
         db.commit()
+        await async_cache_service.clear_list_total(current_user.id, "chat_messages")
 
         return schemas.BaseResponse(
             success=True,
@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, and_
-from typing import List, Optional
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import BinaryIO, List, Optional, Union
 from datetime import datetime, date, timedelta
+import asyncio
 import base64
 import json
-from langgraph_sdk import get_client
 
 from shared.models.database import get_db
 from shared.models.schemas import (
@@ -18,17 +19,90 @@ from shared.models.schemas import (
 from shared.utils.auth import get_current_user
 from shared.models.user_models import User
 from shared.models.food_models import FoodRecord, NutritionDetail, DailyNutritionSummary, FoodDatabase
-from shared.config.redis_config import cache_service
+from shared.config.redis_config import async_cache_service
+from shared.utils.cache import two_tier_cache
 from shared.config.minio_config import minio_client
+from shared.config.langgraph_config import langgraph_manager
 from shared.config.settings import get_settings
 from fastapi.responses import StreamingResponse
 
 from shared.utils.model import decimal_to_float
+from shared.utils.hashing import content_hash, json_fingerprint, perceptual_hash, hamming_distance
+from shared.utils.streams import stream_size
+from shared.utils.image_processing import process_image, image_variant_extension, image_variant_object_name
+from shared.utils.pagination import paginate_keyset, filter_signature, cached_total
+from shared.utils.nutrition_rollup import GRANULARITIES, load_nutrition_series, rebuild_nutrition_rollups
+from shared.tasks.analysis_progress import ProgressSubscription, TERMINAL_EVENTS
+from shared.tasks.food_analysis_tasks import enqueue_food_analysis
 
 settings = get_settings()
 
 router = APIRouter(prefix="/foods", tags=["食物记录"])
 
+# 营养师Agent模型配置
+NUTRITION_AGENT_CONFIGURABLE = {
+    "vision_model_provider": "openai",
+    "vision_model": "gpt-4.1-nano-2025-04-14",
+    "analysis_model_provider": "openai",
+    "analysis_model": "o3-mini-2025-01-31"
+}
+
+# 趋势指标 -> 汇总字段
+TREND_METRIC_FIELDS = {
+    "calories": "total_calories",
+    "protein": "total_protein",
+    "fat": "total_fat",
+    "carbohydrates": "total_carbohydrates",
+    "fiber": "total_fiber",
+    "sodium": "total_sodium",
+}
+
+
+def format_nutrition_detail(nutrition: NutritionDetail) -> dict:
+    """格式化营养详情数据"""
+    return decimal_to_float({
+        "id": nutrition.id,
+        # 宏量营养素
+        "calories": nutrition.calories,
+        "protein": nutrition.protein,
+        "fat": nutrition.fat,
+        "carbohydrates": nutrition.carbohydrates,
+        "dietary_fiber": nutrition.dietary_fiber,
+        "sugar": nutrition.sugar,
+        # 微量营养素
+        "sodium": nutrition.sodium,
+        "cholesterol": nutrition.cholesterol,
+        # 维生素
+        "vitamin_a": nutrition.vitamin_a,
+        "vitamin_c": nutrition.vitamin_c,
+        "vitamin_d": nutrition.vitamin_d,
+        # 矿物质
+        "calcium": nutrition.calcium,
+        "iron": nutrition.iron,
+        "potassium": nutrition.potassium,
+        # 其他
+        "confidence_score": nutrition.confidence_score,
+        "analysis_method": nutrition.analysis_method
+    })
+
+
+def format_food_record(record: FoodRecord) -> dict:
+    """格式化食物记录数据（营养详情需已通过 nutrition_detail 关系加载）"""
+    return {
+        "id": record.id,
+        "user_id": record.user_id,
+        "record_date": record.record_date.isoformat(),
+        "meal_type": record.meal_type,
+        "food_name": record.food_name,
+        "description": record.description,
+        "image_url": record.image_url,
+        "recording_method": record.recording_method,
+        "analysis_status": record.analysis_status,
+        "created_at": record.created_at.isoformat(),
+        "updated_at": record.updated_at.isoformat() if record.updated_at else None,
+        "nutrition_detail": format_nutrition_detail(record.nutrition_detail) if record.nutrition_detail else None
+    }
+
 
 @router.post("/records")
 async def create_food_record(
@@ -60,6 +134,11 @@ async def create_food_record(
             db.commit()
             db.refresh(food_record)
 
+            try:
+                await async_cache_service.clear_list_total(current_user.id, "food_records")
+            except Exception as cache_error:
+                print(f"清除缓存失败: {str(cache_error)}")
+
             # 2. 发送记录创建完成的状态
             record_data = {
                 "id": food_record.id,
@@ -76,84 +155,44 @@ async def create_food_record(
 
             yield f"data: {json.dumps({'type': 'record_created', 'data': {'record': record_data, 'status': 'created', 'message': '食物记录创建成功'}, 'success': True}, ensure_ascii=False)}\n\n"
 
-            # 3. 如果有图片URL，则使用Agent进行分析
+            # 3. 如果有图片URL，则投递后台分析任务，并通过进度通道转发分析过程
             if food_data.image_url:
+                job_id = None
                 try:
                     # 设置分析状态为处理中
                     food_record.analysis_status = 2  # 分析中
                     db.commit()
 
-                    yield f"data: {json.dumps({'type': 'analysis_started', 'data': {'status': 'analyzing', 'message': '开始分析图片...'}, 'success': True}, ensure_ascii=False)}\n\n"
-
-                    # 使用Agent分析图片（流式输出）
-                    analysis_complete_data = None
-                    async for chunk in analyze_food_image_with_agent(food_data.image_url, current_user, db):
-                        if chunk["type"] == "analysis_progress":
-                            yield f"data: {json.dumps({'type': 'analysis_progress', 'data': chunk['data'], 'success': True}, ensure_ascii=False)}\n\n"
-                        elif chunk["type"] == "analysis_complete":
-                            analysis_complete_data = chunk["data"]
-                            yield f"data: {json.dumps({'type': 'analysis_complete', 'data': chunk['data'], 'success': True}, ensure_ascii=False)}\n\n"
-                        elif chunk["type"] == "error":
-                            yield f"data: {json.dumps({'type': 'error', 'data': chunk['data'], 'success': False}, ensure_ascii=False)}\n\n"
-                            break
-
-                    # 如果有营养分析结果，创建营养详情记录
-                    if analysis_complete_data:
-                        try:
-                            nutrition_facts = NutritionFacts(**analysis_complete_data["nutrition_facts"])
-                            await create_nutrition_detail_from_analysis(
-                                food_record.id,
-                                nutrition_facts,
-                                db
-                            )
-
-                            # 更新分析状态为完成
-                            # 刷新食物记录，确保获取最新状态
-                            db.refresh(food_record)
-                            food_record.analysis_status = 3  # 已完成
-                            db.commit()
-
-                            # 触发每日营养汇总更新
-                            await update_daily_nutrition_summary(current_user.id, food_data.record_date, db)
-
-                            yield f"data: {json.dumps({'type': 'nutrition_saved', 'data': {'status': 'completed', 'message': '营养分析完成并已保存'}, 'success': True}, ensure_ascii=False)}\n\n"
-                        except Exception as e:
-                            print(f"保存营养分析结果失败: {str(e)}")
-                            # 回滚当前数据库事务
-                            db.rollback()
-                            # 重新设置分析状态为待分析
-                            db.refresh(food_record)
-                            food_record.analysis_status = 1  # 待分析
-                            db.commit()
-                            yield f"data: {json.dumps({'type': 'analysis_failed', 'data': {'status': 'failed', 'message': f'保存分析结果失败: {str(e)}'}, 'success': False}, ensure_ascii=False)}\n\n"
-                    else:
-                        # 如果分析失败，设置为待分析
-                        db.refresh(food_record)
-                        food_record.analysis_status = 1  # 待分析
-                        db.commit()
-                        yield f"data: {json.dumps({'type': 'analysis_failed', 'data': {'status': 'failed', 'message': '分析失败，请稍后重试'}, 'success': False}, ensure_ascii=False)}\n\n"
+                    # 先订阅再投递，避免错过早期进度事件
+                    async with ProgressSubscription(food_record.id) as subscription:
+                        job_id = enqueue_food_analysis(food_record.id, current_user.id)
+                        yield f"data: {json.dumps({'type': 'analysis_queued', 'data': {'status': 'queued', 'job_id': job_id, 'message': '分析任务已提交'}, 'success': True}, ensure_ascii=False)}\n\n"
+
+                        async for event in subscription.events():
+                            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
 
                 except Exception as e:
-                    print(f"Agent分析失败: {str(e)}")
-                    # 回滚分析相关的事务
+                    print(f"分析进度转发失败: {str(e)}")
                     db.rollback()
-                    # 重新获取食物记录并设置为待分析状态
-                    if food_record and food_record.id:
+                    # 任务未能提交时恢复为待分析状态；已提交的任务由Worker负责更新状态
+                    if job_id is None and food_record and food_record.id:
                         try:
                             food_record = db.query(FoodRecord).filter(FoodRecord.id == food_record.id).first()
-                            if food_record:
+                            if food_record and food_record.analysis_status == 2:
                                 food_record.analysis_status = 1  # 待分析
                                 db.commit()
                         except Exception as commit_error:
                             print(f"更新分析状态失败: {str(commit_error)}")
                             db.rollback()
 
-                    yield f"data: {json.dumps({'type': 'analysis_failed', 'data': {'status': 'failed', 'message': f'分析失败: {str(e)}'}, 'success': False}, ensure_ascii=False)}\n\n"
+                    if job_id is None:
+                        yield f"data: {json.dumps({'type': 'analysis_failed', 'data': {'status': 'failed', 'message': f'分析失败: {str(e)}'}, 'success': False}, ensure_ascii=False)}\n\n"
+                    else:
+                        yield f"data: {json.dumps({'type': 'analysis_pending', 'data': {'status': 'analyzing', 'job_id': job_id, 'message': '分析仍在后台进行，请稍后查看结果'}, 'success': True}, ensure_ascii=False)}\n\n"
 
             # 清除相关缓存
             try:
-                cache_key = f"nutrition:daily:{current_user.id}:{food_data.record_date}"
-                cache_service.redis.delete(cache_key)
+                await async_cache_service.clear_daily_nutrition(current_user.id, str(food_data.record_date))
             except Exception as cache_error:
                 print(f"清除缓存失败: {str(cache_error)}")
 
@@ -196,7 +235,7 @@ async def confirm_food_record(
             pass  # 忽略回滚错误
 
         # 验证记录是否存在且属于当前用户
-        record = db.query(FoodRecord).filter(
+        record = db.query(FoodRecord).options(joinedload(FoodRecord.nutrition_detail)).filter(
             FoodRecord.id == record_id,
             FoodRecord.user_id == current_user.id
         ).first()
@@ -207,45 +246,7 @@ async def confirm_food_record(
                 detail="食物记录不存在"
             )
 
-        # 获取营养详情
-        nutrition_detail = db.query(NutritionDetail).filter(
-            NutritionDetail.food_record_id == record_id
-        ).first()
-
-        record_data = {
-            "id": record.id,
-            "user_id": record.user_id,
-            "record_date": record.record_date.isoformat(),
-            "meal_type": record.meal_type,
-            "food_name": record.food_name,
-            "description": record.description,
-            "image_url": record.image_url,
-            "recording_method": record.recording_method,
-            "analysis_status": record.analysis_status,
-            "created_at": record.created_at.isoformat(),
-            "updated_at": record.updated_at.isoformat() if record.updated_at else None,
-            "nutrition_detail": None
-        }
-
-        if nutrition_detail:
-            record_data["nutrition_detail"] = {
-                "id": nutrition_detail.id,
-                "calories": float(nutrition_detail.calories),
-                "protein": float(nutrition_detail.protein),
-                "fat": float(nutrition_detail.fat),
-                "carbohydrates": float(nutrition_detail.carbohydrates),
-                "dietary_fiber": float(nutrition_detail.dietary_fiber),
-                "sugar": float(nutrition_detail.sugar),
-                "sodium": float(nutrition_detail.sodium),
-                "cholesterol": float(nutrition_detail.cholesterol),
-                "vitamin_a": float(nutrition_detail.vitamin_a),
-                "vitamin_c": float(nutrition_detail.vitamin_c),
-                "vitamin_d": float(nutrition_detail.vitamin_d),
-                "calcium": float(nutrition_detail.calcium),
-                "iron": float(nutrition_detail.iron),
-                "potassium": float(nutrition_detail.potassium),
-                "analysis_method": nutrition_detail.analysis_method
-            }
+        record_data = format_food_record(record)
 
         return BaseResponse(
             success=True,
@@ -266,38 +267,151 @@ async def confirm_food_record(
         )
 
 
+@router.get("/records/{record_id}/analysis/stream")
+async def stream_food_record_analysis(
+        record_id: int,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """订阅食物记录的分析进度（流式输出，用于断线重连）"""
+    record = db.query(FoodRecord).filter(
+        FoodRecord.id == record_id,
+        FoodRecord.user_id == current_user.id
+    ).first()
+
+    if not record:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="食物记录不存在"
+        )
+    analysis_status = record.analysis_status
+
+    async def generate_sse_stream():
+        try:
+            if analysis_status != 2:
+                # 分析已结束或尚未开始，直接返回当前状态
+                yield f"data: {json.dumps({'type': 'analysis_status', 'data': {'analysis_status': analysis_status}, 'success': True}, ensure_ascii=False)}\n\n"
+                return
+
+            async with ProgressSubscription(record_id) as subscription:
+                snapshot = await subscription.snapshot()
+                if snapshot:
+                    yield f"data: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+                    if snapshot.get("type") in TERMINAL_EVENTS:
+                        return
+
+                async for event in subscription.events():
+                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'error', 'data': {'error': str(e), 'message': f'订阅分析进度失败: {str(e)}'}, 'success': False}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        generate_sse_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "*",
+        }
+    )
+
+
+@router.post("/records/{record_id}/analysis", response_model=BaseResponse)
+async def retry_food_record_analysis(
+        record_id: int,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """重新提交食物记录的图片分析任务"""
+    try:
+        record = db.query(FoodRecord).filter(
+            FoodRecord.id == record_id,
+            FoodRecord.user_id == current_user.id
+        ).first()
+
+        if not record:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="食物记录不存在"
+            )
+
+        if not record.image_url:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="该记录没有图片"
+            )
+
+        if record.analysis_status in (2, 3):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="该记录正在分析或已完成分析"
+            )
+
+        record.analysis_status = 2  # 分析中
+        db.commit()
+        try:
+            job_id = enqueue_food_analysis(record.id, current_user.id)
+        except Exception:
+            # 任务未能提交时恢复为待分析状态，否则记录会一直处于分析中而无法重试
+            record.analysis_status = 1  # 待分析
+            db.commit()
+            raise
+
+        return BaseResponse(
+            success=True,
+            message="分析任务已提交",
+            data={
+                "record_id": record.id,
+                "job_id": job_id,
+                "analysis_status": record.analysis_status
+            }
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"提交分析任务失败: {str(e)}"
+        )
+
+
 async def analyze_food_image_with_agent(image_url: str, current_user: User, db: Session):
     """使用Langgraph Agent分析食物图片（流式输出）"""
 
     try:
-        # 初始化Langgraph客户端
-        # client = get_client(url="http://127.0.0.1:2024")
-        client = get_client(url=settings.ai_service_url)
-        # 从MinIO获取图片数据并转换为base64
-        image_base64 = await get_image_base64_from_url(image_url)
-
         user_prefs = await get_user_preferences(db, current_user.id)
         print("用户偏好:", user_prefs)
-        # 创建营养师Agent
-        assistant = await client.assistants.create(
-            graph_id="nutrition_agent",
-            config={
-                "configurable": {
-                    "vision_model_provider": "openai",
-                    "vision_model": "gpt-4.1-nano-2025-04-14",
-                    "analysis_model_provider": "openai",
-                    "analysis_model": "o3-mini-2025-01-31"
-                }
+
+        # 从MinIO获取视觉模型输入图（缩小后的变体）
+        image_data = await get_model_image_bytes(image_url)
+
+        # 同一张图片（视觉模型输入图的内容哈希，与上传时一致）且用户偏好未变化时直接复用分析结果
+        image_hash = await async_cache_service.get_image_hash(resolve_image_object_name(image_url)) or content_hash(image_data)
+        cache_key = f"{image_hash}:{json_fingerprint(user_prefs)}"
+        cached_result = await find_cached_food_analysis(image_data, image_hash, user_prefs, current_user.id)
+        if cached_result:
+            yield {
+                "type": "analysis_complete",
+                "data": cached_result
             }
+            return
+
+        # 初始化Langgraph客户端
+        client = langgraph_manager.get_client()
+        # 获取营养师Agent（进程内复用）
+        assistant_id = await langgraph_manager.get_assistant_id(
+            "nutrition_agent", {**NUTRITION_AGENT_CONFIGURABLE, "mode": settings.food_analysis_mode}
         )
 
         # 创建线程
         thread = await client.threads.create()
         async for chunk in client.runs.stream(
-                assistant_id=assistant["assistant_id"],
+                assistant_id=assistant_id,
                 thread_id=thread['thread_id'],
                 input={
-                    "image_data": image_base64,
+                    "image_data": base64.b64encode(image_data).decode('utf-8'),
                     "user_preferences": user_prefs
                 },
                 stream_mode="values"
@@ -305,13 +419,16 @@ async def analyze_food_image_with_agent(image_url: str, current_user: User, db:
             if chunk.data is not None:
                 if chunk.data.get("current_step") == "completed":
                     print("Agent分析完成")
+                    result = {
+                        "image_description": chunk.data.get("image_analysis"),
+                        "nutrition_facts": chunk.data.get("nutrition_analysis"),
+                        "recommendations": chunk.data.get("nutrition_advice")
+                    }
+                    if result["nutrition_facts"]:
+                        await async_cache_service.cache_food_analysis(cache_key, result, settings.cache_food_analysis_ttl)
                     yield {
                         "type": "analysis_complete",
-                        "data": {
-                            "image_description": chunk.data.get("image_analysis"),
-                            "nutrition_facts": chunk.data.get("nutrition_analysis"),
-                            "recommendations": chunk.data.get("nutrition_advice")
-                        }
+                        "data": result
                     }
                 else:
                     yield {
@@ -331,66 +448,37 @@ async def analyze_food_image_with_agent(image_url: str, current_user: User, db:
         raise e
 
 
-async def get_user_preferences(db: Session, user_id: int):
+async def find_cached_food_analysis(image_data: Union[bytes, BinaryIO], image_hash: str, user_prefs: dict, user_id: int) -> Optional[dict]:
+    """按内容哈希（及可选的感知哈希）查找已缓存的分析结果，并记录命中统计"""
+    prefs_fingerprint = json_fingerprint(user_prefs)
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            return {
-                "dietary_restrictions": [],
-                "health_goals": [],
-                "language": "zh-CN"
-            }
-        # 饮食限制
-        dietary_restrictions = []
-        if user.allergies:
-            dietary_restrictions.extend([
-                {
-                    "allergen_name": allergy.allergen_name,
-                    "severity_level": allergy.severity_level,
-                    "reaction_description": allergy.reaction_description,
-                    "created_at": allergy.created_at.isoformat() if allergy.created_at else None,
-                    "updated_at": allergy.updated_at.isoformat() if allergy.updated_at else None
-                }
-                for allergy in user.allergies
-            ])
-        # 处理疾病信息
-        if user.diseases:
-            dietary_restrictions.extend([
-                {
-                    "disease_name": disease.disease_name,
-                    "severity_level": disease.severity_level,
-                    "diagnosed_date": disease.diagnosed_date.isoformat() if disease.diagnosed_date else None,
-                    "is_current": disease.is_current,
-                    "notes": disease.notes,
-                    "created_at": disease.created_at.isoformat() if disease.created_at else None,
-                    "updated_at": disease.updated_at.isoformat() if disease.updated_at else None
-                }
-                for disease in user.diseases
-            ])
-        # 健康目标
-        health_goals = []
-        if user.health_goals:
-            health_goals.extend([
-                {
-                    "goal_type": goal.goal_type,  # 1:减重 2:增重 3:维持 4:增肌 5:减脂
-                    "target_weight": float(goal.target_weight) if goal.target_weight is not None else None,
-                    "target_date": goal.target_date.isoformat() if goal.target_date else None,
-                    "current_status": goal.current_status,  # 1:进行中 2:已完成 3:已暂停 4:已取消
-                    "created_at": goal.created_at.isoformat() if goal.created_at else None,
-                    "updated_at": goal.updated_at.isoformat() if goal.updated_at else None,
-                }
-                for goal in user.health_goals])
-            health_goals.extend([{"goal_type_mean:": "1:减重 2:增重 3:维持 4:增肌 5:减脂",
-                                  "current_status_mean": "1:进行中 2:已完成 3:已暂停 4:已取消"}])
-
-        language = "zh-CN"
+        cached_result = await async_cache_service.get_food_analysis(f"{image_hash}:{prefs_fingerprint}")
+        if cached_result:
+            await async_cache_service.incr_food_analysis_stat("hit")
+            return cached_result
+
+        if settings.image_phash_enabled:
+            phash = await asyncio.to_thread(perceptual_hash, image_data)
+            if phash:
+                for known_phash, known_hash in (await async_cache_service.get_perceptual_hashes(user_id)).items():
+                    if known_hash == image_hash:
+                        continue
+                    if hamming_distance(phash, known_phash) <= settings.image_phash_max_distance:
+                        cached_result = await async_cache_service.get_food_analysis(f"{known_hash}:{prefs_fingerprint}")
+                        if cached_result:
+                            await async_cache_service.incr_food_analysis_stat("near_hit")
+                            return cached_result
+                await async_cache_service.register_perceptual_hash(user_id, phash, image_hash)
+
+        await async_cache_service.incr_food_analysis_stat("miss")
+    except Exception as e:
+        print(f"查询分析缓存失败: {str(e)}")
+    return None
 
-        return {
-            "dietary_restrictions": dietary_restrictions,
-            "health_goals": health_goals,
-            "language": language
-        }
 
+async def get_user_preferences(db: Session, user_id: int):
+    try:
+        return await load_user_preferences(db, user_id)
     except Exception as e:
         print(f"获取用户偏好失败: {e}")
         try:
@@ -406,50 +494,143 @@ async def get_user_preferences(db: Session, user_id: int):
         }
 
 
-async def get_image_base64_from_url(image_identifier: str) -> str:
-    """从图片标识符获取base64编码的图片数据"""
-    try:
-        # 判断是URL还是对象名
-        if image_identifier.startswith('http'):
-            # 如果是完整的URL，需要正确提取对象名
-            from urllib.parse import urlparse, unquote
-
-            parsed_url = urlparse(image_identifier)
-            # 获取路径部分并移除bucket名称
-            path_parts = parsed_url.path.strip('/').split('/')
-            if len(path_parts) >= 2:
-                # 移除bucket名称，保留对象路径
-                object_name = '/'.join(path_parts[1:])
-            else:
-                # 如果路径格式不正确，尝试从最后一部分提取
-                object_name = path_parts[-1] if path_parts else parsed_url.path.split('/')[-1]
-
-            # URL解码
-            object_name = unquote(object_name)
+@two_tier_cache("user_preferences")
+async def load_user_preferences(db: Session, user_id: int):
+    """查询用户饮食限制与健康目标（两级缓存，随用户缓存一起失效）"""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        return {
+            "dietary_restrictions": [],
+            "health_goals": [],
+            "language": "zh-CN"
+        }
+    # 饮食限制
+    dietary_restrictions = []
+    if user.allergies:
+        dietary_restrictions.extend([
+            {
+                "allergen_name": allergy.allergen_name,
+                "severity_level": allergy.severity_level,
+                "reaction_description": allergy.reaction_description,
+                "created_at": allergy.created_at.isoformat() if allergy.created_at else None,
+                "updated_at": allergy.updated_at.isoformat() if allergy.updated_at else None
+            }
+            for allergy in user.allergies
+        ])
+    # 处理疾病信息
+    if user.diseases:
+        dietary_restrictions.extend([
+            {
+                "disease_name": disease.disease_name,
+                "severity_level": disease.severity_level,
+                "diagnosed_date": disease.diagnosed_date.isoformat() if disease.diagnosed_date else None,
+                "is_current": disease.is_current,
+                "notes": disease.notes,
+                "created_at": disease.created_at.isoformat() if disease.created_at else None,
+                "updated_at": disease.updated_at.isoformat() if disease.updated_at else None
+            }
+            for disease in user.diseases
+        ])
+    # 健康目标
+    health_goals = []
+    if user.health_goals:
+        health_goals.extend([
+            {
+                "goal_type": goal.goal_type,  # 1:减重 2:增重 3:维持 4:增肌 5:减脂
+                "target_weight": float(goal.target_weight) if goal.target_weight is not None else None,
+                "target_date": goal.target_date.isoformat() if goal.target_date else None,
+                "current_status": goal.current_status,  # 1:进行中 2:已完成 3:已暂停 4:已取消
+                "created_at": goal.created_at.isoformat() if goal.created_at else None,
+                "updated_at": goal.updated_at.isoformat() if goal.updated_at else None,
+            }
+            for goal in user.health_goals])
+        health_goals.extend([{"goal_type_mean:": "1:减重 2:增重 3:维持 4:增肌 5:减脂",
+                              "current_status_mean": "1:进行中 2:已完成 3:已暂停 4:已取消"}])
+
+    language = "zh-CN"
+
+    return {
+        "dietary_restrictions": dietary_restrictions,
+        "health_goals": health_goals,
+        "language": language
+    }
+
+
+def resolve_image_object_name(image_identifier: str) -> str:
+    """从图片URL或对象名解析MinIO对象名"""
+    # 判断是URL还是对象名
+    if image_identifier.startswith('http'):
+        # 如果是完整的URL，需要正确提取对象名
+        from urllib.parse import urlparse, unquote
+
+        parsed_url = urlparse(image_identifier)
+        # 获取路径部分并移除bucket名称
+        path_parts = parsed_url.path.strip('/').split('/')
+        if len(path_parts) >= 2:
+            # 移除bucket名称，保留对象路径
+            object_name = '/'.join(path_parts[1:])
         else:
-            # 如果是对象名或路径，直接使用
-            object_name = image_identifier
-
-        print(f"尝试获取对象: {object_name}")
-
-        # 获取图片数据
-        image_data = minio_client.download_file(object_name)
-
-        if image_data is None:
-            raise Exception(f"无法从MinIO获取图片数据: {object_name}")
-
-        # 转换为base64
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
+            # 如果路径格式不正确，尝试从最后一部分提取
+            object_name = path_parts[-1] if path_parts else parsed_url.path.split('/')[-1]
+
+        # URL解码
+        return unquote(object_name)
+    # 如果是对象名或路径，直接使用
+    return image_identifier
+
+
+async def get_model_image_bytes(image_identifier: str) -> bytes:
+    """
+    获取视觉模型输入图（缩小后的变体）
+    预处理之前上传的图片没有该变体：由原图生成并存储，下次直接使用；原图无法解码时返回原图
+    """
+    object_name = resolve_image_object_name(image_identifier)
+    model_object_name = image_variant_object_name(object_name, "model")
+    if await asyncio.to_thread(minio_client.file_exists, model_object_name):
+        image_data = await asyncio.to_thread(minio_client.download_file, model_object_name)
+        if image_data is not None:
+            return image_data
+
+    # 原图流式下载到临时文件，由图片处理进程读取，不整体读入内存
+    source = await asyncio.to_thread(minio_client.download_to_spooled_file, object_name)
+    if source is None:
+        raise Exception(f"无法从MinIO获取图片数据: {object_name}")
+    try:
+        variants = await process_image(source, ("model",))
+        if not variants:
+            source.seek(0)
+            return await asyncio.to_thread(source.read)
+    finally:
+        source.close()
+    model_image = variants["model"]
+    await asyncio.to_thread(
+        minio_client.upload_file, model_object_name, model_image["data"], model_image["content_type"]
+    )
+    return model_image["data"]
 
-        return image_base64
 
-    except Exception as e:
-        print(f"获取图片数据失败: {str(e)}")
-        raise e
+async def get_image_base64_from_url(image_identifier: str) -> str:
+    """从图片标识符获取base64编码的视觉模型输入图"""
+    image_data = await get_model_image_bytes(image_identifier)
+    return base64.b64encode(image_data).decode('utf-8')
+
+
+async def upload_image_variants(object_name: str, variants: dict) -> bool:
+    """并发上传预处理后的图片变体：original 存为 object_name，其余按变体名存放在同一目录"""
+    uploads = [
+        asyncio.to_thread(
+            minio_client.upload_file,
+            object_name if name == "original" else image_variant_object_name(object_name, name),
+            variant["data"],
+            variant["content_type"]
+        )
+        for name, variant in variants.items()
+    ]
+    return all(await asyncio.gather(*uploads))
 
 
 async def create_nutrition_detail_from_analysis(food_record_id: int, nutrition_facts: NutritionFacts, db: Session):
-    """根据Agent分析结果创建营养详情记录"""
+    """根据Agent分析结果创建营养详情记录，返回新建的记录；已存在时返回None"""
     try:
         # 检查是否已有营养详情
         existing_detail = db.query(NutritionDetail).filter(
@@ -458,7 +639,7 @@ async def create_nutrition_detail_from_analysis(food_record_id: int, nutrition_f
 
         if existing_detail:
             print(f"营养详情已存在，食物记录ID: {food_record_id}")
-            return  # 如果已存在，则不创建
+            return None  # 如果已存在，则不创建
 
         # 从分析结果中提取营养信息
         nutrition_detail = NutritionDetail(
@@ -490,6 +671,7 @@ async def create_nutrition_detail_from_analysis(food_record_id: int, nutrition_f
         db.add(nutrition_detail)
         db.flush()  # 刷新但不提交，让调用者控制事务
         print(f"营养详情创建成功，食物记录ID: {food_record_id}")
+        return nutrition_detail
 
     except Exception as e:
         print(f"创建营养详情失败: {str(e)}")
@@ -505,13 +687,13 @@ async def get_food_records(
         end_date: Optional[date] = Query(None, description="结束日期"),
         meal_type: Optional[int] = Query(None, description="餐次类型"),
         page: int = Query(1, ge=1, description="页码"),
-        page_size: int = Query(20, ge=1, le=100, description="每页大小")
+        page_size: int = Query(20, ge=1, le=100, description="每页大小"),
+        cursor: Optional[str] = Query(None, description="分页游标，传入后启用游标分页（首页传空字符串）"),
+        include_total: Optional[bool] = Query(None, description="是否返回总数，默认偏移分页返回、游标分页不返回")
 ):
     """获取食物记录列表"""
-    #TODO:修改食物记录的查询
     try:
         query = db.query(FoodRecord).filter(current_user.id == FoodRecord.user_id)
-        query.filter()
         if start_date:
             query = query.filter(FoodRecord.record_date >= start_date)
         if end_date:
@@ -519,71 +701,61 @@ async def get_food_records(
         if meal_type:
             query = query.filter(meal_type == FoodRecord.meal_type)
 
-        # 总数统计
-        total = query.count()
+        use_cursor = cursor is not None
+        if include_total is None:
+            include_total = not use_cursor
 
-        # 分页查询
-        offset = (page - 1) * page_size
-        records = query.order_by(FoodRecord.record_date.desc(), FoodRecord.created_at.desc()).offset(offset).limit(
-            page_size).all()
+        # 总数统计（带缓存）
+        total = None
+        if include_total:
+            signature = filter_signature(start_date=start_date, end_date=end_date, meal_type=meal_type)
+            total = await cached_total(query, current_user.id, "food_records", signature)
+
+        # 营养详情随记录一次性联表加载，避免逐条查询
+        query = query.options(joinedload(FoodRecord.nutrition_detail))
+
+        if use_cursor:
+            # 游标分页，基于 (record_date, created_at, id) 定位
+            try:
+                records, next_cursor = paginate_keyset(
+                    query,
+                    [FoodRecord.record_date, FoodRecord.created_at, FoodRecord.id],
+                    cursor,
+                    page_size,
+                    cursor_types=[date, datetime, int]
+                )
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+        else:
+            # 偏移分页
+            offset = (page - 1) * page_size
+            records = query.order_by(
+                FoodRecord.record_date.desc(), FoodRecord.created_at.desc()
+            ).offset(offset).limit(page_size).all()
 
         records_data = []
         for record in records:
-            nutrition_query = db.query(NutritionDetail).filter(NutritionDetail.food_record_id == record.id)
-            nutrition = nutrition_query.first()
-            nutrition_data={}
-            print(f"相关的营养信息：{nutrition.id}")
-            if nutrition:
-                nutrition_data = {
-                    # 宏量营养素
-                    "calories": nutrition.calories,
-                    "protein": nutrition.protein,
-                    "fat": nutrition.fat,
-                    "carbohydrates": nutrition.carbohydrates,
-                    "dietary_fiber": nutrition.dietary_fiber,
-                    "sugar": nutrition.sugar,
-
-                    # 微量营养素
-                    "sodium": nutrition.sodium,
-                    "cholesterol": nutrition.cholesterol,
-
-                    # 维生素
-                    "vitamin_a": nutrition.vitamin_a,
-                    "vitamin_c": nutrition.vitamin_c,
-                    "vitamin_d": nutrition.vitamin_d,
-
-                    # 矿物质
-                    "calcium": nutrition.calcium,
-                    "iron": nutrition.iron,
-                    "potassium": nutrition.potassium,
-
-                    # 其他
-                    "confidence_score":
-                        nutrition.confidence_score if nutrition.confidence_score is not None else None,
-                }
-                nutrition_data = decimal_to_float(nutrition_data)
-                print(f"相关营养信息：{nutrition_data}")
-            records_data.append({
-                "nutrition_data": nutrition_data,
-                "id": record.id,
-                "user_id": record.user_id,
-                "record_date": record.record_date.isoformat(),
-                "meal_type": record.meal_type,
-                "food_name": record.food_name,
-                "description": record.description,
-                "image_url": record.image_url,
-                "recording_method": record.recording_method,
-                "analysis_status": record.analysis_status,
-                "created_at": record.created_at.isoformat(),
-                "updated_at": record.updated_at.isoformat()
-            })
-
-        pagination_info = {
-            "total": total,
-            "page": page,
-            "page_size": page_size,
-            "total_pages": (total + page_size - 1) // page_size
-        }
+            record_data = format_food_record(record)
+            record_data["nutrition_data"] = record_data.pop("nutrition_detail") or {}
+            records_data.append(record_data)
+
+        if use_cursor:
+            pagination_info = {
+                "page_size": page_size,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None,
+                "total": total
+            }
+        else:
+            pagination_info = {
+                "total": total,
+                "page": page,
+                "page_size": page_size,
+                "total_pages": (total + page_size - 1) // page_size if total is not None else None
+            }
 
         return BaseResponse(
             success=True,
@@ -593,6 +765,8 @@ async def get_food_records(
                 "pagination": pagination_info
             }
         )
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -608,7 +782,7 @@ async def get_food_record(
 ):
     """获取食物记录详情"""
     try:
-        record = db.query(FoodRecord).filter(
+        record = db.query(FoodRecord).options(joinedload(FoodRecord.nutrition_detail)).filter(
             FoodRecord.id == record_id,
             FoodRecord.user_id == current_user.id
         ).first()
@@ -619,47 +793,7 @@ async def get_food_record(
                 detail="食物记录不存在"
             )
 
-        # 获取营养详情
-        nutrition_detail = db.query(NutritionDetail).filter(
-            NutritionDetail.food_record_id == record_id
-        ).first()
-
-        record_data = {
-            "id": record.id,
-            "user_id": record.user_id,
-            "record_date": record.record_date.isoformat(),
-            "meal_type": record.meal_type,
-            "food_name": record.food_name,
-            "description": record.description,
-            "image_url": record.image_url,
-            "recording_method": record.recording_method,
-            "analysis_status": record.analysis_status,
-            "created_at": record.created_at.isoformat(),
-            "updated_at": record.updated_at.isoformat(),
-            "nutrition_detail": None
-        }
-
-        if nutrition_detail:
-            record_data["nutrition_detail"] = {
-                "id": nutrition_detail.id,
-                "calories": float(nutrition_detail.calories),
-                "protein": float(nutrition_detail.protein),
-                "fat": float(nutrition_detail.fat),
-                "carbohydrates": float(nutrition_detail.carbohydrates),
-                "dietary_fiber": float(nutrition_detail.dietary_fiber),
-                "sugar": float(nutrition_detail.sugar),
-                "sodium": float(nutrition_detail.sodium),
-                "cholesterol": float(nutrition_detail.cholesterol),
-                "vitamin_a": float(nutrition_detail.vitamin_a),
-                "vitamin_c": float(nutrition_detail.vitamin_c),
-                "vitamin_d": float(nutrition_detail.vitamin_d),
-                "calcium": float(nutrition_detail.calcium),
-                "iron": float(nutrition_detail.iron),
-                "potassium": float(nutrition_detail.potassium),
-                "confidence_score": float(
-                    nutrition_detail.confidence_score) if nutrition_detail.confidence_score else None,
-                "analysis_method": nutrition_detail.analysis_method
-            }
+        record_data = format_food_record(record)
 
         return BaseResponse(
             success=True,
@@ -734,15 +868,14 @@ async def add_nutrition_detail(
         record.analysis_status = 3  # 已完成
         record.updated_at = datetime.utcnow()
 
+        # 每日营养汇总与营养详情在同一事务中增量更新
+        await apply_daily_nutrition_delta(current_user.id, record.record_date, nutrition_detail, db)
+
         db.commit()
         db.refresh(nutrition_detail)
 
-        # 触发每日营养汇总更新
-        await update_daily_nutrition_summary(current_user.id, record.record_date, db)
-
         # 清除相关缓存
-        cache_key = f"nutrition:daily:{current_user.id}:{record.record_date}"
-        cache_service.redis.delete(cache_key)
+        await async_cache_service.clear_daily_nutrition(current_user.id, str(record.record_date))
 
         return BaseResponse(
             success=True,
@@ -783,7 +916,7 @@ async def get_daily_nutrition_summary(
     """获取每日营养汇总"""
     try:
         # 先尝试从缓存获取
-        cached_summary = cache_service.get_daily_nutrition(current_user.id, summary_date.isoformat())
+        cached_summary = await async_cache_service.get_daily_nutrition(current_user.id, summary_date.isoformat())
         if cached_summary:
             return BaseResponse(
                 success=True,
@@ -820,7 +953,7 @@ async def get_daily_nutrition_summary(
         }
 
         # 缓存汇总数据
-        cache_service.cache_daily_nutrition(current_user.id, summary_date.isoformat(), summary_data)
+        await async_cache_service.cache_daily_nutrition(current_user.id, summary_date.isoformat(), summary_data)
 
         return BaseResponse(
             success=True,
@@ -840,22 +973,25 @@ async def get_nutrition_trends(
         db: Session = Depends(get_db),
         start_date: Optional[date] = Query(None, description="开始日期"),
         end_date: Optional[date] = Query(None, description="结束日期"),
-        metrics: Optional[str] = Query("calories,protein,fat,carbohydrates", description="指标列表，逗号分隔")
+        metrics: Optional[str] = Query("calories,protein,fat,carbohydrates", description="指标列表，逗号分隔"),
+        granularity: str = Query("day", description="时间粒度：day/week/month，周/月粒度的数值为周期内的日均值")
 ):
     """获取营养趋势"""
     try:
+        if granularity not in GRANULARITIES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="不支持的时间粒度"
+            )
+
         # 设置默认日期范围（最近30天）
         if not end_date:
             end_date = date.today()
         if not start_date:
             start_date = end_date - timedelta(days=30)
 
-        # 获取营养汇总数据
-        summaries = db.query(DailyNutritionSummary).filter(
-            DailyNutritionSummary.user_id == current_user.id,
-            DailyNutritionSummary.summary_date >= start_date,
-            DailyNutritionSummary.summary_date <= end_date
-        ).order_by(DailyNutritionSummary.summary_date).all()
+        # 获取营养汇总数据（周/月粒度读取预聚合的汇总表）
+        points = load_nutrition_series(db, current_user.id, start_date, end_date, granularity)
 
         # 解析指标列表
         metric_list = [metric.strip() for metric in metrics.split(',')]
@@ -865,31 +1001,28 @@ async def get_nutrition_trends(
                 "start_date": start_date.isoformat(),
                 "end_date": end_date.isoformat()
             },
+            "granularity": granularity,
             "metrics": metric_list,
             "data": []
         }
 
-        for summary in summaries:
+        for point in points:
+            days = point["days"]
             data_point = {
-                "date": summary.summary_date.isoformat(),
+                "date": point["start_date"].isoformat(),
                 "values": {}
             }
+            if granularity != "day":
+                data_point["end_date"] = point["end_date"].isoformat()
+                data_point["days"] = days
 
             for metric in metric_list:
-                if metric == "calories":
-                    data_point["values"]["calories"] = float(summary.total_calories)
-                elif metric == "protein":
-                    data_point["values"]["protein"] = float(summary.total_protein)
-                elif metric == "fat":
-                    data_point["values"]["fat"] = float(summary.total_fat)
-                elif metric == "carbohydrates":
-                    data_point["values"]["carbohydrates"] = float(summary.total_carbohydrates)
-                elif metric == "fiber":
-                    data_point["values"]["fiber"] = float(summary.total_fiber)
-                elif metric == "sodium":
-                    data_point["values"]["sodium"] = float(summary.total_sodium)
-                elif metric == "health_score":
-                    data_point["values"]["health_score"] = float(summary.health_score) if summary.health_score else None
+                if metric == "health_score":
+                    data_point["values"]["health_score"] = round(
+                        point["health_level_total"] / point["health_level_days"], 2
+                    ) if point["health_level_days"] else None
+                elif metric in TREND_METRIC_FIELDS:
+                    data_point["values"][metric] = round(point[TREND_METRIC_FIELDS[metric]] / days, 2)
 
             trends_data["data"].append(data_point)
 
@@ -898,6 +1031,8 @@ async def get_nutrition_trends(
             message="获取营养趋势成功",
             data=trends_data
         )
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -920,30 +1055,60 @@ async def upload_food_image(
                 detail="不支持的文件类型，请上传JPEG、PNG或GIF格式的图片"
             )
 
-        # 验证文件大小（10MB限制）
-        file_content = await file.read()
-        if len(file_content) > 10 * 1024 * 1024:
+        # 验证文件大小（10MB限制），UploadFile 底层为临时文件，不整体读入内存
+        file_size = await asyncio.to_thread(stream_size, file.file)
+        if file_size > settings.upload_max_size:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="文件大小不能超过10MB"
             )
 
+        # 预处理（进程池中执行，较大的上传由工作进程从磁盘临时文件读取）：
+        # 摆正方向、去除EXIF、缩小并重新编码为存储图、视觉模型输入图与缩略图
+        variants = await process_image(file.file)
+        await file.seek(0)
+
+        # 内容哈希按视觉模型输入图计算（无法解码时为原图），与分析时从MinIO读取的内容一致，供分析结果缓存复用
+        image_hash = await asyncio.to_thread(content_hash, variants["model"]["data"] if variants else file.file)
+
         # 生成文件名
         timestamp = int(datetime.utcnow().timestamp())
-        file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
-        object_name = f"food_images/{current_user.id}/{timestamp}.{file_extension}"
+        if variants:
+            object_name = f"food_images/{current_user.id}/{timestamp}.{image_variant_extension('original')}"
+        else:
+            file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
+            object_name = f"food_images/{current_user.id}/{timestamp}.{file_extension}"
 
         print("上传图片开始-minio")
-        # 上传到MinIO
-        success = minio_client.upload_file(object_name, file_content, file.content_type)
+        if variants:
+            stored = variants["original"]
+            content_type = stored["content_type"]
+            file_size = len(stored["data"])
+            success = await upload_image_variants(object_name, variants)
+        else:
+            # 无法解码时按原样流式上传到MinIO（线程池中执行）
+            content_type = file.content_type
+            success = await asyncio.to_thread(
+                minio_client.upload_stream, object_name, file.file, file_size, file.content_type
+            )
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="文件上传失败"
             )
         print("上传图片结束-minio")
+
+        await async_cache_service.cache_image_hash(object_name, image_hash, settings.cache_food_analysis_ttl)
+        phash = None
+        if settings.image_phash_enabled:
+            # 感知哈希按视觉模型输入图计算，与分析时一致（已按EXIF方向摆正）
+            phash = await asyncio.to_thread(perceptual_hash, variants["model"]["data"] if variants else file.file)
+            if phash:
+                await async_cache_service.register_perceptual_hash(current_user.id, phash, image_hash, settings.cache_food_analysis_ttl)
         # 获取文件URL
         file_url = minio_client.get_file_url(object_name)  # 使用默认有效期，7天
+        thumbnail_url = minio_client.get_file_url(image_variant_object_name(object_name, "thumbnail")) \
+            if variants else file_url
         print("获取文件URL结束")
         return BaseResponse(
             success=True,
@@ -953,8 +1118,13 @@ async def upload_food_image(
                 "file_name": file.filename,
                 "file_url": file_url,
                 "object_name": object_name,  # 用于存储到数据库
-                "file_size": len(file_content),
-                "content_type": file.content_type,
+                "thumbnail_url": thumbnail_url,
+                "file_size": file_size,
+                "content_type": content_type,
+                "width": variants["original"]["width"] if variants else None,
+                "height": variants["original"]["height"] if variants else None,
+                "content_hash": image_hash,
+                "perceptual_hash": phash,
                 "upload_time": datetime.utcnow().isoformat()
             }
         )
@@ -1083,18 +1253,14 @@ async def get_food_image_data(
                 detail="获取图片信息失败"
             )
 
-        # 下载图片数据
-        image_data = minio_client.download_file(object_name)
-        if not image_data:
+        # 流式下载并增量编码为base64（线程池中执行）
+        image_base64 = await asyncio.to_thread(minio_client.download_base64, object_name)
+        if not image_base64:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="下载图片失败"
             )
 
-        # 将图片数据编码为base64
-        import base64
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
-
         return BaseResponse(
             success=True,
             message="获取图片数据成功",
@@ -1115,57 +1281,74 @@ async def get_food_image_data(
         )
 
 
-# 辅助函数
-async def create_daily_nutrition_summary(user_id: int, summary_date: date, db: Session) -> DailyNutritionSummary:
-    """创建每日营养汇总"""
-    # 统计当天的所有食物记录的营养信息
-    nutrition_stats = db.query(
-        func.sum(NutritionDetail.calories).label('total_calories'),
-        func.sum(NutritionDetail.protein).label('total_protein'),
-        func.sum(NutritionDetail.fat).label('total_fat'),
-        func.sum(NutritionDetail.carbohydrates).label('total_carbohydrates'),
-        func.sum(NutritionDetail.dietary_fiber).label('total_fiber'),
-        func.sum(NutritionDetail.sodium).label('total_sodium'),
-        func.count(FoodRecord.id).label('meal_count')
-    ).select_from(FoodRecord).join(
-        NutritionDetail, FoodRecord.id == NutritionDetail.food_record_id
-    ).filter(
-        FoodRecord.user_id == user_id,
-        FoodRecord.record_date == summary_date
-    ).first()
+@router.get("/analysis-cache/stats", response_model=BaseResponse)
+async def get_food_analysis_cache_stats(
+        current_user: User = Depends(get_current_user)
+):
+    """获取食物图片分析缓存命中统计"""
+    try:
+        stats = await async_cache_service.get_food_analysis_stats()
+        hit = int(stats.get("hit", 0))
+        near_hit = int(stats.get("near_hit", 0))
+        miss = int(stats.get("miss", 0))
+        total = hit + near_hit + miss
 
-    summary = DailyNutritionSummary(
-        user_id=user_id,
-        summary_date=summary_date,
-        total_calories=nutrition_stats.total_calories or 0,
-        total_protein=nutrition_stats.total_protein or 0,
-        total_fat=nutrition_stats.total_fat or 0,
-        total_carbohydrates=nutrition_stats.total_carbohydrates or 0,
-        total_fiber=nutrition_stats.total_fiber or 0,
-        total_sodium=nutrition_stats.total_sodium or 0,
-        meal_count=nutrition_stats.meal_count or 0,
-        water_intake=0,  # 默认值，后续可以从其他地方获取
-        exercise_calories=0,  # 默认值，后续可以从运动记录获取
-        health_score=None  # 后续计算健康评分
-    )
+        return BaseResponse(
+            success=True,
+            message="获取分析缓存统计成功",
+            data={
+                "hit": hit,
+                "near_hit": near_hit,
+                "miss": miss,
+                "total": total,
+                "hit_rate": round((hit + near_hit) / total, 4) if total else 0
+            }
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取分析缓存统计失败: {str(e)}"
+        )
 
-    db.add(summary)
-    db.commit()
-    db.refresh(summary)
 
-    return summary
+# 辅助函数
+# 每日汇总字段 -> 营养详情字段
+DAILY_SUMMARY_FIELDS = {
+    "total_calories": "calories",
+    "total_protein": "protein",
+    "total_fat": "fat",
+    "total_carbohydrates": "carbohydrates",
+    "total_fiber": "dietary_fiber",
+    "total_sodium": "sodium",
+}
+
+
+def daily_summary_upsert(user_id: int, summary_date: date, values: dict, accumulate: bool):
+    """
+    每日营养汇总的 INSERT ... ON CONFLICT DO UPDATE（冲突目标为 (user_id, summary_date) 唯一约束）
+    accumulate 为 True 时把 values 累加到已有行，否则用 values 覆盖已有行
+    """
+    table = DailyNutritionSummary.__table__
+    stmt = pg_insert(table).values(user_id=user_id, summary_date=summary_date, **values)
+    if accumulate:
+        updates = {field: func.coalesce(table.c[field], 0) + stmt.excluded[field] for field in values}
+    else:
+        updates = {field: stmt.excluded[field] for field in values}
+    return stmt.on_conflict_do_update(
+        constraint="uq_daily_summaries_user_date",
+        set_={**updates, "updated_at": func.now()}
+    )
 
 
-async def update_daily_nutrition_summary(user_id: int, summary_date: date, db: Session):
-    """更新每日营养汇总"""
-    # 重新计算当天的营养统计
+async def create_daily_nutrition_summary(user_id: int, summary_date: date, db: Session) -> DailyNutritionSummary:
+    """
+    按当天的食物记录重新计算每日营养汇总并写入（已存在时覆盖），同时重建所在的周/月汇总
+    与增量更新使用同一唯一约束，并发生成不会产生重复行
+    """
+    # 统计当天的所有食物记录的营养信息
     nutrition_stats = db.query(
-        func.sum(NutritionDetail.calories).label('total_calories'),
-        func.sum(NutritionDetail.protein).label('total_protein'),
-        func.sum(NutritionDetail.fat).label('total_fat'),
-        func.sum(NutritionDetail.carbohydrates).label('total_carbohydrates'),
-        func.sum(NutritionDetail.dietary_fiber).label('total_fiber'),
-        func.sum(NutritionDetail.sodium).label('total_sodium'),
+        *[func.sum(getattr(NutritionDetail, detail_field)).label(summary_field)
+          for summary_field, detail_field in DAILY_SUMMARY_FIELDS.items()],
         func.count(FoodRecord.id).label('meal_count')
     ).select_from(FoodRecord).join(
         NutritionDetail, FoodRecord.id == NutritionDetail.food_record_id
@@ -1174,31 +1357,28 @@ async def update_daily_nutrition_summary(user_id: int, summary_date: date, db: S
         FoodRecord.record_date == summary_date
     ).first()
 
-    # 获取或创建汇总记录
-    summary = db.query(DailyNutritionSummary).filter(
-        DailyNutritionSummary.user_id == user_id,
-        DailyNutritionSummary.summary_date == summary_date
-    ).first()
-
-    if not summary:
-        summary = DailyNutritionSummary(
-            user_id=user_id,
-            summary_date=summary_date
-        )
-        db.add(summary)
-
-    # 更新统计数据
-    summary.total_calories = nutrition_stats.total_calories or 0
-    summary.total_protein = nutrition_stats.total_protein or 0
-    summary.total_fat = nutrition_stats.total_fat or 0
-    summary.total_carbohydrates = nutrition_stats.total_carbohydrates or 0
-    summary.total_fiber = nutrition_stats.total_fiber or 0
-    summary.total_sodium = nutrition_stats.total_sodium or 0
-    summary.meal_count = nutrition_stats.meal_count or 0
-    summary.updated_at = datetime.utcnow()
-
+    values = {field: getattr(nutrition_stats, field) or 0 for field in [*DAILY_SUMMARY_FIELDS, "meal_count"]}
+    db.execute(daily_summary_upsert(user_id, summary_date, values, accumulate=False))
+    rebuild_nutrition_rollups(db, summary_date, summary_date, user_id)
     db.commit()
 
-    # 清除相关缓存
-    cache_key = f"nutrition:daily:{user_id}:{summary_date}"
-    cache_service.redis.delete(cache_key)
+    return db.query(DailyNutritionSummary).filter(
+        DailyNutritionSummary.user_id == user_id,
+        DailyNutritionSummary.summary_date == summary_date
+    ).one()
+
+
+async def apply_daily_nutrition_delta(user_id: int, summary_date: date, nutrition: NutritionDetail, db: Session,
+                                      sign: int = 1):
+    """
+    按一条营养详情增量更新每日营养汇总（sign=1 累加，sign=-1 扣减）
+    使用 INSERT ... ON CONFLICT DO UPDATE 原子累加，并重建所在的周/月汇总；
+    不提交事务，由调用者与营养详情一起提交后清除缓存，累计误差由定时对账任务修正
+    """
+    values = {
+        summary_field: sign * (getattr(nutrition, detail_field) or 0)
+        for summary_field, detail_field in DAILY_SUMMARY_FIELDS.items()
+    }
+    stmt = daily_summary_upsert(user_id, summary_date, {**values, "meal_count": sign}, accumulate=True)
+    db.execute(stmt)
+    rebuild_nutrition_rollups(db, summary_date, summary_date, user_id)
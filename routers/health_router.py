@@ -1,21 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from datetime import datetime, date, timedelta
 import math
 
-from shared.models.database import get_db
+from shared.models.database import get_db, get_async_db
 from shared.models.schemas import (
     BaseResponse, HealthAnalysisRequest, HealthAnalysisResponse,
     DateRangeParams
 )
 from shared.utils.auth import get_current_user
 from shared.models.user_models import User, UserProfile, HealthGoal, WeightRecord
-from shared.models.food_models import DailyNutritionSummary
-from shared.config.redis_config import cache_service
+from shared.utils.health_analytics import HealthAnalytics
+from shared.utils.cache import two_tier_cache
+from shared.config.redis_config import async_cache_service
+from shared.config.settings import get_settings
 
 
 router = APIRouter(prefix="/health", tags=["健康分析"])
+settings = get_settings()
 
 
 @router.post("/analysis", response_model=BaseResponse)
@@ -75,15 +80,6 @@ async def get_bmr(
 ):
     """计算基础代谢率(BMR)"""
     try:
-        # 先尝试从缓存获取
-        cached_bmr = cache_service.get_health_score(current_user.id)
-        if cached_bmr and "bmr" in cached_bmr:
-            return BaseResponse(
-                success=True,
-                message="获取BMR成功",
-                data=cached_bmr["bmr"]
-            )
-        
         result = await calculate_bmr(current_user.id, db)
         
         return BaseResponse(
@@ -177,10 +173,59 @@ async def get_health_score(
         )
 
 
+@router.get("/report", response_model=BaseResponse)
+async def get_health_report(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    start_date: Optional[date] = Query(None, description="开始日期"),
+    end_date: Optional[date] = Query(None, description="结束日期")
+):
+    """健康报告：一次返回BMR、TDEE、营养平衡与健康评分"""
+    try:
+        date_range = {}
+        if start_date:
+            date_range["start_date"] = start_date.isoformat()
+        if end_date:
+            date_range["end_date"] = end_date.isoformat()
+        start, end = resolve_date_range(date_range)
+        
+        # 检查缓存
+        cached_report = await async_cache_service.get_health_report(
+            current_user.id, start.isoformat(), end.isoformat()
+        )
+        if cached_report:
+            return BaseResponse(
+                success=True,
+                message="健康报告生成完成",
+                data=cached_report
+            )
+        
+        context = HealthReportContext.load(current_user.id, db, start, end)
+        result = context.report()
+        
+        # 缓存结果
+        await async_cache_service.cache_health_report(
+            current_user.id, start.isoformat(), end.isoformat(), result, settings.cache_health_report_ttl
+        )
+        
+        return BaseResponse(
+            success=True,
+            message="健康报告生成完成",
+            data=result
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"健康报告生成失败: {str(e)}"
+        )
+
+
 @router.get("/weight-trend", response_model=BaseResponse)
 async def get_weight_trend(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     days: int = Query(30, description="天数", ge=7, le=365)
 ):
     """体重趋势分析"""
@@ -189,11 +234,14 @@ async def get_weight_trend(
         start_date = end_date - timedelta(days=days)
         
         # 获取体重记录
-        weight_records = db.query(WeightRecord).filter(
-            WeightRecord.user_id == current_user.id,
-            WeightRecord.measured_at >= start_date,
-            WeightRecord.measured_at <= end_date
-        ).order_by(WeightRecord.measured_at).all()
+        result = await db.execute(
+            select(WeightRecord).where(
+                WeightRecord.user_id == current_user.id,
+                WeightRecord.measured_at >= start_date,
+                WeightRecord.measured_at <= end_date
+            ).order_by(WeightRecord.measured_at)
+        )
+        weight_records = result.scalars().all()
         
         if not weight_records:
             return BaseResponse(
@@ -268,8 +316,39 @@ async def get_weight_trend(
 # 辅助函数
 async def calculate_bmr(user_id: int, db: Session) -> Dict[str, Any]:
     """计算基础代谢率"""
-    # 获取用户资料
+    return (await get_health_metrics(user_id, db))["bmr"]
+
+
+async def get_health_metrics(user_id: int, db: Session) -> Dict[str, Dict[str, Any]]:
+    """获取BMR与TDEE，按用户资料版本缓存，资料未变化时不查询数据库"""
+    profile_version = await async_cache_service.get_profile_version(user_id)
+    if profile_version is None:
+        # Redis不可用时无法确认版本，直接计算
+        profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+        return compute_health_metrics(profile)
+    return await load_health_metrics(user_id, profile_version, db)
+
+
+@two_tier_cache(
+    "health_metrics",
+    ttl=settings.cache_health_metrics_ttl,
+    # 年龄随日期变化，缓存键同时包含日期
+    key_builder=lambda user_id, profile_version: f"health:metrics:{user_id}:{profile_version}:{date.today().isoformat()}"
+)
+async def load_health_metrics(user_id: int, profile_version: Optional[int], db: Session) -> Dict[str, Dict[str, Any]]:
+    """查询用户资料并计算BMR与TDEE"""
     profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+    return compute_health_metrics(profile)
+
+
+def compute_health_metrics(profile: Optional[UserProfile]) -> Dict[str, Dict[str, Any]]:
+    """根据用户资料计算BMR与TDEE"""
+    bmr = compute_bmr(profile)
+    return {"bmr": bmr, "tdee": compute_tdee(profile, bmr)}
+
+
+def compute_bmr(profile: Optional[UserProfile]) -> Dict[str, Any]:
+    """根据用户资料计算基础代谢率"""
     if not profile or not profile.weight or not profile.height or not profile.gender or not profile.birth_date:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -305,12 +384,14 @@ async def calculate_bmr(user_id: int, db: Session) -> Dict[str, Any]:
 
 async def calculate_tdee(user_id: int, db: Session) -> Dict[str, Any]:
     """计算每日总能量消耗"""
-    # 先计算BMR
-    bmr_result = await calculate_bmr(user_id, db)
+    return (await get_health_metrics(user_id, db))["tdee"]
+
+
+def compute_tdee(profile: Optional[UserProfile], bmr_result: Dict[str, Any]) -> Dict[str, Any]:
+    """根据用户资料与BMR计算每日总能量消耗"""
     bmr = bmr_result["bmr"]
     
     # 获取活动水平
-    profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
     activity_level = profile.activity_level if profile else 2
     
     # 活动系数
@@ -344,9 +425,8 @@ async def calculate_tdee(user_id: int, db: Session) -> Dict[str, Any]:
     }
 
 
-async def analyze_nutrition_balance(user_id: int, date_range: Dict[str, str], db: Session) -> Dict[str, Any]:
-    """营养平衡分析"""
-    # 设置日期范围
+def resolve_date_range(date_range: Dict[str, str]) -> Tuple[date, date]:
+    """解析分析日期范围，默认最近7天"""
     if date_range.get("end_date"):
         end_date = datetime.fromisoformat(date_range["end_date"]).date()
     else:
@@ -356,137 +436,111 @@ async def analyze_nutrition_balance(user_id: int, date_range: Dict[str, str], db
         start_date = datetime.fromisoformat(date_range["start_date"]).date()
     else:
         start_date = end_date - timedelta(days=7)
+    return start_date, end_date
+
+
+async def analyze_nutrition_balance(user_id: int, date_range: Dict[str, str], db: Session,
+                                    analytics: Optional[HealthAnalytics] = None) -> Dict[str, Any]:
+    """营养平衡分析，analytics 为调用方已加载的范围数据（避免重复查询）"""
+    # 设置日期范围
+    start_date, end_date = resolve_date_range(date_range)
     
     # 获取营养汇总数据
-    summaries = db.query(DailyNutritionSummary).filter(
-        DailyNutritionSummary.user_id == user_id,
-        DailyNutritionSummary.summary_date >= start_date,
-        DailyNutritionSummary.summary_date <= end_date
-    ).all()
+    if analytics is None:
+        analytics = HealthAnalytics.load(db, [user_id], start_date, end_date)
     
-    if not summaries:
-        return {
-            "period": {
-                "start_date": start_date.isoformat(),
-                "end_date": end_date.isoformat()
-            },
-            "analysis": "暂无营养数据",
-            "recommendations": ["请记录饮食以获得营养分析"]
-        }
-    
-    # 计算平均值
-    total_days = len(summaries)
-    avg_calories = sum(float(s.total_calories) for s in summaries) / total_days
-    avg_protein = sum(float(s.total_protein) for s in summaries) / total_days
-    avg_fat = sum(float(s.total_fat) for s in summaries) / total_days
-    avg_carbs = sum(float(s.total_carbohydrates) for s in summaries) / total_days
-    avg_fiber = sum(float(s.total_fiber) for s in summaries) / total_days
-    avg_sodium = sum(float(s.total_sodium) for s in summaries) / total_days
+    if not analytics.days[analytics.index[user_id]]:
+        return analytics.nutrition_balance(user_id, 0, start_date, end_date)
     
     # 计算TDEE作为参考
     tdee_result = await calculate_tdee(user_id, db)
-    recommended_calories = tdee_result["tdee"]
-    
-    # 营养素比例分析
-    protein_calories = avg_protein * 4
-    fat_calories = avg_fat * 9
-    carb_calories = avg_carbs * 4
-    total_macro_calories = protein_calories + fat_calories + carb_calories
-    
-    if total_macro_calories > 0:
-        protein_percentage = (protein_calories / total_macro_calories) * 100
-        fat_percentage = (fat_calories / total_macro_calories) * 100
-        carb_percentage = (carb_calories / total_macro_calories) * 100
-    else:
-        protein_percentage = fat_percentage = carb_percentage = 0
-    
-    # 生成建议
-    recommendations = []
-    
-    # 热量分析
-    calorie_ratio = avg_calories / recommended_calories
-    if calorie_ratio < 0.8:
-        recommendations.append("热量摄入偏低，建议适量增加")
-    elif calorie_ratio > 1.2:
-        recommendations.append("热量摄入偏高，建议适量减少")
-    
-    # 蛋白质分析
-    if protein_percentage < 10:
-        recommendations.append("蛋白质摄入不足，建议增加优质蛋白质")
-    elif protein_percentage > 35:
-        recommendations.append("蛋白质摄入过多，建议适量减少")
-    
-    # 脂肪分析
-    if fat_percentage < 20:
-        recommendations.append("脂肪摄入偏低，建议适量增加健康脂肪")
-    elif fat_percentage > 35:
-        recommendations.append("脂肪摄入过多，建议减少饱和脂肪")
-    
-    # 碳水化合物分析
-    if carb_percentage < 45:
-        recommendations.append("碳水化合物摄入偏低，建议增加复合碳水")
-    elif carb_percentage > 65:
-        recommendations.append("碳水化合物摄入过多，建议适量减少")
-    
-    # 膳食纤维分析
-    if avg_fiber < 25:
-        recommendations.append("膳食纤维摄入不足，建议多吃蔬菜水果")
-    
-    # 钠摄入分析
-    if avg_sodium > 2300:
-        recommendations.append("钠摄入过多，建议减少盐分摄入")
-    
-    if not recommendations:
-        recommendations.append("营养平衡良好，请继续保持")
-    
-    return {
-        "period": {
-            "start_date": start_date.isoformat(),
-            "end_date": end_date.isoformat(),
-            "days": total_days
-        },
-        "averages": {
-            "calories": round(avg_calories, 1),
-            "protein": round(avg_protein, 1),
-            "fat": round(avg_fat, 1),
-            "carbohydrates": round(avg_carbs, 1),
-            "fiber": round(avg_fiber, 1),
-            "sodium": round(avg_sodium, 1)
-        },
-        "percentages": {
-            "protein": round(protein_percentage, 1),
-            "fat": round(fat_percentage, 1),
-            "carbohydrates": round(carb_percentage, 1)
-        },
-        "reference": {
-            "recommended_calories": round(recommended_calories, 1),
-            "calorie_ratio": round(calorie_ratio, 2)
-        },
-        "recommendations": recommendations
-    }
+    return analytics.nutrition_balance(user_id, tdee_result["tdee"], start_date, end_date)
 
 
 async def calculate_health_score(user_id: int, date_range: Dict[str, str], db: Session) -> Dict[str, Any]:
     """计算健康评分"""
     # 设置日期范围
-    if date_range.get("end_date"):
-        end_date = datetime.fromisoformat(date_range["end_date"]).date()
-    else:
-        end_date = date.today()
-    
-    if date_range.get("start_date"):
-        start_date = datetime.fromisoformat(date_range["start_date"]).date()
-    else:
-        start_date = end_date - timedelta(days=7)
-    
+    start_date, end_date = resolve_date_range(date_range)
+    
+    # 用户资料与范围内的营养汇总各读取一次，供营养平衡与各项评分共用
+    return HealthReportContext.load(user_id, db, start_date, end_date).health_score()
+
+
+class HealthReportContext:
+    """
+    单次请求内的健康分析上下文：用户资料与日期范围内的营养汇总各加载一次，
+    BMR、TDEE、营养平衡与健康评分均由其计算，各项结果在上下文内只计算一次
+    """
+
+    def __init__(self, user_id: int, profile: Optional[UserProfile], analytics: HealthAnalytics,
+                 start_date: date, end_date: date):
+        self.user_id = user_id
+        self.profile = profile
+        self.analytics = analytics
+        self.start_date = start_date
+        self.end_date = end_date
+        self._results: Dict[str, Any] = {}
+
+    @classmethod
+    def load(cls, user_id: int, db: Session, start_date: date, end_date: date) -> "HealthReportContext":
+        """加载用户资料与日期范围内的营养汇总"""
+        profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+        analytics = HealthAnalytics.load(db, [user_id], start_date, end_date)
+        return cls(user_id, profile, analytics, start_date, end_date)
+
+    def _memoize(self, name: str, compute) -> Any:
+        if name not in self._results:
+            self._results[name] = compute()
+        return self._results[name]
+
+    def bmr(self) -> Dict[str, Any]:
+        return self._memoize("bmr", lambda: compute_bmr(self.profile))
+
+    def tdee(self) -> Dict[str, Any]:
+        return self._memoize("tdee", lambda: compute_tdee(self.profile, self.bmr()))
+
+    def has_nutrition_data(self) -> bool:
+        return bool(self.analytics.days[self.analytics.index[self.user_id]])
+
+    def nutrition_balance(self) -> Dict[str, Any]:
+        # 无营养记录时不需要推荐热量，资料不完整也能返回
+        return self._memoize("nutrition_balance", lambda: self.analytics.nutrition_balance(
+            self.user_id, self.tdee()["tdee"] if self.has_nutrition_data() else 0, self.start_date, self.end_date
+        ))
+
+    def health_score(self) -> Dict[str, Any]:
+        return self._memoize("health_score", lambda: build_health_score(
+            self.user_id, self.profile, self.analytics, self.nutrition_balance(), self.start_date, self.end_date
+        ))
+
+    def report(self) -> Dict[str, Any]:
+        """生成包含全部分析结果的健康报告"""
+        return {
+            "bmr": self.bmr(),
+            "tdee": self.tdee(),
+            "nutrition_balance": self.nutrition_balance(),
+            "health_score": self.health_score(),
+            "period": {
+                "start_date": self.start_date.isoformat(),
+                "end_date": self.end_date.isoformat()
+            },
+            "generated_at": datetime.utcnow().isoformat()
+        }
+
+
+def build_health_score(user_id: int, profile: Optional[UserProfile], analytics: HealthAnalytics,
+                       nutrition_analysis: Dict[str, Any], start_date: date, end_date: date) -> Dict[str, Any]:
+    """根据已加载的用户资料、营养汇总与营养平衡分析计算健康评分"""
     score_components = {}
     total_score = 0
     max_score = 0
     
     # 营养平衡评分 (40分)
-    nutrition_analysis = await analyze_nutrition_balance(user_id, date_range, db)
-    if "averages" in nutrition_analysis:
-        nutrition_score = calculate_nutrition_score(nutrition_analysis)
+    recommended_calories = {user_id: nutrition_analysis["reference"]["recommended_calories"]} \
+        if "reference" in nutrition_analysis else {}
+    scores = analytics.score_components(recommended_calories)[user_id]
+    if "nutrition" in scores:
+        nutrition_score = scores["nutrition"]
         score_components["nutrition"] = {
             "score": nutrition_score,
             "max_score": 40,
@@ -496,7 +550,6 @@ async def calculate_health_score(user_id: int, date_range: Dict[str, str], db: S
     max_score += 40
     
     # BMI评分 (20分)
-    profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
     if profile and profile.bmi:
         bmi_score = calculate_bmi_score(float(profile.bmi))
         score_components["bmi"] = {
@@ -508,14 +561,8 @@ async def calculate_health_score(user_id: int, date_range: Dict[str, str], db: S
     max_score += 20
     
     # 饮食规律性评分 (20分)
-    summaries = db.query(DailyNutritionSummary).filter(
-        DailyNutritionSummary.user_id == user_id,
-        DailyNutritionSummary.summary_date >= start_date,
-        DailyNutritionSummary.summary_date <= end_date
-    ).all()
-    
-    if summaries:
-        regularity_score = calculate_diet_regularity_score(summaries)
+    if "regularity" in scores:
+        regularity_score = scores["regularity"]
         score_components["regularity"] = {
             "score": regularity_score,
             "max_score": 20,
@@ -525,9 +572,8 @@ async def calculate_health_score(user_id: int, date_range: Dict[str, str], db: S
     max_score += 20
     
     # 水分摄入评分 (10分)
-    if summaries:
-        avg_water = sum(float(s.water_intake) for s in summaries) / len(summaries)
-        water_score = calculate_water_score(avg_water)
+    if "water" in scores:
+        water_score = scores["water"]
         score_components["water"] = {
             "score": water_score,
             "max_score": 10,
@@ -537,9 +583,8 @@ async def calculate_health_score(user_id: int, date_range: Dict[str, str], db: S
     max_score += 10
     
     # 运动评分 (10分)
-    if summaries:
-        avg_exercise = sum(float(s.exercise_calories) for s in summaries) / len(summaries)
-        exercise_score = calculate_exercise_score(avg_exercise)
+    if "exercise" in scores:
+        exercise_score = scores["exercise"]
         score_components["exercise"] = {
             "score": exercise_score,
             "max_score": 10,
@@ -580,49 +625,6 @@ async def calculate_health_score(user_id: int, date_range: Dict[str, str], db: S
     }
 
 
-def calculate_nutrition_score(nutrition_analysis: Dict[str, Any]) -> float:
-    """计算营养评分"""
-    score = 0
-    
-    # 热量平衡 (15分)
-    calorie_ratio = nutrition_analysis["reference"]["calorie_ratio"]
-    if 0.9 <= calorie_ratio <= 1.1:
-        score += 15
-    elif 0.8 <= calorie_ratio <= 1.2:
-        score += 10
-    elif 0.7 <= calorie_ratio <= 1.3:
-        score += 5
-    
-    # 蛋白质比例 (10分)
-    protein_pct = nutrition_analysis["percentages"]["protein"]
-    if 15 <= protein_pct <= 25:
-        score += 10
-    elif 10 <= protein_pct <= 30:
-        score += 7
-    elif 8 <= protein_pct <= 35:
-        score += 4
-    
-    # 脂肪比例 (10分)
-    fat_pct = nutrition_analysis["percentages"]["fat"]
-    if 25 <= fat_pct <= 30:
-        score += 10
-    elif 20 <= fat_pct <= 35:
-        score += 7
-    elif 15 <= fat_pct <= 40:
-        score += 4
-    
-    # 膳食纤维 (5分)
-    fiber = nutrition_analysis["averages"]["fiber"]
-    if fiber >= 25:
-        score += 5
-    elif fiber >= 20:
-        score += 3
-    elif fiber >= 15:
-        score += 1
-    
-    return score
-
-
 def calculate_bmi_score(bmi: float) -> float:
     """计算BMI评分"""
     if 18.5 <= bmi <= 24.9:
@@ -635,54 +637,3 @@ def calculate_bmi_score(bmi: float) -> float:
         return 5
     else:
         return 0
-
-
-def calculate_diet_regularity_score(summaries) -> float:
-    """计算饮食规律性评分"""
-    if not summaries:
-        return 0
-    
-    # 计算每日餐次的标准差
-    meal_counts = [s.meal_count for s in summaries]
-    avg_meals = sum(meal_counts) / len(meal_counts)
-    
-    if avg_meals >= 3:
-        base_score = 15
-    elif avg_meals >= 2:
-        base_score = 10
-    else:
-        base_score = 5
-    
-    # 规律性加分
-    if len(set(meal_counts)) <= 2:  # 餐次变化不大
-        base_score += 5
-    
-    return min(base_score, 20)
-
-
-def calculate_water_score(water_intake: float) -> float:
-    """计算水分摄入评分"""
-    if water_intake >= 2.0:
-        return 10
-    elif water_intake >= 1.5:
-        return 7
-    elif water_intake >= 1.0:
-        return 4
-    elif water_intake >= 0.5:
-        return 2
-    else:
-        return 0
-
-
-def calculate_exercise_score(exercise_calories: float) -> float:
-    """计算运动评分"""
-    if exercise_calories >= 300:
-        return 10
-    elif exercise_calories >= 200:
-        return 7
-    elif exercise_calories >= 100:
-        return 4
-    elif exercise_calories >= 50:
-        return 2
-    else:
-        return 0 
\ No newline at end of file
@@ -17,7 +17,8 @@ from shared.models.schemas import (
 )
 from shared.utils.auth import get_current_user
 from shared.models.user_models import User, UserProfile, HealthGoal, Disease, Allergy, WeightRecord
-from shared.config.redis_config import cache_service
+from shared.config.redis_config import async_cache_service
+from shared.utils.pagination import paginate_keyset, filter_signature, cached_total
 
 router = APIRouter(prefix="/users", tags=["用户", "用户管理"])
 logger = logging.getLogger(__name__)
@@ -63,6 +64,21 @@ def calculate_bmi(height: Optional[float], weight: Optional[float]) -> Optional[
         return round(weight / (height_m ** 2), 2)
     return None
 
+# 影响BMR/TDEE计算的资料字段，任一变化时递增用户资料版本
+PROFILE_METRIC_FIELDS = ("weight", "height", "birth_date", "gender", "activity_level")
+
+
+def profile_metric_snapshot(profile: Optional[UserProfile]) -> tuple:
+    """提取资料中影响BMR/TDEE的字段值"""
+    return tuple(getattr(profile, field, None) for field in PROFILE_METRIC_FIELDS)
+
+
+async def bump_profile_version_if_changed(user_id: int, before: tuple, profile: Optional[UserProfile]):
+    """资料中影响BMR/TDEE的字段有变化时递增资料版本，使派生指标缓存失效"""
+    if profile_metric_snapshot(profile) != before:
+        await async_cache_service.bump_profile_version(user_id)
+
+
 def format_profile_data(profile: UserProfile) -> dict:
     """格式化用户资料数据 - 只使用数据库中存在的字段"""
     return {
@@ -101,7 +117,7 @@ async def get_user_profile(
     """获取用户资料"""
     try:
         # 先尝试从缓存获取
-        cached_profile = cache_service.get_user_profile(current_user.id)
+        cached_profile = await async_cache_service.get_user_profile(current_user.id)
         if cached_profile:
             return BaseResponse(
                 success=True,
@@ -131,7 +147,7 @@ async def get_user_profile(
         profile_data = format_profile_data(profile)
         
         # 缓存用户资料
-        cache_service.cache_user_profile(current_user.id, profile_data)
+        await async_cache_service.cache_user_profile(current_user.id, profile_data)
         
         return BaseResponse(
             success=True,
@@ -153,6 +169,8 @@ async def update_user_profile(
         # 获取现有资料
         profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
         
+        metrics_before = profile_metric_snapshot(profile)
+        
         if not profile:
             # 如果没有资料，创建新的
             profile = UserProfile(user_id=current_user.id)
@@ -174,7 +192,8 @@ async def update_user_profile(
         db.refresh(profile)
         
         # 清除缓存
-        cache_service.clear_user_cache(current_user.id)
+        await bump_profile_version_if_changed(current_user.id, metrics_before, profile)
+        await async_cache_service.clear_user_cache(current_user.id)
         
         return BaseResponse(
             success=True,
@@ -213,6 +232,9 @@ async def create_health_goal(
         db.commit()
         db.refresh(health_goal)
         
+        # 清除缓存
+        await async_cache_service.clear_user_cache(current_user.id)
+        
         return BaseResponse(
             success=True,
             message="健康目标创建成功",
@@ -297,6 +319,9 @@ async def update_health_goal(
         db.commit()
         db.refresh(goal)
         
+        # 清除缓存
+        await async_cache_service.clear_user_cache(current_user.id)
+        
         return BaseResponse(
             success=True,
             message="健康目标更新成功",
@@ -338,6 +363,9 @@ async def add_disease(
         db.commit()
         db.refresh(disease)
         
+        # 清除缓存
+        await async_cache_service.clear_user_cache(current_user.id)
+        
         return BaseResponse(
             success=True,
             message="疾病信息添加成功",
@@ -416,6 +444,9 @@ async def add_allergy(
         db.commit()
         db.refresh(allergy)
         
+        # 清除缓存
+        await async_cache_service.clear_user_cache(current_user.id)
+        
         return BaseResponse(
             success=True,
             message="过敏信息添加成功",
@@ -496,16 +527,19 @@ async def add_weight_record(
         db.add(weight_record)
         db.commit()
         db.refresh(weight_record)
+        await async_cache_service.clear_list_total(current_user.id, "weight_records")
         
         # 更新用户资料中的体重
         if user_profile:
+            metrics_before = profile_metric_snapshot(user_profile)
             user_profile.weight = weight_data.weight
             user_profile.bmi = bmi
             user_profile.updated_at = datetime.utcnow()
             db.commit()
             
             # 清除缓存
-            cache_service.clear_user_cache(current_user.id)
+            await bump_profile_version_if_changed(current_user.id, metrics_before, user_profile)
+            await async_cache_service.clear_user_cache(current_user.id)
         
         return BaseResponse(
             success=True,
@@ -534,7 +568,9 @@ async def get_weight_records(
     db: Session = Depends(get_db),
     start_date: Optional[date] = Query(None, description="开始日期"),
     end_date: Optional[date] = Query(None, description="结束日期"),
-    limit: int = Query(50, description="记录数量限制")
+    limit: int = Query(50, description="记录数量限制"),
+    cursor: Optional[str] = Query(None, description="分页游标，传入后启用游标分页（首页传空字符串）"),
+    include_total: bool = Query(False, description="游标分页时是否返回总数")
 ):
     """获取体重记录列表"""
     try:
@@ -545,7 +581,23 @@ async def get_weight_records(
         if end_date:
             query = query.filter(WeightRecord.measured_at <= end_date)
         
-        records = query.order_by(WeightRecord.measured_at.desc()).limit(limit).all()
+        if cursor is not None:
+            # 游标分页，基于 (measured_at, id) 定位
+            try:
+                records, next_cursor = paginate_keyset(
+                    query,
+                    [WeightRecord.measured_at, WeightRecord.id],
+                    cursor,
+                    limit,
+                    cursor_types=[datetime, int]
+                )
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+        else:
+            records = query.order_by(WeightRecord.measured_at.desc()).limit(limit).all()
         
         records_data = []
         for record in records:
@@ -562,11 +614,33 @@ async def get_weight_records(
                 "created_at": record.created_at.isoformat()
             })
         
+        if cursor is None:
+            return BaseResponse(
+                success=True,
+                message="获取体重记录列表成功",
+                data=records_data
+            )
+        
+        total = None
+        if include_total:
+            signature = filter_signature(start_date=start_date, end_date=end_date)
+            total = await cached_total(query, current_user.id, "weight_records", signature)
+        
         return BaseResponse(
             success=True,
             message="获取体重记录列表成功",
-            data=records_data
+            data={
+                "records": records_data,
+                "pagination": {
+                    "page_size": limit,
+                    "next_cursor": next_cursor,
+                    "has_more": next_cursor is not None,
+                    "total": total
+                }
+            }
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise handle_database_error(e, "获取体重记录列表")
 
@@ -622,6 +696,7 @@ async def update_onboarding_step(
     """更新用户引导步骤 - 简化版本"""
     try:
         profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
+        metrics_before = profile_metric_snapshot(profile)
         
         if not profile:
             profile = UserProfile(
@@ -646,7 +721,8 @@ async def update_onboarding_step(
         db.refresh(profile)
         
         # 清除缓存
-        cache_service.clear_user_cache(current_user.id)
+        await bump_profile_version_if_changed(current_user.id, metrics_before, profile)
+        await async_cache_service.clear_user_cache(current_user.id)
         
         return BaseResponse(
             success=True,
@@ -671,6 +747,7 @@ async def complete_onboarding(
     """完成用户引导并批量保存数据 - 简化版本"""
     try:
         profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
+        metrics_before = profile_metric_snapshot(profile)
         
         if not profile:
             profile = UserProfile(
@@ -763,7 +840,8 @@ async def complete_onboarding(
         db.commit()
         
         # 清除缓存
-        cache_service.clear_user_cache(current_user.id)
+        await bump_profile_version_if_changed(current_user.id, metrics_before, profile)
+        await async_cache_service.clear_user_cache(current_user.id)
         
         return BaseResponse(
             success=True,
@@ -796,7 +874,7 @@ async def reset_onboarding(
             db.commit()
             
             # 清除缓存
-            cache_service.clear_user_cache(current_user.id)
+            await async_cache_service.clear_user_cache(current_user.id)
         
         return BaseResponse(
             success=True,
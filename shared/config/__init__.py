@@ -1,5 +1,5 @@
 from .settings import Settings, get_settings
-from .redis_config import redis_manager, cache_service
+from .redis_config import redis_manager, cache_service, async_redis_manager, async_cache_service
 from .minio_config import minio_client
 
 __all__ = [
@@ -7,5 +7,7 @@ __all__ = [
     "get_settings", 
     "redis_manager",
     "cache_service",
+    "async_redis_manager",
+    "async_cache_service",
     "minio_client"
 ]
@@ -0,0 +1,105 @@
+import asyncio
+import uuid
+from typing import Optional
+
+import httpx
+from langgraph_sdk.client import LangGraphClient
+
+from .settings import get_settings
+from ..utils.hashing import json_fingerprint
+
+settings = get_settings()
+
+# 助手ID命名空间：相同 graph_id + configurable 始终映射到同一个助手
+ASSISTANT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "dietai/langgraph/assistants")
+
+
+class LangGraphManager:
+    """LangGraph客户端管理器（进程内共享连接池与助手）"""
+
+    def __init__(self, url: str = None):
+        self.url = url or settings.ai_service_url
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.client: Optional[LangGraphClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._assistants = {}
+        self._locks = {}
+
+    def _create_client(self):
+        """创建带连接池的客户端"""
+        transport = httpx.AsyncHTTPTransport(
+            retries=5,
+            limits=httpx.Limits(
+                max_connections=settings.ai_service_max_connections,
+                max_keepalive_connections=settings.ai_service_max_keepalive
+            )
+        )
+        self.http_client = httpx.AsyncClient(
+            base_url=self.url,
+            transport=transport,
+            timeout=httpx.Timeout(settings.ai_service_timeout, read=settings.ai_service_stream_timeout)
+        )
+        self.client = LangGraphClient(self.http_client)
+        self._loop = asyncio.get_running_loop()
+        self._locks = {}
+
+    async def startup(self):
+        """应用启动时初始化"""
+        if self.client is None:
+            self._create_client()
+
+    def get_client(self) -> LangGraphClient:
+        """获取LangGraph客户端"""
+        # 连接池绑定事件循环；在其他循环中（如后台任务的 asyncio.run）使用时重新创建
+        if self.client is None or self._loop is not asyncio.get_running_loop():
+            self._release_stale_client()
+            self._create_client()
+        return self.client
+
+    def _release_stale_client(self):
+        """
+        释放绑定其他事件循环的旧客户端：旧循环仍在运行时在该循环中关闭；
+        旧循环已关闭时连接无法再正常关闭，后台任务应通过 run_async 在自身循环结束前关闭
+        """
+        if self.http_client is None:
+            return
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.http_client.aclose(), self._loop)
+        self.http_client = None
+        self.client = None
+        self._loop = None
+
+    async def get_assistant_id(self, graph_id: str, configurable: dict = None) -> str:
+        """获取助手ID，同一 (graph_id, configurable) 只创建一次"""
+        configurable = configurable or {}
+        cache_key = (graph_id, json_fingerprint(configurable))
+        if cache_key in self._assistants:
+            return self._assistants[cache_key]
+
+        client = self.get_client()
+        lock = self._locks.setdefault(cache_key, asyncio.Lock())
+        async with lock:
+            if cache_key not in self._assistants:
+                assistant = await client.assistants.create(
+                    graph_id=graph_id,
+                    config={"configurable": configurable},
+                    assistant_id=str(uuid.uuid5(ASSISTANT_NAMESPACE, f"{graph_id}:{cache_key[1]}")),
+                    if_exists="do_nothing"
+                )
+                self._assistants[cache_key] = assistant["assistant_id"]
+        return self._assistants[cache_key]
+
+    async def close(self):
+        """应用关闭时释放连接"""
+        if self.http_client is not None:
+            try:
+                await self.http_client.aclose()
+            except Exception as e:
+                print(f"LangGraph client close error: {e}")
+        self.http_client = None
+        self.client = None
+        self._loop = None
+
+
+# 全局实例
+langgraph_manager = LangGraphManager()
@@ -3,10 +3,12 @@ from datetime import timedelta
 from minio import Minio
 from minio.error import S3Error
 import os
-from typing import Optional
+from typing import BinaryIO, Iterator, Optional
 import io
+import tempfile
 
 from .settings import get_settings
+from ..utils.streams import stream_size, b64encode_chunks
 
 settings = get_settings()
 
@@ -80,6 +82,30 @@ class MinioManager:
             print(f"Error uploading file: {e}")
             return False
     
+    def upload_stream(self, object_name: str, stream: BinaryIO, length: int = None,
+                      content_type: str = "application/octet-stream") -> bool:
+        """
+        流式上传文件（如 UploadFile 底层的 SpooledTemporaryFile），按 part_size 分块读取，不把整个文件读入内存
+        length 为空时由可定位的流计算
+        """
+        try:
+            self._ensure_initialized()
+            if length is None:
+                length = stream_size(stream)
+            stream.seek(0)
+            self.client.put_object(
+                bucket_name=self.bucket_name,
+                object_name=object_name,
+                data=stream,
+                length=length,
+                content_type=content_type,
+                part_size=settings.minio_part_size
+            )
+            return True
+        except S3Error as e:
+            print(f"Error uploading file: {e}")
+            return False
+    
     def upload_file_from_path(self, object_name: str, file_path: str, content_type: str = None) -> bool:
         """从路径上传文件"""
         try:
@@ -100,7 +126,44 @@ class MinioManager:
         try:
             self._ensure_initialized()
             response = self.client.get_object(self.bucket_name, object_name)
-            return response.read()
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
+        except S3Error as e:
+            print(f"Error downloading file: {e}")
+            return None
+    
+    def iter_file(self, object_name: str, chunk_size: int = None) -> Iterator[bytes]:
+        """按块流式下载文件，迭代结束或中断时关闭响应并归还连接"""
+        self._ensure_initialized()
+        response = self.client.get_object(self.bucket_name, object_name)
+        try:
+            yield from response.stream(chunk_size or settings.minio_stream_chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
+    
+    def download_to_spooled_file(self, object_name: str) -> Optional[BinaryIO]:
+        """
+        流式下载到临时文件（超过 upload_spool_max_size 时落盘），读取位置在开头，调用方负责关闭
+        """
+        spooled = tempfile.SpooledTemporaryFile(max_size=settings.upload_spool_max_size)
+        try:
+            for chunk in self.iter_file(object_name):
+                spooled.write(chunk)
+            spooled.seek(0)
+            return spooled
+        except S3Error as e:
+            spooled.close()
+            print(f"Error downloading file: {e}")
+            return None
+    
+    def download_base64(self, object_name: str) -> Optional[str]:
+        """流式下载并增量编码为base64，不保留原始文件内容"""
+        try:
+            return b64encode_chunks(self.iter_file(object_name))
         except S3Error as e:
             print(f"Error downloading file: {e}")
             return None
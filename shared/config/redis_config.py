@@ -1,5 +1,8 @@
+import asyncio
 import redis
+import redis.asyncio as aioredis
 import json
+import time
 from typing import Any, Optional, Union
 from datetime import timedelta
 import os
@@ -8,6 +11,9 @@ from .settings import get_settings
 
 settings = get_settings()
 
+# 进程内缓存失效广播频道
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+
 
 class RedisConfig:
     """Redis配置类"""
@@ -112,6 +118,56 @@ class RedisManager:
             print(f"Redis expire error: {e}")
             return False
     
+    def set_with_tag(self, key: str, value: Any, expire: int, tag_key: Union[str, list], tag_expire: int) -> bool:
+        """设置缓存并将键登记到标签集合（可为多个，管道一次往返），便于按标签批量失效"""
+        try:
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, ensure_ascii=False)
+            with self.client.pipeline(transaction=False) as pipe:
+                pipe.set(key, value, ex=expire)
+                for tag in ([tag_key] if isinstance(tag_key, str) else tag_key):
+                    pipe.sadd(tag, key)
+                    pipe.expire(tag, tag_expire)
+                return bool(pipe.execute()[0])
+        except Exception as e:
+            print(f"Redis set error: {e}")
+            return False
+
+    def unlink_tag(self, tag_key: str, extra_keys: list = None) -> int:
+        """删除标签集合登记的所有键及标签本身：一次 SMEMBERS 加一次管道 UNLINK"""
+        try:
+            keys = set(self.client.smembers(tag_key)) | set(extra_keys or [])
+            with self.client.pipeline(transaction=False) as pipe:
+                pipe.unlink(*keys, tag_key)
+                return pipe.execute()[0]
+        except Exception as e:
+            print(f"Redis unlink error: {e}")
+            return 0
+
+    def unlink_by_scan(self, pattern: str, batch_size: int = 500) -> int:
+        """按模式 SCAN 并分批 UNLINK（不阻塞 Redis，用于迁移期兜底）"""
+        deleted = 0
+        try:
+            batch = []
+            for key in self.client.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += self.client.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += self.client.unlink(*batch)
+        except Exception as e:
+            print(f"Redis scan error: {e}")
+        return deleted
+
+    def publish(self, channel: str, message: Any) -> int:
+        """发布消息"""
+        try:
+            return self.client.publish(channel, json.dumps(message, ensure_ascii=False))
+        except Exception as e:
+            print(f"Redis publish error: {e}")
+            return 0
+
     def hset(self, name: str, key: str, value: Any) -> bool:
         """设置哈希字段"""
         try:
@@ -152,6 +208,25 @@ class RedisManager:
             print(f"Redis hgetall error: {e}")
             return {}
 
+def user_cache_tag(user_id: int) -> str:
+    """用户缓存标签集合键，登记该用户所有按用户缓存的键"""
+    return f"user:cache_keys:{user_id}"
+
+
+def health_report_tag(user_id: int) -> str:
+    """健康报告标签集合键，登记该用户各日期范围的健康报告缓存，营养数据变化时一并失效"""
+    return f"health:score_keys:{user_id}"
+
+
+def user_cache_fixed_keys(user_id: int) -> list:
+    """用户固定的缓存键（无论是否登记到标签集合都需清除）"""
+    return [
+        f"user:profile:{user_id}",
+        f"user:session:{user_id}",
+        f"health:score:{user_id}"
+    ]
+
+
 class CacheService:
     """缓存服务"""
     
@@ -162,7 +237,7 @@ class CacheService:
     def cache_user_profile(self, user_id: int, profile_data: dict, expire_seconds: int = 3600):
         """缓存用户资料"""
         key = f"user:profile:{user_id}"
-        return self.redis.set(key, profile_data, expire_seconds)
+        return self.redis.set_with_tag(key, profile_data, expire_seconds, user_cache_tag(user_id), settings.cache_tag_ttl)
     
     def get_user_profile(self, user_id: int) -> Optional[dict]:
         """获取用户资料缓存"""
@@ -172,7 +247,7 @@ class CacheService:
     def cache_user_session(self, user_id: int, session_data: dict, expire_seconds: int = 1800):
         """缓存用户会话"""
         key = f"user:session:{user_id}"
-        return self.redis.set(key, session_data, expire_seconds)
+        return self.redis.set_with_tag(key, session_data, expire_seconds, user_cache_tag(user_id), settings.cache_tag_ttl)
     
     def get_user_session(self, user_id: int) -> Optional[dict]:
         """获取用户会话缓存"""
@@ -183,7 +258,7 @@ class CacheService:
     def cache_daily_nutrition(self, user_id: int, date: str, nutrition_data: dict, expire_seconds: int = 7200):
         """缓存每日营养汇总"""
         key = f"nutrition:daily:{user_id}:{date}"
-        return self.redis.set(key, nutrition_data, expire_seconds)
+        return self.redis.set_with_tag(key, nutrition_data, expire_seconds, user_cache_tag(user_id), settings.cache_tag_ttl)
     
     def get_daily_nutrition(self, user_id: int, date: str) -> Optional[dict]:
         """获取每日营养汇总缓存"""
@@ -200,12 +275,47 @@ class CacheService:
         """获取食物分析结果缓存"""
         key = f"food:analysis:{image_hash}"
         return self.redis.get(key)
+
+    def cache_image_hash(self, object_name: str, image_hash: str, expire_seconds: int = 86400 * 7):
+        """缓存图片对象对应的内容哈希"""
+        key = f"food:image:hash:{object_name}"
+        return self.redis.set(key, image_hash, expire_seconds)
+
+    def get_image_hash(self, object_name: str) -> Optional[str]:
+        """获取图片对象对应的内容哈希"""
+        key = f"food:image:hash:{object_name}"
+        value = self.redis.get(key)
+        return str(value) if value is not None else None
+
+    def register_perceptual_hash(self, user_id: int, phash: str, image_hash: str, expire_seconds: int = 86400 * 7):
+        """登记用户图片的感知哈希，用于近似重复查找"""
+        key = f"food:image:phash:{user_id}"
+        result = self.redis.hset(key, phash, image_hash)
+        self.redis.expire(key, expire_seconds)
+        return result
+
+    def get_perceptual_hashes(self, user_id: int) -> dict:
+        """获取用户已登记的感知哈希"""
+        key = f"food:image:phash:{user_id}"
+        return {phash: str(image_hash) for phash, image_hash in self.redis.hgetall(key).items()}
+
+    def incr_food_analysis_stat(self, field: str) -> int:
+        """累加食物分析缓存命中统计"""
+        try:
+            return self.redis.client.hincrby("stats:food_analysis_cache", field, 1)
+        except Exception as e:
+            print(f"Redis hincrby error: {e}")
+            return 0
+
+    def get_food_analysis_stats(self) -> dict:
+        """获取食物分析缓存命中统计"""
+        return self.redis.hgetall("stats:food_analysis_cache")
     
     # 健康评分缓存
     def cache_health_score(self, user_id: int, score_data: dict, expire_seconds: int = 3600):
         """缓存健康评分"""
         key = f"health:score:{user_id}"
-        return self.redis.set(key, score_data, expire_seconds)
+        return self.redis.set_with_tag(key, score_data, expire_seconds, user_cache_tag(user_id), settings.cache_tag_ttl)
     
     def get_health_score(self, user_id: int) -> Optional[dict]:
         """获取健康评分缓存"""
@@ -223,24 +333,465 @@ class CacheService:
         key = f"conversation:context:{session_id}"
         return self.redis.get(key)
     
+    # 列表总数缓存（按筛选条件签名存放在同一个哈希中，便于整体失效）
+    def cache_list_total(self, user_id: int, scope: str, signature: str, total: int, expire_seconds: int = 600):
+        """缓存列表总数"""
+        key = f"list:total:{user_id}:{scope}"
+        result = self.redis.hset(key, signature, total)
+        self.redis.expire(key, expire_seconds)
+        return result
+
+    def get_list_total(self, user_id: int, scope: str, signature: str) -> Optional[int]:
+        """获取列表总数缓存"""
+        key = f"list:total:{user_id}:{scope}"
+        return self.redis.hget(key, signature)
+
+    def clear_list_total(self, user_id: int, scope: str):
+        """清除列表总数缓存"""
+        key = f"list:total:{user_id}:{scope}"
+        return self.redis.delete(key)
+
     def clear_user_cache(self, user_id: int):
-        """清除用户相关缓存"""
-        patterns = [
-            f"user:profile:{user_id}",
-            f"user:session:{user_id}",
-            f"nutrition:daily:{user_id}:*",
-            f"health:score:{user_id}"
-        ]
-        for pattern in patterns:
-            if "*" in pattern:
-                # 使用SCAN命令查找匹配的键
-                keys = self.redis.client.keys(pattern)
-                if keys:
-                    self.redis.client.delete(*keys)
-            else:
-                self.redis.delete(pattern)
+        """清除用户相关缓存：按用户标签集合一次性失效"""
+        tag_key = user_cache_tag(user_id)
+        # 标签集合不存在说明缓存写入于启用标签之前，迁移期用 SCAN 兜底
+        scan_needed = settings.cache_tag_scan_fallback and not self.redis.exists(tag_key)
+        deleted = self.redis.unlink_tag(tag_key, user_cache_fixed_keys(user_id))
+        if scan_needed:
+            deleted += self.redis.unlink_by_scan(f"nutrition:daily:{user_id}:*")
+        # 通知各进程清除该用户的本地缓存
+        self.redis.publish(CACHE_INVALIDATION_CHANNEL, {"user_id": user_id})
+        return deleted
+
+
+class AsyncRedisManager:
+    """异步Redis管理器（redis.asyncio），供异步路由使用，避免阻塞事件循环"""
+
+    def __init__(self, config: RedisConfig = None):
+        self.config = config or RedisConfig()
+        self.pool = None
+        self.client = None
+        self._loop = None
+
+    async def connect(self):
+        """创建连接池（应用启动时调用）"""
+        self.pool = aioredis.BlockingConnectionPool(
+            host=self.config.host,
+            port=self.config.port,
+            password=self.config.password,
+            db=self.config.db,
+            decode_responses=self.config.decode_responses,
+            max_connections=settings.redis_async_max_connections,
+            timeout=settings.redis_async_pool_timeout
+        )
+        self.client = aioredis.Redis(connection_pool=self.pool)
+        self._loop = asyncio.get_running_loop()
+
+    @staticmethod
+    async def _close_pool(client: aioredis.Redis, pool: aioredis.ConnectionPool):
+        try:
+            await client.aclose()
+            await pool.disconnect()
+        except Exception as e:
+            print(f"Redis close error: {e}")
+
+    async def close(self):
+        """关闭连接池（应用关闭或后台任务的事件循环结束前调用）"""
+        if self.client is not None:
+            await self._close_pool(self.client, self.pool)
+        self.pool = None
+        self.client = None
+        self._loop = None
+
+    def _release_stale_pool(self):
+        """
+        释放绑定其他事件循环的旧连接池：旧循环仍在运行时在该循环中关闭；
+        旧循环已关闭时连接无法再正常关闭，后台任务应通过 run_async 在自身循环结束前关闭
+        """
+        if self.client is None:
+            return
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._close_pool(self.client, self.pool), self._loop)
+        self.pool = None
+        self.client = None
+        self._loop = None
+
+    async def get_client(self) -> aioredis.Redis:
+        """获取异步Redis客户端"""
+        # 连接池绑定事件循环；未初始化或在其他循环中（如后台任务的 asyncio.run）使用时重新创建
+        if self.client is None or self._loop is not asyncio.get_running_loop():
+            self._release_stale_pool()
+            await self.connect()
+        return self.client
+
+    @staticmethod
+    def _dumps(value: Any) -> Any:
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        return value
+
+    @staticmethod
+    def _loads(value: Any) -> Any:
+        if value is None:
+            return None
+        try:
+            return json.loads(value)
+        except (json.JSONDecodeError, TypeError):
+            return value
+
+    @staticmethod
+    def _expire_seconds(expire: Optional[Union[int, timedelta]]) -> Optional[int]:
+        if isinstance(expire, timedelta):
+            return int(expire.total_seconds())
+        return int(expire) if expire else None
+
+    async def set(self, key: str, value: Any, expire: Optional[Union[int, timedelta]] = None) -> bool:
+        """设置缓存"""
+        try:
+            client = await self.get_client()
+            return bool(await client.set(key, self._dumps(value), ex=self._expire_seconds(expire)))
+        except Exception as e:
+            print(f"Redis set error: {e}")
+            return False
+
+    async def get(self, key: str) -> Optional[Any]:
+        """获取缓存"""
+        try:
+            client = await self.get_client()
+            return self._loads(await client.get(key))
+        except Exception as e:
+            print(f"Redis get error: {e}")
+            return None
+
+    async def delete(self, *keys: str) -> int:
+        """删除缓存"""
+        if not keys:
+            return 0
+        try:
+            client = await self.get_client()
+            return await client.delete(*keys)
+        except Exception as e:
+            print(f"Redis delete error: {e}")
+            return 0
+
+    async def exists(self, key: str) -> bool:
+        """检查键是否存在"""
+        try:
+            client = await self.get_client()
+            return bool(await client.exists(key))
+        except Exception as e:
+            print(f"Redis exists error: {e}")
+            return False
+
+    async def mget(self, keys: list) -> list:
+        """批量获取缓存（一次往返）"""
+        if not keys:
+            return []
+        try:
+            client = await self.get_client()
+            return [self._loads(value) for value in await client.mget(keys)]
+        except Exception as e:
+            print(f"Redis mget error: {e}")
+            return [None] * len(keys)
+
+    async def set_many(self, mapping: dict, expire: Optional[Union[int, timedelta]] = None) -> bool:
+        """批量设置缓存（管道一次往返）"""
+        if not mapping:
+            return True
+        try:
+            client = await self.get_client()
+            expire_seconds = self._expire_seconds(expire)
+            async with client.pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.set(key, self._dumps(value), ex=expire_seconds)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            print(f"Redis set_many error: {e}")
+            return False
+
+    async def set_with_tag(self, key: str, value: Any, expire: int, tag_key: Union[str, list], tag_expire: int) -> bool:
+        """设置缓存并将键登记到标签集合（可为多个，管道一次往返），便于按标签批量失效"""
+        try:
+            client = await self.get_client()
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.set(key, self._dumps(value), ex=expire)
+                for tag in ([tag_key] if isinstance(tag_key, str) else tag_key):
+                    pipe.sadd(tag, key)
+                    pipe.expire(tag, tag_expire)
+                return bool((await pipe.execute())[0])
+        except Exception as e:
+            print(f"Redis set error: {e}")
+            return False
+
+    async def unlink_tag(self, tag_key: str, extra_keys: list = None) -> int:
+        """删除标签集合登记的所有键及标签本身：一次 SMEMBERS 加一次管道 UNLINK"""
+        try:
+            client = await self.get_client()
+            keys = set(await client.smembers(tag_key)) | set(extra_keys or [])
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.unlink(*keys, tag_key)
+                return (await pipe.execute())[0]
+        except Exception as e:
+            print(f"Redis unlink error: {e}")
+            return 0
+
+    async def unlink_by_scan(self, pattern: str, batch_size: int = 500) -> int:
+        """按模式 SCAN 并分批 UNLINK（不阻塞 Redis，用于迁移期兜底）"""
+        deleted = 0
+        try:
+            client = await self.get_client()
+            batch = []
+            async for key in client.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += await client.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += await client.unlink(*batch)
+        except Exception as e:
+            print(f"Redis scan error: {e}")
+        return deleted
+
+    async def publish(self, channel: str, message: Any) -> int:
+        """发布消息"""
+        try:
+            client = await self.get_client()
+            return await client.publish(channel, json.dumps(message, ensure_ascii=False))
+        except Exception as e:
+            print(f"Redis publish error: {e}")
+            return 0
+
+    async def hset(self, name: str, key: str, value: Any) -> bool:
+        """设置哈希字段"""
+        try:
+            client = await self.get_client()
+            return bool(await client.hset(name, key, self._dumps(value)))
+        except Exception as e:
+            print(f"Redis hset error: {e}")
+            return False
+
+    async def hget(self, name: str, key: str) -> Optional[Any]:
+        """获取哈希字段"""
+        try:
+            client = await self.get_client()
+            return self._loads(await client.hget(name, key))
+        except Exception as e:
+            print(f"Redis hget error: {e}")
+            return None
+
+    async def hgetall(self, name: str) -> dict:
+        """获取所有哈希字段"""
+        try:
+            client = await self.get_client()
+            return {key: self._loads(value) for key, value in (await client.hgetall(name)).items()}
+        except Exception as e:
+            print(f"Redis hgetall error: {e}")
+            return {}
+
+    async def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        """累加哈希字段"""
+        try:
+            client = await self.get_client()
+            return await client.hincrby(name, key, amount)
+        except Exception as e:
+            print(f"Redis hincrby error: {e}")
+            return 0
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        """设置过期时间"""
+        try:
+            client = await self.get_client()
+            return bool(await client.expire(key, seconds))
+        except Exception as e:
+            print(f"Redis expire error: {e}")
+            return False
+
+
+class AsyncCacheService:
+    """异步缓存服务，键规则与 CacheService 一致，两者可以混用"""
+
+    def __init__(self, redis_manager: AsyncRedisManager):
+        self.redis = redis_manager
+
+    # 用户相关缓存
+    async def cache_user_profile(self, user_id: int, profile_data: dict, expire_seconds: int = 3600):
+        """缓存用户资料"""
+        key = f"user:profile:{user_id}"
+        return await self.redis.set_with_tag(key, profile_data, expire_seconds, user_cache_tag(user_id), settings.cache_tag_ttl)
+
+    async def get_user_profile(self, user_id: int) -> Optional[dict]:
+        """获取用户资料缓存"""
+        key = f"user:profile:{user_id}"
+        return await self.redis.get(key)
+
+    # 营养数据缓存
+    async def cache_daily_nutrition(self, user_id: int, date: str, nutrition_data: dict, expire_seconds: int = 7200):
+        """缓存每日营养汇总"""
+        key = f"nutrition:daily:{user_id}:{date}"
+        return await self.redis.set_with_tag(key, nutrition_data, expire_seconds, user_cache_tag(user_id), settings.cache_tag_ttl)
+
+    async def get_daily_nutrition(self, user_id: int, date: str) -> Optional[dict]:
+        """获取每日营养汇总缓存"""
+        key = f"nutrition:daily:{user_id}:{date}"
+        return await self.redis.get(key)
+
+    async def get_daily_nutrition_many(self, user_id: int, dates: list) -> dict:
+        """批量获取多日营养汇总缓存，返回 {日期: 数据}，未命中的日期不包含在结果中"""
+        keys = [f"nutrition:daily:{user_id}:{date}" for date in dates]
+        values = await self.redis.mget(keys)
+        return {date: value for date, value in zip(dates, values) if value is not None}
+
+    async def clear_daily_nutrition(self, user_id: int, date: str):
+        """清除每日营养汇总缓存"""
+        key = f"nutrition:daily:{user_id}:{date}"
+        deleted = await self.redis.delete(key)
+        # 健康报告基于营养汇总计算，随之失效
+        deleted += await self.redis.unlink_tag(health_report_tag(user_id))
+        await self.redis.publish(CACHE_INVALIDATION_CHANNEL, {"keys": [key]})
+        return deleted
+
+    # 食物识别缓存
+    async def cache_food_analysis(self, image_hash: str, analysis_result: dict, expire_seconds: int = 86400):
+        """缓存食物分析结果"""
+        key = f"food:analysis:{image_hash}"
+        return await self.redis.set(key, analysis_result, expire_seconds)
+
+    async def get_food_analysis(self, image_hash: str) -> Optional[dict]:
+        """获取食物分析结果缓存"""
+        key = f"food:analysis:{image_hash}"
+        return await self.redis.get(key)
+
+    async def cache_image_hash(self, object_name: str, image_hash: str, expire_seconds: int = 86400 * 7):
+        """缓存图片对象对应的内容哈希"""
+        key = f"food:image:hash:{object_name}"
+        return await self.redis.set(key, image_hash, expire_seconds)
+
+    async def get_image_hash(self, object_name: str) -> Optional[str]:
+        """获取图片对象对应的内容哈希"""
+        key = f"food:image:hash:{object_name}"
+        value = await self.redis.get(key)
+        return str(value) if value is not None else None
+
+    async def register_perceptual_hash(self, user_id: int, phash: str, image_hash: str, expire_seconds: int = 86400 * 7):
+        """登记用户图片的感知哈希，用于近似重复查找"""
+        key = f"food:image:phash:{user_id}"
+        result = await self.redis.hset(key, phash, image_hash)
+        await self.redis.expire(key, expire_seconds)
+        return result
+
+    async def get_perceptual_hashes(self, user_id: int) -> dict:
+        """获取用户已登记的感知哈希"""
+        key = f"food:image:phash:{user_id}"
+        return {phash: str(image_hash) for phash, image_hash in (await self.redis.hgetall(key)).items()}
+
+    async def incr_food_analysis_stat(self, field: str) -> int:
+        """累加食物分析缓存命中统计"""
+        return await self.redis.hincrby("stats:food_analysis_cache", field, 1)
+
+    async def get_food_analysis_stats(self) -> dict:
+        """获取食物分析缓存命中统计"""
+        return await self.redis.hgetall("stats:food_analysis_cache")
+
+    # 健康评分缓存
+    async def cache_health_score(self, user_id: int, score_data: dict, expire_seconds: int = 3600):
+        """缓存健康评分"""
+        key = f"health:score:{user_id}"
+        return await self.redis.set_with_tag(key, score_data, expire_seconds, user_cache_tag(user_id), settings.cache_tag_ttl)
+
+    async def get_health_score(self, user_id: int) -> Optional[dict]:
+        """获取健康评分缓存"""
+        key = f"health:score:{user_id}"
+        return await self.redis.get(key)
+
+    async def cache_health_report(self, user_id: int, start_date: str, end_date: str, report_data: dict,
+                                  expire_seconds: int = 600):
+        """缓存健康报告（按日期范围区分）"""
+        key = f"health:score:{user_id}:{start_date}:{end_date}"
+        return await self.redis.set_with_tag(
+            key, report_data, expire_seconds, [user_cache_tag(user_id), health_report_tag(user_id)], settings.cache_tag_ttl
+        )
+
+    async def get_health_report(self, user_id: int, start_date: str, end_date: str) -> Optional[dict]:
+        """获取健康报告缓存"""
+        key = f"health:score:{user_id}:{start_date}:{end_date}"
+        return await self.redis.get(key)
+
+    # 用户资料版本（BMR/TDEE 等派生指标缓存键的一部分，计算所依赖的资料字段变化时递增）
+    async def get_profile_version(self, user_id: int) -> Optional[int]:
+        """
+        获取用户资料版本，不存在时以当前毫秒时间戳初始化，计数器丢失后也不会与旧版本号重复
+        Redis不可用时返回None
+        """
+        key = f"user:profile_version:{user_id}"
+        try:
+            client = await self.redis.get_client()
+            version = await client.get(key)
+            if version is None:
+                await client.set(key, int(time.time() * 1000), nx=True)
+                version = await client.get(key)
+            return int(version)
+        except Exception as e:
+            print(f"Redis profile version error: {e}")
+            return None
+
+    async def bump_profile_version(self, user_id: int) -> Optional[int]:
+        """递增用户资料版本，旧版本的派生指标缓存随之不再命中"""
+        key = f"user:profile_version:{user_id}"
+        try:
+            client = await self.redis.get_client()
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.set(key, int(time.time() * 1000), nx=True)
+                pipe.incr(key)
+                return (await pipe.execute())[1]
+        except Exception as e:
+            print(f"Redis profile version error: {e}")
+            return None
+
+    # 对话上下文缓存
+    async def cache_conversation_context(self, session_id: str, context_data: dict, expire_seconds: int = 1800):
+        """缓存对话上下文"""
+        key = f"conversation:context:{session_id}"
+        return await self.redis.set(key, context_data, expire_seconds)
+
+    async def get_conversation_context(self, session_id: str) -> Optional[dict]:
+        """获取对话上下文缓存"""
+        key = f"conversation:context:{session_id}"
+        return await self.redis.get(key)
+
+    # 列表总数缓存（按筛选条件签名存放在同一个哈希中，便于整体失效）
+    async def cache_list_total(self, user_id: int, scope: str, signature: str, total: int, expire_seconds: int = 600):
+        """缓存列表总数"""
+        key = f"list:total:{user_id}:{scope}"
+        result = await self.redis.hset(key, signature, total)
+        await self.redis.expire(key, expire_seconds)
+        return result
+
+    async def get_list_total(self, user_id: int, scope: str, signature: str) -> Optional[int]:
+        """获取列表总数缓存"""
+        key = f"list:total:{user_id}:{scope}"
+        return await self.redis.hget(key, signature)
+
+    async def clear_list_total(self, user_id: int, scope: str):
+        """清除列表总数缓存"""
+        key = f"list:total:{user_id}:{scope}"
+        return await self.redis.delete(key)
+
+    async def clear_user_cache(self, user_id: int):
+        """清除用户相关缓存：按用户标签集合一次性失效"""
+        tag_key = user_cache_tag(user_id)
+        # 标签集合不存在说明缓存写入于启用标签之前，迁移期用 SCAN 兜底
+        scan_needed = settings.cache_tag_scan_fallback and not await self.redis.exists(tag_key)
+        deleted = await self.redis.unlink_tag(tag_key, user_cache_fixed_keys(user_id))
+        if scan_needed:
+            deleted += await self.redis.unlink_by_scan(f"nutrition:daily:{user_id}:*")
+        # 通知各进程清除该用户的本地缓存
+        await self.redis.publish(CACHE_INVALIDATION_CHANNEL, {"user_id": user_id})
+        return deleted
 
 
 # 全局实例
 redis_manager = RedisManager()
-cache_service = CacheService(redis_manager) 
\ No newline at end of file
+cache_service = CacheService(redis_manager)
+async_redis_manager = AsyncRedisManager()
+async_cache_service = AsyncCacheService(async_redis_manager)
@@ -26,6 +26,8 @@ class Settings(BaseSettings):
         description="数据库连接URL"
     )
     database_echo: bool = Field(default=False, description="是否打印SQL")
+    async_database_pool_size: int = Field(default=20, description="异步数据库连接池大小")
+    async_database_max_overflow: int = Field(default=10, description="异步数据库连接池溢出上限")
 
     # Redis配置
     redis_host: str = Field(default="localhost", description="Redis主机")
@@ -33,11 +35,32 @@ class Settings(BaseSettings):
     redis_password: Optional[str] = Field(default="2168", description="Redis密码")
     redis_db: int = Field(default=5, description="Redis数据库")
     redis_url: str = Field(default="redis://localhost:6379/0", description="Redis连接URL")
+    redis_async_max_connections: int = Field(default=50, description="异步Redis连接池最大连接数")
+    redis_async_pool_timeout: int = Field(default=5, description="异步Redis获取连接的最长等待时间(秒)")
 
     # Vector store 配置
     VECTOR_STORE_PATH: str = Field(default="agents/VectorStore", description="向量存储持久化目录")
     VECTOR_COLLECTION_NAME: str = Field(default="vector_collection_for_agent", description="向量集合名")
-    # 暂时不需要，后期可添加 EMBEDDINGS_MODEL: str = Field(default="OpenAIEmbeddings()", description="使用的 Embeddings 模型")
+    rag_cache_ttl: int = Field(default=86400 * 7, description="营养知识检索结果缓存过期时间(秒)")
+    rag_cache_similarity_threshold: float = Field(default=0.95, description="近似查询复用检索结果的最低余弦相似度，0表示只按查询标识精确匹配")
+    rag_cache_similarity_max_entries: int = Field(default=256, description="近似查询匹配时比较的最近查询条数")
+    EMBEDDINGS_PROVIDER: str = Field(default="openai", description="向量模型提供方：openai / local（本地CPU句向量模型）")
+    EMBEDDINGS_MODEL: Optional[str] = Field(default=None, description="向量模型名，为空时使用提供方的默认模型")
+    EMBEDDINGS_CACHE: str = Field(default="local", description="向量缓存：local（本地磁盘）/ redis / none")
+    EMBEDDINGS_CACHE_PATH: str = Field(default="agents/EmbeddingCache", description="本地向量缓存目录")
+    EMBEDDINGS_CACHE_TTL: int = Field(default=0, description="Redis向量缓存过期时间(秒)，0表示不过期")
+    RAG_CHUNK_SIZE: int = Field(default=300, description="知识库切块长度(字符)")
+    RAG_CHUNK_OVERLAP: int = Field(default=50, description="相邻知识块的重叠长度(字符)")
+    RAG_INGEST_BATCH_SIZE: int = Field(default=64, description="知识库导入时每批计算向量的块数")
+    RAG_INGEST_WORKERS: int = Field(default=4, description="知识库导入时并行计算向量的批次数")
+    RAG_INGEST_MANIFEST: Optional[str] = Field(default=None, description="知识库导入清单路径，为空时为向量存储目录下的 ingest_manifest.json")
+    RAG_HYBRID_SEARCH: bool = Field(default=True, description="是否使用向量与BM25关键词的混合检索")
+    RAG_HYBRID_FETCH_K: int = Field(default=10, description="混合检索时向量与关键词各取的候选数")
+    RAG_BM25_INDEX_PATH: Optional[str] = Field(default=None, description="BM25索引目录，为空时为向量存储目录下的 bm25")
+    RAG_RERANKER: str = Field(default="overlap", description="重排序方式：overlap（查询词覆盖率）/ cross_encoder（本地交叉编码器）/ none")
+    RAG_RERANKER_MODEL: str = Field(default="BAAI/bge-reranker-base", description="交叉编码器模型名")
+    RAG_RERANK_WEIGHT: float = Field(default=0.5, description="重排序得分在最终得分中的权重，其余为融合排名得分")
+    RAG_RERANK_MIN_SCORE: float = Field(default=0.0, description="最终得分低于该值的文档不返回")
     DOC_PATH: str = Field(default="./docs", description="文件路径")
 
     # MinIO配置
@@ -46,6 +69,22 @@ class Settings(BaseSettings):
     minio_secret_key: str = Field(default="minioadmin", description="MinIO秘密密钥")
     minio_secure: bool = Field(default=False, description="是否使用HTTPS")
     minio_bucket: str = Field(default="dietai-bucket", description="MinIO存储桶")
+    minio_part_size: int = Field(default=5 * 1024 * 1024, description="MinIO流式上传分块大小(字节)，不小于5MB")
+    minio_stream_chunk_size: int = Field(default=255 * 1024, description="MinIO流式下载读取块大小(字节)，取3的倍数便于增量base64编码")
+    upload_spool_max_size: int = Field(default=1024 * 1024, description="上传/下载临时文件保留在内存中的最大字节数，超过后写入磁盘")
+    upload_max_size: int = Field(default=10 * 1024 * 1024, description="上传图片大小上限(字节)")
+
+    # 图片预处理配置（输出格式可选 jpeg / webp）
+    image_process_workers: int = Field(default=2, description="图片预处理进程池大小，0表示在线程池中处理")
+    image_storage_max_edge: int = Field(default=2048, description="存储图最长边(像素)")
+    image_storage_format: str = Field(default="jpeg", description="存储图编码格式")
+    image_storage_quality: int = Field(default=88, description="存储图编码质量")
+    image_model_max_edge: int = Field(default=1024, description="视觉模型输入图最长边(像素)")
+    image_model_format: str = Field(default="jpeg", description="视觉模型输入图编码格式")
+    image_model_quality: int = Field(default=80, description="视觉模型输入图编码质量")
+    image_thumbnail_max_edge: int = Field(default=320, description="缩略图最长边(像素)")
+    image_thumbnail_format: str = Field(default="webp", description="缩略图编码格式")
+    image_thumbnail_quality: int = Field(default=75, description="缩略图编码质量")
 
     # JWT配置
     jwt_secret_key: str = Field(
@@ -105,11 +144,38 @@ class Settings(BaseSettings):
     cache_default_ttl: int = Field(default=3600, description="默认缓存过期时间(秒)")
     cache_user_profile_ttl: int = Field(default=1800, description="用户资料缓存过期时间(秒)")
     cache_nutrition_ttl: int = Field(default=7200, description="营养数据缓存过期时间(秒)")
+    cache_tag_ttl: int = Field(default=86400, description="用户缓存标签集合过期时间(秒)，需大于各用户缓存的过期时间")
+    cache_tag_scan_fallback: bool = Field(default=True, description="标签集合不存在时是否用SCAN兜底清除旧缓存（迁移完成后可关闭）")
+    cache_health_metrics_ttl: int = Field(default=86400, description="BMR/TDEE缓存过期时间(秒)，缓存键含资料版本与日期，资料变化或跨日即不再命中")
+    cache_health_report_ttl: int = Field(default=600, description="健康报告缓存过期时间(秒)")
+    local_cache_max_size: int = Field(default=1024, description="进程内LRU缓存最大条目数")
+    local_cache_ttl: int = Field(default=30, description="进程内LRU缓存过期时间(秒)，其他进程的失效通过Redis广播同步")
+    cache_food_analysis_ttl: int = Field(default=86400 * 7, description="食物图片分析结果缓存过期时间(秒)")
+    image_phash_enabled: bool = Field(default=True, description="是否启用感知哈希匹配近似重复图片")
+    image_phash_max_distance: int = Field(default=4, description="近似重复图片的最大汉明距离")
 
     # AI服务配置（预留）
     ai_service_enabled: bool = Field(default=False, description="是否启用AI服务")
     ai_service_url: str = Field(default="http://127.0.0.1:2024", description="AI服务URL")
     ai_service_timeout: int = Field(default=30, description="AI服务超时时间(秒)")
+    ai_service_stream_timeout: int = Field(default=300, description="AI服务流式响应读取超时时间(秒)")
+    ai_service_max_connections: int = Field(default=20, description="AI服务连接池最大连接数")
+    ai_service_max_keepalive: int = Field(default=10, description="AI服务连接池最大保持连接数")
+    food_analysis_mode: str = Field(default="fast", description="拍照记录的营养分析模式(fast/thorough)")
+    agent_redis_max_connections: int = Field(default=20, description="Agent共享Redis连接池最大连接数")
+    agent_redis_pool_timeout: int = Field(default=5, description="Agent获取Redis连接的最长等待时间(秒)")
+    agent_redis_health_check_interval: int = Field(default=30, description="Agent Redis连接健康检查间隔(秒)")
+
+    # 后台任务配置
+    celery_broker_url: Optional[str] = Field(default=None, description="Celery消息代理URL，默认使用redis_url")
+    celery_result_backend: Optional[str] = Field(default=None, description="Celery结果存储URL，默认使用redis_url")
+    analysis_worker_concurrency: int = Field(default=4, description="图片分析Worker并发数（限制同时进行的LLM调用）")
+    analysis_job_timeout: int = Field(default=300, description="图片分析任务超时时间(秒)")
+    analysis_max_retries: int = Field(default=2, description="图片分析任务最大重试次数")
+    analysis_stale_timeout: int = Field(default=1800, description="记录处于分析中超过该时间(秒)未更新时视为任务丢失（Worker被强制终止等），恢复为待分析")
+    analysis_stale_check_interval: int = Field(default=300, description="检查丢失的图片分析任务的间隔(秒)")
+    nutrition_reconcile_interval: int = Field(default=3600, description="每日营养汇总对账任务执行间隔(秒)")
+    nutrition_reconcile_days: int = Field(default=3, description="每日营养汇总对账覆盖的最近天数")
 
     # 健康检查配置
     health_check_enabled: bool = Field(default=True, description="是否启用健康检查")
@@ -1,7 +1,7 @@
 # 导入所有数据库模型
-from .database import Base, get_db, create_tables, drop_tables
+from .database import Base, get_db, get_async_db, get_async_session_factory, create_tables, drop_tables
 from .user_models import User, UserProfile, HealthGoal, Disease, Allergy, WeightRecord
-from .food_models import FoodRecord, NutritionDetail, DailyNutritionSummary, FoodDatabase
+from .food_models import FoodRecord, NutritionDetail, DailyNutritionSummary, NutritionRollup, FoodDatabase
 from .conversation_models import ConversationSession, ConversationMessage, ConversationContext
 from .saved_meal_models import SavedMeal, SavedMealNutrition, UserSavedMealFavorite
 
@@ -12,6 +12,8 @@ __all__ = [
     # 数据库相关
     "Base",
     "get_db", 
+    "get_async_db",
+    "get_async_session_factory",
     "create_tables",
     "drop_tables",
     
@@ -27,6 +29,7 @@ __all__ = [
     "FoodRecord",
     "NutritionDetail",
     "DailyNutritionSummary", 
+    "NutritionRollup",
     "FoodDatabase",
     
     # 对话模型
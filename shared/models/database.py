@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
@@ -28,6 +29,50 @@ SessionLocal = sessionmaker(
     expire_on_commit=False  # 防止会话过期问题
 )
 
+
+def get_async_database_url() -> str:
+    """获取异步驱动(asyncpg)的数据库连接URL"""
+    url = settings.database_url
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+# 异步数据库引擎与会话工厂（与同步引擎各自维护连接池），首次使用时创建，
+# 缺少 asyncpg 驱动时只影响异步接口，不影响同步代码导入
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    """获取异步数据库引擎（首次调用时创建）"""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            get_async_database_url(),
+            pool_pre_ping=True,
+            pool_recycle=300,
+            pool_size=settings.async_database_pool_size,
+            max_overflow=settings.async_database_max_overflow,
+            echo=settings.debug,
+            isolation_level="READ_COMMITTED"
+        )
+    return _async_engine
+
+
+def get_async_session_factory() -> async_sessionmaker:
+    """获取异步会话工厂（首次调用时创建）"""
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(
+            bind=get_async_engine(),
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False
+        )
+    return _async_session_factory
+
 # 基础模型类
 Base = declarative_base()
 
@@ -56,16 +101,97 @@ def get_db():
 
 async def get_async_db():
     """获取异步数据库会话"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        await db.close()
+    async with get_async_session_factory()() as db:
+        try:
+            yield db
+        except Exception as e:
+            print(f"异步数据库会话异常: {str(e)}")
+            try:
+                await db.rollback()
+            except Exception as rollback_error:
+                print(f"回滚失败: {str(rollback_error)}")
+            raise e
+
+
+async def dispose_async_engine():
+    """释放异步引擎连接池（未创建时不做处理）"""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_session_factory = None
+
+
+# 启动时结构升级与数据回填使用的PostgreSQL咨询锁键
+SCHEMA_UPGRADE_LOCK_KEY = 20240501
 
 
 def create_tables():
     """创建所有数据库表"""
     Base.metadata.create_all(bind=engine)
+    # 多个实例同时启动时由持有咨询锁的实例执行升级与回填，其余实例等待后检查到已完成即跳过
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_UPGRADE_LOCK_KEY})
+        try:
+            ensure_daily_summary_constraint()
+            backfill_nutrition_rollups()
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_UPGRADE_LOCK_KEY})
+            conn.commit()
+
+
+def has_daily_summary_constraint(bind) -> bool:
+    """每日营养汇总表是否已有 (user_id, summary_date) 唯一约束"""
+    constraints = inspect(bind).get_unique_constraints("daily_nutrition_summaries")
+    return any(constraint["name"] == "uq_daily_summaries_user_date" for constraint in constraints)
+
+
+def add_daily_summary_constraint(conn):
+    """添加 (user_id, summary_date) 唯一约束，替换原有的普通索引；表中不能有重复行"""
+    conn.execute(text("DROP INDEX IF EXISTS idx_daily_summaries_user_date"))
+    conn.execute(text("""
+        ALTER TABLE daily_nutrition_summaries
+        ADD CONSTRAINT uq_daily_summaries_user_date UNIQUE (user_id, summary_date)
+    """))
+
+
+def ensure_daily_summary_constraint():
+    """
+    为已有的每日营养汇总表补充 (user_id, summary_date) 唯一约束（create_all 不会修改已存在的表）
+    存在重复行时启动不修改数据并报错，需先运行迁移脚本合并：python -m shared.tasks.migrate_daily_summaries
+    """
+    if has_daily_summary_constraint(engine):
+        return
+
+    with engine.begin() as conn:
+        duplicates = conn.execute(text("""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM daily_nutrition_summaries GROUP BY user_id, summary_date HAVING COUNT(*) > 1
+            ) AS duplicate_groups
+        """)).scalar()
+        if duplicates:
+            raise RuntimeError(
+                f"每日营养汇总存在 {duplicates} 组重复行，无法添加唯一约束，"
+                f"请先运行 python -m shared.tasks.migrate_daily_summaries 合并重复行"
+            )
+        add_daily_summary_constraint(conn)
+
+
+def backfill_nutrition_rollups():
+    """周/月汇总表为空而已有每日汇总时（首次部署），按全部每日汇总生成周/月汇总"""
+    # 延迟导入，避免模型模块循环引用
+    from ..utils.nutrition_rollup import rebuild_nutrition_rollups
+
+    with SessionLocal() as db:
+        if db.execute(text("SELECT 1 FROM nutrition_rollups LIMIT 1")).first() is not None:
+            return
+        date_range = db.execute(
+            text("SELECT MIN(summary_date), MAX(summary_date) FROM daily_nutrition_summaries")
+        ).first()
+        if date_range[0] is None:
+            return
+        rebuild_nutrition_rollups(db, date_range[0], date_range[1])
+        db.commit()
 
 
 def drop_tables():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Date, Numeric, ForeignKey, Index, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Date, Numeric, ForeignKey, Index, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -101,9 +101,41 @@ class DailyNutritionSummary(Base):
     # 关系
     user = relationship("User", back_populates="daily_summaries")
     
-    # 索引
+    # 每个用户每天一条汇总，增量更新依赖该约束做 INSERT ... ON CONFLICT
+    __table_args__ = (
+        UniqueConstraint('user_id', 'summary_date', name='uq_daily_summaries_user_date'),
+    )
+
+
+class NutritionRollup(Base):
+    """每周/每月营养汇总表，由每日营养汇总聚合，用于长时间范围的趋势与评分查询"""
+    __tablename__ = "nutrition_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    period_type = Column(String(10), nullable=False)  # week / month
+    period_start = Column(Date, nullable=False)  # 周一 / 每月1日
+
+    # 周期内合计
+    days_count = Column(Integer, default=0)  # 有汇总记录的天数
+    total_calories = Column(Numeric(10, 2), default=0)
+    total_protein = Column(Numeric(8, 2), default=0)
+    total_fat = Column(Numeric(8, 2), default=0)
+    total_carbohydrates = Column(Numeric(8, 2), default=0)
+    total_fiber = Column(Numeric(8, 2), default=0)
+    total_sodium = Column(Numeric(10, 2), default=0)
+    meal_count = Column(Integer, default=0)
+    meal_count_sq = Column(Integer, default=0)  # 每日餐次的平方和，用于计算餐次方差（饮食规律性评分）
+    water_intake = Column(Numeric(6, 2), default=0)
+    exercise_calories = Column(Numeric(8, 2), default=0)
+    health_level_total = Column(Numeric(6, 2), default=0)
+    health_level_days = Column(Integer, default=0)  # 有健康评分的天数
+
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
     __table_args__ = (
-        Index('idx_daily_summaries_user_date', 'user_id', 'summary_date'),
+        UniqueConstraint('user_id', 'period_type', 'period_start', name='uq_nutrition_rollups_user_period'),
     )
 
 
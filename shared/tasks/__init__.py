@@ -0,0 +1,5 @@
+from .celery_app import celery_app
+
+__all__ = [
+    "celery_app"
+]
@@ -0,0 +1,94 @@
+"""
+图片分析任务进度通道
+Worker 通过 Redis pub/sub 发布进度，API 订阅后以 SSE 转发给客户端；
+最近一次事件同时保存为快照，供中途重连的客户端获取当前状态
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from ..config.redis_config import async_redis_manager, redis_manager
+from ..config.settings import get_settings
+
+settings = get_settings()
+
+# 终止事件：收到后结束订阅
+TERMINAL_EVENTS = {"nutrition_saved", "analysis_failed"}
+
+
+def progress_channel(record_id: int) -> str:
+    """进度频道名"""
+    return f"food:analysis:progress:{record_id}"
+
+
+def progress_snapshot_key(record_id: int) -> str:
+    """进度快照键"""
+    return f"food:analysis:job:{record_id}"
+
+
+def build_event(event_type: str, data: Dict[str, Any], success: bool = True) -> Dict[str, Any]:
+    """构建进度事件"""
+    return {"type": event_type, "data": data, "success": success}
+
+
+def publish_progress(record_id: int, event_type: str, data: Dict[str, Any], success: bool = True) -> None:
+    """发布进度事件（Worker侧，同步）"""
+    event = build_event(event_type, data, success)
+    payload = json.dumps(event, ensure_ascii=False)
+    try:
+        client = redis_manager.get_client()
+        client.setex(progress_snapshot_key(record_id), settings.analysis_job_timeout * 2, payload)
+        client.publish(progress_channel(record_id), payload)
+    except Exception as e:
+        print(f"发布分析进度失败: {e}")
+
+
+class ProgressSubscription:
+    """分析进度订阅，需在投递任务前进入，避免丢失早期事件"""
+
+    def __init__(self, record_id: int, timeout: Optional[int] = None):
+        self.record_id = record_id
+        self.timeout = timeout or settings.analysis_job_timeout
+        self.pubsub = None
+
+    async def __aenter__(self) -> "ProgressSubscription":
+        # 订阅连接取自共享的异步连接池，退出时归还
+        self.pubsub = (await async_redis_manager.get_client()).pubsub()
+        await self.pubsub.subscribe(progress_channel(self.record_id))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.pubsub is not None:
+            try:
+                await self.pubsub.unsubscribe(progress_channel(self.record_id))
+                await self.pubsub.aclose()
+            except Exception as e:
+                print(f"关闭进度订阅失败: {e}")
+
+    async def snapshot(self) -> Optional[Dict[str, Any]]:
+        """获取最近一次进度事件"""
+        client = await async_redis_manager.get_client()
+        raw = await client.get(progress_snapshot_key(self.record_id))
+        return json.loads(raw) if raw else None
+
+    async def events(self) -> AsyncGenerator[Dict[str, Any], None]:
+        """持续产出进度事件，直到终止事件或超时"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                yield build_event(
+                    "analysis_pending",
+                    {"status": "analyzing", "message": "分析仍在后台进行，请稍后查看结果"}
+                )
+                return
+            message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=min(remaining, 1.0))
+            if message is None:
+                await asyncio.sleep(0)
+                continue
+            event = json.loads(message["data"])
+            yield event
+            if event.get("type") in TERMINAL_EVENTS:
+                return
@@ -0,0 +1,68 @@
+import asyncio
+
+from celery import Celery
+
+from ..config.settings import get_settings
+
+settings = get_settings()
+
+# Celery应用实例
+# 启动Worker: celery -A shared.tasks.celery_app worker -Q food_analysis,maintenance -l info
+# 启动定时任务: celery -A shared.tasks.celery_app beat -l info
+celery_app = Celery(
+    "dietai",
+    broker=settings.celery_broker_url or settings.redis_url,
+    backend=settings.celery_result_backend or settings.redis_url,
+    include=["shared.tasks.food_analysis_tasks", "shared.tasks.nutrition_summary_tasks"]
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    result_serializer="json",
+    timezone="Asia/Shanghai",
+    enable_utc=True,
+    # 任务在执行完成后才确认，Worker崩溃时任务会重新投递
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    # 并发数即同时进行的图片分析（LLM调用）上限
+    worker_concurrency=settings.analysis_worker_concurrency,
+    task_time_limit=settings.analysis_job_timeout + 60,
+    task_soft_time_limit=settings.analysis_job_timeout,
+    result_expires=3600,
+    task_routes={
+        "food_analysis.*": {"queue": "food_analysis"},
+        "nutrition_summary.*": {"queue": "maintenance"},
+        "maintenance.*": {"queue": "maintenance"},
+    },
+    beat_schedule={
+        "reconcile-daily-nutrition-summaries": {
+            "task": "nutrition_summary.reconcile_daily_summaries",
+            "schedule": settings.nutrition_reconcile_interval,
+        },
+        "reset-stale-food-analyses": {
+            "task": "maintenance.reset_stale_analyses",
+            "schedule": settings.analysis_stale_check_interval,
+        },
+    },
+)
+
+
+def run_async(coro):
+    """
+    在新的事件循环中运行任务协程（asyncio.run），结束前在同一循环中关闭绑定该循环的客户端，
+    避免每个任务泄漏连接
+    """
+    async def main():
+        # 延迟导入，避免任务模块与配置模块循环引用
+        from ..config.langgraph_config import langgraph_manager
+        from ..config.redis_config import async_redis_manager
+
+        try:
+            return await coro
+        finally:
+            await langgraph_manager.close()
+            await async_redis_manager.close()
+
+    return asyncio.run(main())
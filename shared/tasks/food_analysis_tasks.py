@@ -0,0 +1,156 @@
+"""
+食物图片分析后台任务
+在 Worker 中运行营养分析 Agent，持久化营养详情并更新每日营养汇总，
+与 HTTP 请求解耦：客户端断开不影响分析结果的保存；
+超出硬时限被终止或Worker退出的任务不会执行失败处理，由定时任务把长时间处于分析中的记录恢复为待分析
+"""
+
+from datetime import timedelta
+from typing import List
+
+from sqlalchemy import DateTime, func, select, update
+from sqlalchemy.orm import Session
+
+from .celery_app import celery_app, run_async
+from .analysis_progress import publish_progress
+from ..config.settings import get_settings
+from ..models.database import SessionLocal
+from ..models.food_models import FoodRecord
+from ..models.user_models import User
+
+settings = get_settings()
+
+
+@celery_app.task(
+    name="food_analysis.analyze_food_record",
+    bind=True,
+    max_retries=settings.analysis_max_retries,
+    default_retry_delay=10
+)
+def analyze_food_record(self, record_id: int, user_id: int):
+    """分析食物记录图片"""
+    try:
+        return run_async(run_food_analysis(record_id, user_id))
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            publish_progress(record_id, "analysis_progress", {"current_step": "retrying", "message": f"分析失败，正在重试: {str(e)}"})
+            raise self.retry(exc=e)
+        mark_analysis_failed(record_id, str(e))
+        raise
+
+
+def enqueue_food_analysis(record_id: int, user_id: int) -> str:
+    """投递图片分析任务，返回任务ID"""
+    result = analyze_food_record.delay(record_id, user_id)
+    return result.id
+
+
+async def run_food_analysis(record_id: int, user_id: int) -> dict:
+    """执行分析并保存结果"""
+    # 延迟导入，避免路由模块与任务模块循环引用
+    from routers.food_router import (
+        analyze_food_image_with_agent, create_nutrition_detail_from_analysis, apply_daily_nutrition_delta
+    )
+    from ..config.redis_config import async_cache_service
+    from ..models.schemas import NutritionFacts
+
+    db = SessionLocal()
+    try:
+        food_record = db.query(FoodRecord).filter(
+            FoodRecord.id == record_id,
+            FoodRecord.user_id == user_id
+        ).first()
+        if not food_record or not food_record.image_url:
+            return {"record_id": record_id, "status": "skipped"}
+
+        # 任务重复投递时保持幂等
+        if food_record.analysis_status == 3:
+            publish_progress(record_id, "nutrition_saved", {"status": "completed", "message": "营养分析完成并已保存"})
+            return {"record_id": record_id, "status": "completed"}
+
+        user = db.query(User).filter(User.id == user_id).first()
+
+        food_record.analysis_status = 2  # 分析中
+        # 每次执行（含重试）开始时刷新更新时间，排队等待的时间不计入丢失判定
+        food_record.updated_at = func.now()
+        db.commit()
+        publish_progress(record_id, "analysis_started", {"status": "analyzing", "message": "开始分析图片..."})
+
+        analysis_complete_data = None
+        async for chunk in analyze_food_image_with_agent(food_record.image_url, user, db):
+            if chunk["type"] == "analysis_progress":
+                publish_progress(record_id, "analysis_progress", chunk["data"])
+            elif chunk["type"] == "analysis_complete":
+                analysis_complete_data = chunk["data"]
+                publish_progress(record_id, "analysis_complete", chunk["data"])
+
+        if not analysis_complete_data:
+            raise Exception("分析未返回结果")
+
+        nutrition_facts = NutritionFacts(**analysis_complete_data["nutrition_facts"])
+        nutrition_detail = await create_nutrition_detail_from_analysis(food_record.id, nutrition_facts, db)
+        # 每日营养汇总与营养详情在同一事务中增量更新
+        if nutrition_detail is not None:
+            await apply_daily_nutrition_delta(user_id, food_record.record_date, nutrition_detail, db)
+
+        db.refresh(food_record)
+        food_record.analysis_status = 3  # 已完成
+        db.commit()
+
+        await async_cache_service.clear_daily_nutrition(user_id, str(food_record.record_date))
+
+        publish_progress(record_id, "nutrition_saved", {"status": "completed", "message": "营养分析完成并已保存"})
+        return {"record_id": record_id, "status": "completed"}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def mark_analysis_failed(record_id: int, error: str):
+    """重试耗尽后将记录恢复为待分析，并通知订阅者"""
+    db = SessionLocal()
+    try:
+        food_record = db.query(FoodRecord).filter(FoodRecord.id == record_id).first()
+        if food_record:
+            food_record.analysis_status = 1  # 待分析，可重新发起分析
+            db.commit()
+    except Exception as e:
+        print(f"更新分析状态失败: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+    publish_progress(record_id, "analysis_failed", {"status": "failed", "message": f"分析失败: {error}"}, success=False)
+
+
+def reset_stale_analyses(db: Session, stale_seconds: int) -> List[int]:
+    """将处于分析中且超过 stale_seconds 未更新的记录恢复为待分析，返回记录ID，不提交事务"""
+    # 按数据库时间判断，与 updated_at 的取值来源一致
+    now = db.execute(select(func.now(type_=DateTime))).scalar()
+    reset = update(FoodRecord).where(
+        FoodRecord.analysis_status == 2,
+        FoodRecord.updated_at < now - timedelta(seconds=stale_seconds)
+    ).values(analysis_status=1, updated_at=func.now()).returning(FoodRecord.id)
+    return [record_id for record_id, in db.execute(reset)]
+
+
+@celery_app.task(name="maintenance.reset_stale_analyses")
+def reset_stale_analyses_task():
+    """定时恢复丢失的图片分析任务（超出硬时限被终止、Worker退出等），记录可重新发起分析"""
+    db = SessionLocal()
+    try:
+        record_ids = reset_stale_analyses(db, settings.analysis_stale_timeout)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    for record_id in record_ids:
+        publish_progress(record_id, "analysis_failed", {"status": "failed", "message": "分析超时，请重新发起分析"},
+                         success=False)
+    if record_ids:
+        print(f"恢复超时的图片分析 {len(record_ids)} 条: {record_ids}")
+    return {"reset": len(record_ids)}
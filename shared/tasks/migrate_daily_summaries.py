@@ -0,0 +1,97 @@
+"""
+每日营养汇总去重迁移（一次性）
+早期版本的每日汇总没有 (user_id, summary_date) 唯一约束，并发写入可能产生重复行，启动时检测到重复行会拒绝添加约束。
+本脚本在一个事务中合并重复行（保留最近更新的一行，饮水量与运动消耗取各重复行中的最大值）、添加唯一约束，
+再按食物记录重新计算受影响日期范围的营养合计与周/月汇总，提交后清除这些日期的缓存
+
+用法: python -m shared.tasks.migrate_daily_summaries [--dry-run]
+"""
+
+import argparse
+import json
+from datetime import date
+from typing import List, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from .celery_app import run_async
+from .nutrition_summary_tasks import reconcile_daily_summaries
+from ..config.redis_config import async_cache_service
+from ..models.database import (
+    SCHEMA_UPGRADE_LOCK_KEY, SessionLocal, add_daily_summary_constraint, has_daily_summary_constraint
+)
+from ..models.food_models import DailyNutritionSummary
+
+
+def collapse_duplicate_summaries(db: Session) -> List[Tuple[int, date]]:
+    """
+    合并重复的每日汇总行，返回被合并的 (user_id, summary_date) 列表，不提交事务
+    保留最近更新的一行；饮水量、运动消耗取各行最大值，健康评分取最近一个非空值；营养合计由对账重新计算
+    """
+    summary = DailyNutritionSummary
+    groups = db.query(summary.user_id, summary.summary_date).group_by(
+        summary.user_id, summary.summary_date
+    ).having(func.count(summary.id) > 1).all()
+
+    for user_id, summary_date in groups:
+        rows = db.query(summary).filter(
+            summary.user_id == user_id,
+            summary.summary_date == summary_date
+        ).order_by(summary.updated_at.desc().nullslast(), summary.id.desc()).all()
+        kept = rows[0]
+        kept.water_intake = max(row.water_intake or 0 for row in rows)
+        kept.exercise_calories = max(row.exercise_calories or 0 for row in rows)
+        kept.health_level = next((row.health_level for row in rows if row.health_level is not None), None)
+        for row in rows[1:]:
+            db.delete(row)
+    db.flush()
+    return [(user_id, summary_date) for user_id, summary_date in groups]
+
+
+async def clear_summary_caches(keys: List[Tuple[int, date]]):
+    for user_id, summary_date in keys:
+        await async_cache_service.clear_daily_nutrition(user_id, str(summary_date))
+
+
+def migrate(dry_run: bool = False) -> dict:
+    """合并重复行并添加唯一约束，返回统计；dry_run 时回滚全部修改"""
+    db = SessionLocal()
+    try:
+        # 与应用启动时的结构升级互斥（事务结束时释放）
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_UPGRADE_LOCK_KEY})
+        if has_daily_summary_constraint(db.connection()):
+            return {"constraint": "exists", "merged": 0, "reconciled": 0}
+
+        merged = collapse_duplicate_summaries(db)
+        # 对账使用 ON CONFLICT ON CONSTRAINT 写入，需在同一事务中先添加约束
+        add_daily_summary_constraint(db.connection())
+        reconciled = []
+        if merged:
+            dates = [summary_date for _, summary_date in merged]
+            reconciled = reconcile_daily_summaries(db, min(dates), max(dates))
+
+        stats = {"constraint": "added", "merged": len(merged), "reconciled": len(reconciled), "dry_run": dry_run}
+        if dry_run:
+            db.rollback()
+            return stats
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    run_async(clear_summary_caches(sorted(set(merged) | set(reconciled))))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合并重复的每日营养汇总并添加唯一约束")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，回滚全部修改")
+    args = parser.parse_args()
+    print(json.dumps(migrate(dry_run=args.dry_run), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+每日营养汇总对账任务
+营养详情写入时按增量更新汇总；本任务定期按食物记录重新聚合最近几天的数据，修正可能的累计误差，
+同时重建对应的周/月汇总
+"""
+
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, func, literal, or_, select, update, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .celery_app import celery_app, run_async
+from ..config.redis_config import async_cache_service
+from ..config.settings import get_settings
+from ..models.database import SessionLocal
+from ..models.food_models import FoodRecord, NutritionDetail, DailyNutritionSummary
+from ..utils.nutrition_rollup import rebuild_nutrition_rollups
+
+settings = get_settings()
+
+# 每日汇总字段 -> 营养详情字段
+SUMMARY_FIELDS = {
+    "total_calories": NutritionDetail.calories,
+    "total_protein": NutritionDetail.protein,
+    "total_fat": NutritionDetail.fat,
+    "total_carbohydrates": NutritionDetail.carbohydrates,
+    "total_fiber": NutritionDetail.dietary_fiber,
+    "total_sodium": NutritionDetail.sodium,
+}
+
+
+def reconcile_daily_summaries(db: Session, start_date: date, end_date: date,
+                              user_id: Optional[int] = None) -> List[Tuple[int, date]]:
+    """
+    按食物记录重新聚合 [start_date, end_date] 的每日汇总，只改写与聚合结果不一致的行，
+    并重建覆盖该范围的周/月汇总；返回被修正的 (user_id, summary_date) 列表，不提交事务
+    """
+    table = DailyNutritionSummary.__table__
+    record_filters = [FoodRecord.record_date >= start_date, FoodRecord.record_date <= end_date]
+    if user_id is not None:
+        record_filters.append(FoodRecord.user_id == user_id)
+
+    aggregated = select(
+        FoodRecord.user_id,
+        FoodRecord.record_date,
+        *[func.coalesce(func.sum(column), 0) for column in SUMMARY_FIELDS.values()],
+        func.count(FoodRecord.id)
+    ).join(
+        NutritionDetail, FoodRecord.id == NutritionDetail.food_record_id
+    ).where(*record_filters).group_by(FoodRecord.user_id, FoodRecord.record_date)
+
+    columns = ["user_id", "summary_date", *SUMMARY_FIELDS, "meal_count"]
+    upsert = pg_insert(table).from_select(columns, aggregated)
+    changed = [table.c[field].is_distinct_from(upsert.excluded[field]) for field in [*SUMMARY_FIELDS, "meal_count"]]
+    upsert = upsert.on_conflict_do_update(
+        constraint="uq_daily_summaries_user_date",
+        set_={**{field: upsert.excluded[field] for field in [*SUMMARY_FIELDS, "meal_count"]}, "updated_at": func.now()},
+        where=or_(*changed)
+    ).returning(table.c.user_id, table.c.summary_date)
+    fixed = [tuple(row) for row in db.execute(upsert)]
+
+    # 当天已没有带营养详情的记录，但汇总仍有数值
+    has_records = exists().where(
+        FoodRecord.user_id == table.c.user_id,
+        FoodRecord.record_date == table.c.summary_date,
+        FoodRecord.id == NutritionDetail.food_record_id
+    )
+    summary_filters = [table.c.summary_date >= start_date, table.c.summary_date <= end_date, ~has_records,
+                       or_(table.c.meal_count != 0, *[table.c[field] != 0 for field in SUMMARY_FIELDS])]
+    if user_id is not None:
+        summary_filters.append(table.c.user_id == user_id)
+    reset = update(table).where(and_(*summary_filters)).values(
+        **{field: literal(0) for field in [*SUMMARY_FIELDS, "meal_count"]},
+        updated_at=func.now()
+    ).returning(table.c.user_id, table.c.summary_date)
+    fixed.extend(tuple(row) for row in db.execute(reset))
+
+    rebuild_nutrition_rollups(db, start_date, end_date, user_id)
+    return fixed
+
+
+async def run_reconciliation(days: int) -> dict:
+    """对账最近 days 天的每日汇总，并清除被修正日期的缓存"""
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    db = SessionLocal()
+    try:
+        fixed = reconcile_daily_summaries(db, start_date, end_date)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    for user_id, summary_date in fixed:
+        await async_cache_service.clear_daily_nutrition(user_id, str(summary_date))
+    if fixed:
+        print(f"每日营养汇总对账修正 {len(fixed)} 条: {start_date} ~ {end_date}")
+    return {"start_date": str(start_date), "end_date": str(end_date), "fixed": len(fixed)}
+
+
+@celery_app.task(name="nutrition_summary.reconcile_daily_summaries")
+def reconcile_daily_summaries_task(days: int = None):
+    """定时对账每日营养汇总"""
+    return run_async(run_reconciliation(days or settings.nutrition_reconcile_days))
@@ -0,0 +1,202 @@
+"""
+两级缓存工具
+第一级为进程内有界LRU（短过期），第二级为Redis；同一键的并发未命中合并为一次计算（single-flight），
+失效消息通过Redis发布订阅广播到所有进程
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+from ..config.redis_config import async_redis_manager, user_cache_tag, CACHE_INVALIDATION_CHANNEL
+from ..config.settings import get_settings
+from .hashing import json_fingerprint
+
+settings = get_settings()
+
+
+class LocalCache:
+    """进程内有界LRU缓存，条目带过期时间并记录所属用户"""
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[Any, float, Optional[int]]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """返回 (是否命中, 值)"""
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, user_id: Optional[int] = None, ttl: Optional[int] = None):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        self._data[key] = (value, time.monotonic() + (ttl or self.ttl), user_id)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, keys: Iterable[str]) -> int:
+        """删除指定键"""
+        return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def evict_user(self, user_id: int) -> int:
+        """删除某个用户的全部条目"""
+        keys = [key for key, (_, _, owner) in self._data.items() if owner == user_id]
+        return self.delete(keys)
+
+    def clear(self):
+        """清空缓存"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+local_cache = LocalCache(settings.local_cache_max_size, settings.local_cache_ttl)
+
+# 进行中的计算：同一键的并发请求等待同一个结果
+_inflight: dict = {}
+
+
+def two_tier_cache(namespace: str, ttl: int = None, local_ttl: int = None,
+                   key_builder: Callable[..., str] = None, exclude: Tuple[str, ...] = ("db",)):
+    """
+    两级缓存装饰器，用于异步函数
+    缓存键由除 exclude 以外的参数生成；参数中含 user_id 时缓存写入该用户的标签集合，
+    clear_user_cache 会同时清除两级缓存。函数抛出异常时不缓存，等待中的并发请求收到同一异常
+    key_builder: 自定义缓存键，接收按名称绑定的参数，用于与已有缓存键保持一致
+    被装饰函数提供 invalidate(...) 方法，按相同参数清除两级缓存并广播
+    """
+    ttl = ttl or settings.cache_default_ttl
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def build_key(*args, **kwargs) -> Tuple[str, Optional[int]]:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = {name: value for name, value in bound.arguments.items() if name not in exclude}
+            user_id = params.get("user_id")
+            if key_builder is not None:
+                return key_builder(**params), user_id
+            return f"cache:{namespace}:{user_id}:{json_fingerprint(params)}", user_id
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key, user_id = build_key(*args, **kwargs)
+            hit, value = local_cache.get(key)
+            if hit:
+                return value
+
+            pending = _inflight.get(key)
+            if pending is not None and pending.get_loop() is asyncio.get_running_loop():
+                return await asyncio.shield(pending)
+
+            future = asyncio.get_running_loop().create_future()
+            _inflight[key] = future
+            try:
+                value = await async_redis_manager.get(key)
+                if value is None:
+                    value = await func(*args, **kwargs)
+                    if user_id is not None:
+                        await async_redis_manager.set_with_tag(
+                            key, value, ttl, user_cache_tag(user_id), settings.cache_tag_ttl
+                        )
+                    else:
+                        await async_redis_manager.set(key, value, ttl)
+                local_cache.set(key, value, user_id, local_ttl)
+                future.set_result(value)
+                return value
+            except BaseException as e:
+                future.set_exception(e)
+                # 没有等待者时标记异常已读取，避免事件循环报告未处理的异常
+                future.exception()
+                raise
+            finally:
+                if _inflight.get(key) is future:
+                    del _inflight[key]
+
+        async def invalidate(*args, **kwargs):
+            key, _ = build_key(*args, **kwargs)
+            await invalidate_keys(key)
+
+        wrapper.invalidate = invalidate
+        wrapper.cache_key = lambda *args, **kwargs: build_key(*args, **kwargs)[0]
+        return wrapper
+
+    return decorator
+
+
+async def invalidate_keys(*keys: str):
+    """清除指定键的两级缓存，并通知其他进程"""
+    local_cache.delete(keys)
+    await async_redis_manager.delete(*keys)
+    await async_redis_manager.publish(CACHE_INVALIDATION_CHANNEL, {"keys": list(keys)})
+
+
+def apply_invalidation(message: dict):
+    """处理失效消息"""
+    if message.get("user_id") is not None:
+        local_cache.evict_user(message["user_id"])
+    if message.get("keys"):
+        local_cache.delete(message["keys"])
+
+
+async def listen_cache_invalidation(retry_interval: float = 5.0):
+    """订阅失效频道；连接断开后清空本地缓存（期间的失效消息可能已丢失）并重连"""
+    while True:
+        pubsub = None
+        try:
+            client = await async_redis_manager.get_client()
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                try:
+                    apply_invalidation(json.loads(message["data"]))
+                except (json.JSONDecodeError, TypeError, AttributeError) as e:
+                    print(f"Cache invalidation message error: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Cache invalidation listener error: {e}")
+            local_cache.clear()
+            await asyncio.sleep(retry_interval)
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+_listener_task: Optional[asyncio.Task] = None
+
+
+async def start_cache_invalidation_listener():
+    """启动失效订阅（应用启动时调用）"""
+    global _listener_task
+    if _listener_task is None or _listener_task.done():
+        _listener_task = asyncio.create_task(listen_cache_invalidation())
+
+
+async def stop_cache_invalidation_listener():
+    """停止失效订阅（应用关闭时调用）"""
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+    _listener_task = None
@@ -0,0 +1,58 @@
+import hashlib
+import io
+import json
+from typing import Any, BinaryIO, Optional, Union
+
+from .streams import iter_chunks
+
+
+def content_hash(data: Union[bytes, BinaryIO]) -> str:
+    """计算内容哈希(SHA-256)，data 可为字节或可定位的文件流（按块读取后重置到开头）"""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(data).hexdigest()
+    digest = hashlib.sha256()
+    data.seek(0)
+    for chunk in iter_chunks(data):
+        digest.update(chunk)
+    data.seek(0)
+    return digest.hexdigest()
+
+
+def json_fingerprint(value: Any) -> str:
+    """计算可JSON序列化对象的稳定指纹"""
+    raw = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def perceptual_hash(data: Union[bytes, BinaryIO], hash_size: int = 8) -> Optional[str]:
+    """
+    计算图片的差异哈希(dHash)，用于识别近似重复的图片
+    重新压缩、缩放后的同一张照片哈希相同或汉明距离很小；无法解码时返回None
+    data 可为字节或可定位的文件流
+    """
+    try:
+        from PIL import Image
+
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = io.BytesIO(data)
+        else:
+            data.seek(0)
+        with Image.open(data) as image:
+            pixels = list(
+                image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS).getdata()
+            )
+    except Exception as e:
+        print(f"计算感知哈希失败: {e}")
+        return None
+
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    """计算两个十六进制哈希的汉明距离"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
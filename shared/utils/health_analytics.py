@@ -0,0 +1,233 @@
+"""
+健康分析计算引擎
+一次查询取出日期范围内所需的营养汇总列（完整的周/月读取预聚合汇总，首尾零散日期读取每日汇总），
+转换为NumPy数组后按用户向量化计算平均值、宏量营养素占比、热量比例与各项评分，可一次处理一批用户
+"""
+
+from datetime import date
+from typing import Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+from sqlalchemy import and_, func, literal, or_, select, union_all
+from sqlalchemy.orm import Session
+
+from .nutrition_rollup import PERIOD_TYPES, split_range
+from ..models.food_models import DailyNutritionSummary, NutritionRollup
+
+# 查询与数组的列顺序（均为周期内合计）
+COLUMNS = (
+    "total_calories", "total_protein", "total_fat", "total_carbohydrates", "total_fiber", "total_sodium",
+    "meal_count", "meal_count_sq", "water_intake", "exercise_calories"
+)
+# 响应中的平均值字段 -> 列
+AVERAGE_FIELDS = {
+    "calories": "total_calories",
+    "protein": "total_protein",
+    "fat": "total_fat",
+    "carbohydrates": "total_carbohydrates",
+    "fiber": "total_fiber",
+    "sodium": "total_sodium",
+}
+# 每日餐次的标准差不超过该值时视为饮食规律
+REGULARITY_MAX_STD = 0.5
+
+
+def range_query(user_ids: List[int], start_date: date, end_date: date):
+    """构造 (user_id, 天数, *COLUMNS) 的查询，完整周期与零散日期合并为一条 UNION ALL"""
+    segments = split_range(start_date, end_date)
+    parts = []
+
+    period_filters = [
+        and_(NutritionRollup.period_type == period_type,
+             NutritionRollup.period_start.in_([start for kind, start in segments if kind == period_type]))
+        for period_type in PERIOD_TYPES if any(kind == period_type for kind, _ in segments)
+    ]
+    if period_filters:
+        parts.append(select(
+            NutritionRollup.user_id,
+            NutritionRollup.days_count,
+            *[getattr(NutritionRollup, column) for column in COLUMNS]
+        ).where(NutritionRollup.user_id.in_(user_ids), or_(*period_filters)))
+
+    days = [start for kind, start in segments if kind == "day"]
+    if days:
+        daily = DailyNutritionSummary
+        daily_columns = {column: getattr(daily, column) for column in COLUMNS if column != "meal_count_sq"}
+        daily_columns["meal_count_sq"] = daily.meal_count * daily.meal_count
+        parts.append(select(
+            daily.user_id,
+            literal(1),
+            *[func.coalesce(daily_columns[column], 0) for column in COLUMNS]
+        ).where(daily.user_id.in_(user_ids), daily.summary_date.in_(days)))
+
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else union_all(*parts)
+
+
+def _score(values: np.ndarray, thresholds: Iterable[float], scores: Iterable[float]) -> np.ndarray:
+    """按从高到低的阈值分段评分"""
+    return np.select([values >= threshold for threshold in thresholds], list(scores), 0)
+
+
+def _band_score(values: np.ndarray, bands: Iterable[tuple]) -> np.ndarray:
+    """按由窄到宽的区间评分，bands 为 (下限, 上限, 分数)"""
+    bands = list(bands)
+    return np.select([(values >= low) & (values <= high) for low, high, _ in bands], [score for _, _, score in bands], 0)
+
+
+class HealthAnalytics:
+    """按用户聚合的营养数据（列式），各计算方法返回与 user_ids 顺序一致的数组"""
+
+    def __init__(self, user_ids: List[int], days: np.ndarray, sums: np.ndarray):
+        self.user_ids = list(user_ids)
+        self.index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        self.days = days
+        self.sums = sums
+
+    @classmethod
+    def load(cls, db: Session, user_ids: Iterable[int], start_date: date, end_date: date) -> "HealthAnalytics":
+        """一次查询加载一批用户在日期范围内的营养汇总"""
+        user_ids = sorted(set(user_ids))
+        query = range_query(user_ids, start_date, end_date) if user_ids else None
+        rows = db.execute(query).all() if query is not None else []
+
+        data = np.nan_to_num(np.array(rows, dtype=float).reshape(-1, len(COLUMNS) + 2))
+        positions = np.searchsorted(np.asarray(user_ids), data[:, 0].astype(int))
+        days = np.bincount(positions, weights=data[:, 1], minlength=len(user_ids))
+        sums = np.zeros((len(user_ids), len(COLUMNS)))
+        np.add.at(sums, positions, data[:, 2:])
+        return cls(user_ids, days, sums)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.sums[:, COLUMNS.index(name)]
+
+    def has_data(self) -> np.ndarray:
+        return self.days > 0
+
+    def mean(self, name: str) -> np.ndarray:
+        """有记录的天数内的日均值，无记录为0"""
+        return np.divide(self.column(name), self.days, out=np.zeros(len(self.user_ids)), where=self.has_data())
+
+    def macro_percentages(self) -> Dict[str, np.ndarray]:
+        """蛋白质、脂肪、碳水化合物的供能占比(%)"""
+        calories = {
+            "protein": self.mean("total_protein") * 4,
+            "fat": self.mean("total_fat") * 9,
+            "carbohydrates": self.mean("total_carbohydrates") * 4,
+        }
+        total = sum(calories.values())
+        return {
+            name: np.divide(value * 100, total, out=np.zeros(len(self.user_ids)), where=total > 0)
+            for name, value in calories.items()
+        }
+
+    def calorie_ratio(self, recommended_calories: np.ndarray) -> np.ndarray:
+        """日均热量 / 推荐热量"""
+        return np.divide(self.mean("total_calories"), recommended_calories,
+                         out=np.zeros(len(self.user_ids)), where=recommended_calories > 0)
+
+    def meal_count_std(self) -> np.ndarray:
+        """每日餐次的标准差：sqrt(E[x²] - E[x]²)"""
+        variance = self.mean("meal_count_sq") - self.mean("meal_count") ** 2
+        return np.sqrt(np.clip(variance, 0, None))
+
+    def nutrition_scores(self, recommended_calories: np.ndarray) -> np.ndarray:
+        """营养平衡评分（满分40），按响应中保留的精度计算"""
+        ratio = np.round(self.calorie_ratio(recommended_calories), 2)
+        percentages = {name: np.round(value, 1) for name, value in self.macro_percentages().items()}
+        fiber = np.round(self.mean("total_fiber"), 1)
+        return (
+            _band_score(ratio, [(0.9, 1.1, 15), (0.8, 1.2, 10), (0.7, 1.3, 5)])
+            + _band_score(percentages["protein"], [(15, 25, 10), (10, 30, 7), (8, 35, 4)])
+            + _band_score(percentages["fat"], [(25, 30, 10), (20, 35, 7), (15, 40, 4)])
+            + _score(fiber, (25, 20, 15), (5, 3, 1))
+        )
+
+    def regularity_scores(self) -> np.ndarray:
+        """饮食规律性评分（满分20）：平均餐次分档，每日餐次波动小再加5分"""
+        base = _score(self.mean("meal_count"), (3, 2), (15, 10))
+        base = np.where(base == 0, 5, base)
+        bonus = np.where(self.meal_count_std() <= REGULARITY_MAX_STD, 5, 0)
+        return np.where(self.has_data(), np.minimum(base + bonus, 20), 0)
+
+    def water_scores(self) -> np.ndarray:
+        """水分摄入评分（满分10）"""
+        return _score(self.mean("water_intake"), (2.0, 1.5, 1.0, 0.5), (10, 7, 4, 2))
+
+    def exercise_scores(self) -> np.ndarray:
+        """运动评分（满分10）"""
+        return _score(self.mean("exercise_calories"), (300, 200, 100, 50), (10, 7, 4, 2))
+
+    def nutrition_balances(self, recommended_calories: Mapping[int, float], start_date: date,
+                           end_date: date) -> Dict[int, dict]:
+        """批量生成营养平衡分析，返回 {user_id: 与单用户接口相同结构的结果}"""
+        recommended = np.array([recommended_calories.get(user_id, 0) for user_id in self.user_ids], dtype=float)
+        averages = {name: self.mean(column) for name, column in AVERAGE_FIELDS.items()}
+        percentages = self.macro_percentages()
+        ratio = self.calorie_ratio(recommended)
+
+        # 各条建议的触发条件（向量化），按原有顺序排列
+        rules = [
+            (ratio < 0.8, "热量摄入偏低，建议适量增加"),
+            (ratio > 1.2, "热量摄入偏高，建议适量减少"),
+            (percentages["protein"] < 10, "蛋白质摄入不足，建议增加优质蛋白质"),
+            (percentages["protein"] > 35, "蛋白质摄入过多，建议适量减少"),
+            (percentages["fat"] < 20, "脂肪摄入偏低，建议适量增加健康脂肪"),
+            (percentages["fat"] > 35, "脂肪摄入过多，建议减少饱和脂肪"),
+            (percentages["carbohydrates"] < 45, "碳水化合物摄入偏低，建议增加复合碳水"),
+            (percentages["carbohydrates"] > 65, "碳水化合物摄入过多，建议适量减少"),
+            (averages["fiber"] < 25, "膳食纤维摄入不足，建议多吃蔬菜水果"),
+            (averages["sodium"] > 2300, "钠摄入过多，建议减少盐分摄入"),
+        ]
+
+        period = {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+        results = {}
+        for i, user_id in enumerate(self.user_ids):
+            if not self.days[i]:
+                results[user_id] = {
+                    "period": dict(period),
+                    "analysis": "暂无营养数据",
+                    "recommendations": ["请记录饮食以获得营养分析"]
+                }
+                continue
+            recommendations = [message for condition, message in rules if condition[i]]
+            results[user_id] = {
+                "period": {**period, "days": int(self.days[i])},
+                "averages": {name: round(float(value[i]), 1) for name, value in averages.items()},
+                "percentages": {name: round(float(value[i]), 1) for name, value in percentages.items()},
+                "reference": {
+                    "recommended_calories": round(float(recommended[i]), 1),
+                    "calorie_ratio": round(float(ratio[i]), 2)
+                },
+                "recommendations": recommendations or ["营养平衡良好，请继续保持"]
+            }
+        return results
+
+    def nutrition_balance(self, user_id: int, recommended_calories: float, start_date: date,
+                          end_date: date) -> dict:
+        """单个用户的营养平衡分析"""
+        return self.nutrition_balances({user_id: recommended_calories}, start_date, end_date)[user_id]
+
+    def score_components(self, recommended_calories: Optional[Mapping[int, float]] = None) -> Dict[int, dict]:
+        """
+        批量计算各项评分，返回 {user_id: {"nutrition"|"regularity"|"water"|"exercise": 分数}}
+        无营养记录的用户不含任何评分项；未提供推荐热量的用户不含营养平衡评分
+        """
+        recommended_calories = recommended_calories or {}
+        recommended = np.array([recommended_calories.get(user_id, 0) for user_id in self.user_ids], dtype=float)
+        scores = {
+            "nutrition": self.nutrition_scores(recommended),
+            "regularity": self.regularity_scores(),
+            "water": self.water_scores(),
+            "exercise": self.exercise_scores(),
+        }
+        results = {}
+        for i, user_id in enumerate(self.user_ids):
+            if not self.days[i]:
+                results[user_id] = {}
+                continue
+            results[user_id] = {name: int(value[i]) for name, value in scores.items()}
+            if user_id not in recommended_calories:
+                results[user_id].pop("nutrition")
+        return results
@@ -0,0 +1,170 @@
+"""
+图片预处理工具
+上传的照片按EXIF方向摆正、去除EXIF、缩小到指定最长边并重新编码，生成存储图、缩略图与视觉模型输入图；
+解码与编码为CPU密集操作，在进程池中执行（进程池不可用时退回线程池）；
+输入可为文件流，较大的文件复制到磁盘临时文件后由工作进程按路径读取，不整体读入内存
+"""
+
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+
+from ..config.settings import get_settings
+from .streams import copy_to_named_file, stream_size
+
+settings = get_settings()
+
+# 输出格式 -> (Pillow格式名, 扩展名, Content-Type)
+IMAGE_FORMATS = {
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "webp": ("WEBP", "webp", "image/webp"),
+}
+
+
+def image_variant_specs() -> Dict[str, dict]:
+    """各图片变体的规格：最长边、输出格式与质量"""
+    return {
+        "original": {
+            "max_edge": settings.image_storage_max_edge,
+            "format": settings.image_storage_format,
+            "quality": settings.image_storage_quality,
+        },
+        "model": {
+            "max_edge": settings.image_model_max_edge,
+            "format": settings.image_model_format,
+            "quality": settings.image_model_quality,
+        },
+        "thumbnail": {
+            "max_edge": settings.image_thumbnail_max_edge,
+            "format": settings.image_thumbnail_format,
+            "quality": settings.image_thumbnail_quality,
+        },
+    }
+
+
+def image_variant_extension(variant: str) -> str:
+    """变体文件的扩展名"""
+    return IMAGE_FORMATS[image_variant_specs()[variant]["format"]][1]
+
+
+def image_variant_object_name(object_name: str, variant: str) -> str:
+    """变体在MinIO中的对象名：与原图同目录，文件名追加变体名，扩展名按变体格式"""
+    stem = object_name.rsplit(".", 1)[0] if "." in object_name.rsplit("/", 1)[-1] else object_name
+    return f"{stem}_{variant}.{image_variant_extension(variant)}"
+
+
+def _encode(image, max_edge: int, image_format: str, quality: int) -> Tuple[bytes, str, Tuple[int, int]]:
+    from PIL import Image
+
+    pil_format, _, content_type = IMAGE_FORMATS[image_format]
+    variant = image.copy()
+    variant.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    if pil_format == "JPEG" and variant.mode != "RGB":
+        variant = variant.convert("RGB")
+    buffer = io.BytesIO()
+    # 不传入exif参数，输出不含EXIF（包括GPS位置）
+    variant.save(buffer, format=pil_format, quality=quality, optimize=pil_format == "JPEG")
+    return buffer.getvalue(), content_type, variant.size
+
+
+def build_image_variants(data: Union[bytes, str, BinaryIO], specs: Dict[str, dict]) -> Dict[str, dict]:
+    """
+    生成图片变体（在工作进程中执行），data 为字节、文件路径或文件流，返回 {变体名: {"data", "content_type", "width", "height"}}
+    只解码一次；按EXIF方向摆正后去除EXIF，原图小于最长边时不放大
+    """
+    from PIL import Image, ImageOps
+
+    if isinstance(data, (bytes, bytearray)):
+        data = io.BytesIO(data)
+    elif not isinstance(data, str):
+        data.seek(0)
+    with Image.open(data) as source:
+        source.draft("RGB", (max(spec["max_edge"] for spec in specs.values()),) * 2)
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+        variants = {}
+        for name, spec in specs.items():
+            encoded, content_type, (width, height) = _encode(image, spec["max_edge"], spec["format"], spec["quality"])
+            variants[name] = {"data": encoded, "content_type": content_type, "width": width, "height": height}
+        return variants
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+# 当前进程无法创建子进程时置为True，之后直接使用线程池
+_executor_unavailable = False
+
+
+def get_image_executor() -> Optional[ProcessPoolExecutor]:
+    """获取图片处理进程池（首次调用时创建），image_process_workers 为0或进程池不可用时返回None"""
+    global _executor
+    if _executor is None and settings.image_process_workers > 0 and not _executor_unavailable:
+        # 使用spawn：在已有事件循环与线程的进程中fork可能继承被占用的锁
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.image_process_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def _run_in_process_pool(executor: ProcessPoolExecutor, data: Union[bytes, BinaryIO], specs: Dict[str, dict]):
+    """
+    在进程池中生成变体：字节直接传给工作进程；文件流不超过 upload_spool_max_size 时读为字节，
+    否则按块复制到磁盘临时文件，工作进程按路径读取
+    """
+    loop = asyncio.get_running_loop()
+    if isinstance(data, (bytes, bytearray)):
+        return await loop.run_in_executor(executor, build_image_variants, data, specs)
+    if await asyncio.to_thread(stream_size, data) <= settings.upload_spool_max_size:
+        data.seek(0)
+        small = await asyncio.to_thread(data.read)
+        data.seek(0)
+        return await loop.run_in_executor(executor, build_image_variants, small, specs)
+
+    path = await asyncio.to_thread(copy_to_named_file, data)
+    try:
+        return await loop.run_in_executor(executor, build_image_variants, path, specs)
+    finally:
+        os.unlink(path)
+
+
+async def process_image(data: Union[bytes, BinaryIO], variants: Tuple[str, ...] = None) -> Optional[Dict[str, dict]]:
+    """
+    在进程池中生成图片变体，data 为字节或可定位的文件流，variants 为空时生成全部变体；图片无法解码时返回None
+    进程池不可用时（如Celery的守护进程中不能创建子进程）在线程池中执行
+    """
+    global _executor_unavailable
+    specs = image_variant_specs()
+    if variants:
+        specs = {name: specs[name] for name in variants}
+    try:
+        executor = get_image_executor()
+        if executor is not None:
+            try:
+                return await _run_in_process_pool(executor, data, specs)
+            except BrokenProcessPool as e:
+                # 工作进程异常退出，下次调用时重建进程池，本次改用线程池
+                print(f"图片处理进程池异常: {e}")
+                shutdown_image_executor()
+            except AssertionError as e:
+                # 守护进程不能创建子进程，之后一直使用线程池
+                print(f"图片处理进程池不可用: {e}")
+                shutdown_image_executor()
+                _executor_unavailable = True
+        return await asyncio.to_thread(build_image_variants, data, specs)
+    except Exception as e:
+        print(f"图片预处理失败: {e}")
+        return None
+
+
+def shutdown_image_executor():
+    """关闭图片处理进程池（应用关闭时调用）"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
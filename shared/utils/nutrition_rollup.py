@@ -0,0 +1,180 @@
+"""
+周/月营养汇总工具
+每日营养汇总变化时在同一事务中重建所在的周、月汇总行；
+范围查询把完整的月、周用汇总行表示，只有首尾不足一周的零散日期读取每日汇总
+"""
+
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Date, cast, func, literal, or_, and_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..models.food_models import DailyNutritionSummary, NutritionRollup
+
+PERIOD_TYPES = ("week", "month")
+GRANULARITIES = ("day",) + PERIOD_TYPES
+
+# 周/月汇总中直接求和的字段（与每日汇总同名）
+SUM_FIELDS = (
+    "total_calories", "total_protein", "total_fat", "total_carbohydrates", "total_fiber", "total_sodium",
+    "meal_count", "water_intake", "exercise_calories"
+)
+
+
+def period_bounds(period_type: str, day: date) -> Tuple[date, date]:
+    """返回日期所在周（周一开始）或月的首尾日期"""
+    if period_type == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    start = day.replace(day=1)
+    next_month = (start + timedelta(days=32)).replace(day=1)
+    return start, next_month - timedelta(days=1)
+
+
+def rebuild_nutrition_rollups(db: Session, start_date: date, end_date: date, user_id: Optional[int] = None):
+    """按每日汇总重建覆盖 [start_date, end_date] 的周/月汇总，只改写有变化的行，不提交事务"""
+    table = NutritionRollup.__table__
+    daily = DailyNutritionSummary
+    for period_type in PERIOD_TYPES:
+        first_day = period_bounds(period_type, start_date)[0]
+        last_day = period_bounds(period_type, end_date)[1]
+        # PostgreSQL 的 date_trunc('week') 以周一为一周开始，与 period_bounds 一致
+        period_start = cast(func.date_trunc(period_type, daily.summary_date), Date)
+        filters = [daily.summary_date >= first_day, daily.summary_date <= last_day]
+        if user_id is not None:
+            filters.append(daily.user_id == user_id)
+
+        aggregated = select(
+            daily.user_id,
+            literal(period_type),
+            period_start,
+            func.count(daily.id),
+            *[func.coalesce(func.sum(getattr(daily, field)), 0) for field in SUM_FIELDS],
+            func.coalesce(func.sum(daily.meal_count * daily.meal_count), 0),
+            func.coalesce(func.sum(daily.health_level), 0),
+            func.count(daily.health_level)
+        ).where(*filters).group_by(daily.user_id, period_start)
+
+        value_fields = ["days_count", *SUM_FIELDS, "meal_count_sq", "health_level_total", "health_level_days"]
+        upsert = pg_insert(table).from_select(["user_id", "period_type", "period_start", *value_fields], aggregated)
+        upsert = upsert.on_conflict_do_update(
+            constraint="uq_nutrition_rollups_user_period",
+            set_={**{field: upsert.excluded[field] for field in value_fields}, "updated_at": func.now()},
+            where=or_(*[table.c[field].is_distinct_from(upsert.excluded[field]) for field in value_fields])
+        )
+        db.execute(upsert)
+
+
+def split_range(start_date: date, end_date: date, granularity: Optional[str] = None) -> List[Tuple[str, date]]:
+    """
+    把日期范围拆成尽量少的 (粒度, 起始日期) 片段：完整的月、完整的周，其余为单日
+    granularity 为 week 时不使用月汇总；为 month 时周片段不跨月，以便按月分组
+    """
+    segments = []
+    day = start_date
+    while day <= end_date:
+        week_end = day + timedelta(days=6)
+        if granularity != "week" and day.day == 1 and period_bounds("month", day)[1] <= end_date:
+            segments.append(("month", day))
+            day = period_bounds("month", day)[1] + timedelta(days=1)
+        elif day.weekday() == 0 and week_end <= end_date and \
+                (granularity != "month" or week_end <= period_bounds("month", day)[1]):
+            segments.append(("week", day))
+            day += timedelta(days=7)
+        else:
+            segments.append(("day", day))
+            day += timedelta(days=1)
+    return segments
+
+
+def _empty_totals() -> Dict[str, float]:
+    totals = {field: 0.0 for field in SUM_FIELDS}
+    totals.update(days=0, meal_count_sq=0, health_level_total=0.0, health_level_days=0)
+    return totals
+
+
+def _add_rollup(totals: dict, rollup: NutritionRollup):
+    totals["days"] += rollup.days_count or 0
+    for field in SUM_FIELDS:
+        totals[field] += float(getattr(rollup, field) or 0)
+    totals["meal_count_sq"] += rollup.meal_count_sq or 0
+    totals["health_level_total"] += float(rollup.health_level_total or 0)
+    totals["health_level_days"] += rollup.health_level_days or 0
+
+
+def _add_daily(totals: dict, summary: DailyNutritionSummary):
+    totals["days"] += 1
+    for field in SUM_FIELDS:
+        totals[field] += float(getattr(summary, field) or 0)
+    totals["meal_count_sq"] += (summary.meal_count or 0) ** 2
+    if summary.health_level is not None:
+        totals["health_level_total"] += float(summary.health_level)
+        totals["health_level_days"] += 1
+
+
+def _load_segments(db: Session, user_id: int, segments: List[Tuple[str, date]]):
+    """读取片段对应的周/月汇总行与单日汇总行"""
+    period_filters = [
+        and_(NutritionRollup.period_type == period_type,
+             NutritionRollup.period_start.in_([start for kind, start in segments if kind == period_type]))
+        for period_type in PERIOD_TYPES if any(kind == period_type for kind, _ in segments)
+    ]
+    rollups = {}
+    if period_filters:
+        rows = db.query(NutritionRollup).filter(
+            NutritionRollup.user_id == user_id,
+            or_(*period_filters)
+        ).all()
+        rollups = {(row.period_type, row.period_start): row for row in rows}
+
+    days = [start for kind, start in segments if kind == "day"]
+    dailies = {}
+    if days:
+        rows = db.query(DailyNutritionSummary).filter(
+            DailyNutritionSummary.user_id == user_id,
+            DailyNutritionSummary.summary_date.in_(days)
+        ).all()
+        dailies = {row.summary_date: row for row in rows}
+    return rollups, dailies
+
+
+def load_nutrition_series(db: Session, user_id: int, start_date: date, end_date: date,
+                          granularity: str = "day") -> List[dict]:
+    """
+    按粒度返回趋势序列，每个点包含周期起止日期、有记录的天数与各字段合计
+    周/月粒度下范围首尾不完整的周期由每日汇总补齐，无记录的周期不返回
+    """
+    if granularity == "day":
+        summaries = db.query(DailyNutritionSummary).filter(
+            DailyNutritionSummary.user_id == user_id,
+            DailyNutritionSummary.summary_date >= start_date,
+            DailyNutritionSummary.summary_date <= end_date
+        ).order_by(DailyNutritionSummary.summary_date).all()
+        points = []
+        for summary in summaries:
+            totals = _empty_totals()
+            _add_daily(totals, summary)
+            points.append({"start_date": summary.summary_date, "end_date": summary.summary_date, **totals})
+        return points
+
+    segments = split_range(start_date, end_date, granularity)
+    rollups, dailies = _load_segments(db, user_id, segments)
+    buckets: Dict[date, dict] = {}
+    for kind, start in segments:
+        totals = buckets.setdefault(period_bounds(granularity, start)[0], _empty_totals())
+        if kind == "day":
+            if start in dailies:
+                _add_daily(totals, dailies[start])
+        elif (kind, start) in rollups:
+            _add_rollup(totals, rollups[(kind, start)])
+
+    points = []
+    for bucket_start in sorted(buckets):
+        totals = buckets[bucket_start]
+        if totals["days"] == 0:
+            continue
+        bucket_end = min(period_bounds(granularity, bucket_start)[1], end_date)
+        points.append({"start_date": max(bucket_start, start_date), "end_date": bucket_end, **totals})
+    return points
@@ -0,0 +1,113 @@
+"""
+游标（Keyset）分页工具
+按排序键定位下一页，代替 OFFSET 扫描，翻页成本不随深度增长
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+from ..config.redis_config import async_cache_service
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """将排序键编码为不透明游标"""
+    payload = [
+        value.isoformat() if isinstance(value, (date, datetime)) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Tuple[Any, ...]:
+    """解析游标为排序键，格式不正确时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+    if not isinstance(payload, list) or len(payload) != len(types):
+        raise ValueError(f"无效的分页游标: {cursor}")
+
+    values = []
+    try:
+        for value, value_type in zip(payload, types):
+            # datetime 是 date 的子类，需优先判断
+            if value_type is datetime:
+                values.append(datetime.fromisoformat(value))
+            elif value_type is date:
+                values.append(date.fromisoformat(value))
+            else:
+                values.append(value_type(value))
+    except (TypeError, ValueError) as e:
+        # 元素类型或取值不正确（如 ["x", "y"]、[1, null]）
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+    return tuple(values)
+
+
+def paginate_keyset(
+        query: Query,
+        columns: Sequence[Any],
+        cursor: Optional[str],
+        page_size: int,
+        cursor_types: Sequence[type],
+        descending: bool = True
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    按 columns 做游标分页
+
+    columns 必须组成唯一的排序键（通常以主键收尾），cursor 为空时返回第一页。
+    返回 (当前页记录, 下一页游标)，没有更多数据时下一页游标为 None。
+    """
+    if cursor:
+        cursor_values = decode_cursor(cursor, cursor_types)
+        row_key = tuple_(*columns)
+        if descending:
+            query = query.filter(row_key < tuple_(*cursor_values))
+        else:
+            query = query.filter(row_key > tuple_(*cursor_values))
+
+    order_by = [column.desc() if descending else column.asc() for column in columns]
+    # 多取一条用于判断是否还有下一页
+    rows = query.order_by(*order_by).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+
+    return rows, next_cursor
+
+
+def filter_signature(**filters: Any) -> str:
+    """根据筛选条件生成稳定的签名，用于缓存列表总数"""
+    return json.dumps(
+        {k: (v.isoformat() if isinstance(v, (date, datetime)) else v) for k, v in sorted(filters.items())},
+        separators=(",", ":"),
+        ensure_ascii=False
+    )
+
+
+async def cached_total(query: Query, user_id: int, scope: str, signature: str) -> int:
+    """获取列表总数，优先读取缓存，未命中时执行 COUNT 并写入缓存"""
+    try:
+        total = await async_cache_service.get_list_total(user_id, scope, signature)
+        if total is not None:
+            return int(total)
+    except Exception as e:
+        print(f"读取列表总数缓存失败: {e}")
+
+    total = query.count()
+
+    try:
+        await async_cache_service.cache_list_total(user_id, scope, signature, total)
+    except Exception as e:
+        print(f"写入列表总数缓存失败: {e}")
+    return total
@@ -0,0 +1,60 @@
+"""
+文件流工具
+按块读取、统计大小与增量base64编码，避免把整个文件读入内存
+"""
+
+import base64
+import os
+import tempfile
+from typing import BinaryIO, Iterable, Iterator
+
+# 默认读取块大小，为3的倍数，便于按块进行base64编码
+DEFAULT_CHUNK_SIZE = 255 * 1024
+
+
+def stream_size(stream: BinaryIO) -> int:
+    """获取可定位流的字节数，读取位置重置到开头"""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def iter_chunks(stream: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """从当前位置按块读取流"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def b64encode_chunks(chunks: Iterable[bytes]) -> str:
+    """增量base64编码：每次只编码3字节整数倍的部分，余下字节并入下一块"""
+    encoded = []
+    remainder = b""
+    for chunk in chunks:
+        data = remainder + chunk if remainder else chunk
+        cut = len(data) - len(data) % 3
+        if cut:
+            encoded.append(base64.b64encode(data[:cut]).decode("ascii"))
+        remainder = data[cut:]
+    if remainder:
+        encoded.append(base64.b64encode(remainder).decode("ascii"))
+    return "".join(encoded)
+
+
+def b64encode_stream(stream: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """从开头增量编码整个流"""
+    stream.seek(0)
+    return b64encode_chunks(iter_chunks(stream, chunk_size))
+
+
+def copy_to_named_file(stream: BinaryIO, suffix: str = "", chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """按块把整个流复制到磁盘上的临时文件（供其他进程按路径读取），返回路径，调用方负责删除"""
+    stream.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        for chunk in iter_chunks(stream, chunk_size):
+            f.write(chunk)
+    stream.seek(0)
+    return f.name
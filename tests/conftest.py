@@ -0,0 +1,43 @@
+"""测试公共夹具"""
+
+import hashlib
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from shared.config.settings import settings
+
+
+class HashEmbeddings(Embeddings):
+    """按文本哈希生成的确定性向量，用于不依赖外部模型的知识库测试"""
+
+    def embed_documents(self, texts):
+        return [[byte / 255 for byte in hashlib.sha256(text.encode("utf-8")).digest()[:16]] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def knowledge_base(tmp_path, monkeypatch):
+    """临时目录中的向量集合与BM25索引，向量模型为 HashEmbeddings，不更新Redis中的集合版本"""
+    from agents.common_utils import embedding_utils, rag_ingest, rag_utils
+
+    monkeypatch.setattr(settings, "VECTOR_STORE_PATH", str(tmp_path / "vector_store"))
+    monkeypatch.setattr(settings, "VECTOR_COLLECTION_NAME", "test_collection")
+    monkeypatch.setattr(settings, "EMBEDDINGS_CACHE", "none")
+    monkeypatch.setattr(settings, "RAG_INGEST_MANIFEST", None)
+    monkeypatch.setattr(settings, "RAG_BM25_INDEX_PATH", None)
+    monkeypatch.setattr(embedding_utils, "create_base_embeddings", lambda provider, model_name=None: HashEmbeddings())
+
+    bumps = []
+
+    async def bump_version():
+        bumps.append(True)
+
+    monkeypatch.setattr(rag_ingest, "bump_version", bump_version)
+    embedding_utils.get_embeddings.cache_clear()
+    rag_utils.rag_loader.cache_clear()
+    yield bumps
+    embedding_utils.get_embeddings.cache_clear()
+    rag_utils.rag_loader.cache_clear()
@@ -0,0 +1,57 @@
+"""每日营养汇总的 INSERT ... ON CONFLICT DO UPDATE 语句"""
+
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+import routers.food_router as food_router
+from routers.food_router import DAILY_SUMMARY_FIELDS, daily_summary_upsert
+
+
+def compile_sql(stmt):
+    compiled = stmt.compile(dialect=postgresql.dialect())
+    return " ".join(str(compiled).split()), compiled.params
+
+
+def test_accumulate_adds_excluded_values_to_existing_row():
+    sql, params = compile_sql(daily_summary_upsert(1, date(2024, 5, 1), {"total_calories": -120, "meal_count": -1},
+                                                   accumulate=True))
+    assert "ON CONFLICT ON CONSTRAINT uq_daily_summaries_user_date DO UPDATE" in sql
+    assert "total_calories = (coalesce(daily_nutrition_summaries.total_calories," in sql
+    assert "+ excluded.total_calories" in sql
+    assert "+ excluded.meal_count" in sql
+    assert "updated_at = now()" in sql
+    assert params["total_calories"] == -120 and params["meal_count"] == -1
+
+
+def test_overwrite_replaces_existing_values():
+    values = {field: 1 for field in [*DAILY_SUMMARY_FIELDS, "meal_count"]}
+    sql, _ = compile_sql(daily_summary_upsert(1, date(2024, 5, 1), values, accumulate=False))
+    assert "ON CONFLICT ON CONSTRAINT uq_daily_summaries_user_date DO UPDATE" in sql
+    for field in values:
+        assert f"{field} = excluded.{field}" in sql
+    assert "coalesce" not in sql
+    # 只写入模型中存在的列
+    assert "health_score" not in sql
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, stmt):
+        self.statements.append(stmt)
+
+
+def test_apply_delta_subtracts_detail_values(monkeypatch):
+    monkeypatch.setattr(food_router, "rebuild_nutrition_rollups", lambda *args: None)
+    nutrition = SimpleNamespace(calories=300, protein=10, fat=None, carbohydrates=40, dietary_fiber=2, sodium=500)
+    db = RecordingSession()
+    asyncio.run(food_router.apply_daily_nutrition_delta(1, date(2024, 5, 1), nutrition, db, sign=-1))
+
+    _, params = compile_sql(db.statements[0])
+    assert params["total_calories"] == -300
+    assert params["total_fat"] == 0
+    assert params["meal_count"] == -1
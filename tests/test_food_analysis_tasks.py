@@ -0,0 +1,56 @@
+"""图片分析任务：丢失任务的恢复与重新提交失败时的状态恢复"""
+
+import asyncio
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import routers.food_router as food_router
+from shared.models.database import Base
+from shared.models.food_models import FoodRecord
+from shared.models.user_models import User
+from shared.tasks.food_analysis_tasks import reset_stale_analyses
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[User.__table__, FoodRecord.__table__])
+    with Session(engine) as session:
+        yield session
+
+
+def record(status, updated_at, **values):
+    return FoodRecord(user_id=1, record_date=date(2024, 5, 1), meal_type=1, analysis_status=status,
+                      updated_at=updated_at, **values)
+
+
+def test_reset_stale_analyses_only_touches_old_in_progress_records(db):
+    now = datetime.utcnow()
+    stale, fresh, done = record(2, now - timedelta(hours=1)), record(2, now), record(3, now - timedelta(hours=1))
+    db.add_all([stale, fresh, done])
+    db.flush()
+
+    assert reset_stale_analyses(db, 1800) == [stale.id]
+    db.expire_all()
+    assert [stale.analysis_status, fresh.analysis_status, done.analysis_status] == [1, 2, 3]
+
+
+def test_retry_resets_status_when_enqueue_fails(db, monkeypatch):
+    food_record = record(1, datetime.utcnow(), image_url="food_images/1/1.jpg")
+    db.add(food_record)
+    db.commit()
+
+    def broker_down(record_id, user_id):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(food_router, "enqueue_food_analysis", broker_down)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(food_router.retry_food_record_analysis(food_record.id, SimpleNamespace(id=1), db))
+    assert error.value.status_code == 500
+    db.expire_all()
+    assert food_record.analysis_status == 1
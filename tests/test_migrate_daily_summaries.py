@@ -0,0 +1,62 @@
+"""每日营养汇总去重迁移：合并重复行"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import MetaData, create_engine
+from sqlalchemy.orm import Session
+
+from shared.models.food_models import DailyNutritionSummary
+from shared.models.user_models import User
+from shared.tasks.migrate_daily_summaries import collapse_duplicate_summaries
+
+
+@pytest.fixture
+def db():
+    """没有唯一约束的早期版本每日汇总表"""
+    metadata = MetaData()
+    User.__table__.to_metadata(metadata)
+    table = DailyNutritionSummary.__table__.to_metadata(metadata)
+    table.constraints = {
+        constraint for constraint in table.constraints if constraint.name != "uq_daily_summaries_user_date"
+    }
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def summary(user_id, day, updated_at, **values):
+    return DailyNutritionSummary(user_id=user_id, summary_date=day, updated_at=updated_at, created_at=updated_at,
+                                 **values)
+
+
+def test_collapse_keeps_latest_row_and_largest_manual_values(db):
+    day = date(2024, 5, 1)
+    db.add_all([
+        summary(1, day, datetime(2024, 5, 1, 8), total_calories=800, water_intake=Decimal("1.5"),
+                exercise_calories=300, health_level=Decimal("0.8")),
+        summary(1, day, datetime(2024, 5, 1, 9), total_calories=500, water_intake=Decimal("0.5"),
+                exercise_calories=0, health_level=None),
+        summary(1, date(2024, 5, 2), datetime(2024, 5, 2, 8), total_calories=300),
+        summary(2, day, datetime(2024, 5, 1, 8), total_calories=100),
+    ])
+    db.flush()
+    latest_id = db.query(DailyNutritionSummary.id).filter_by(user_id=1, summary_date=day, total_calories=500).scalar()
+
+    assert collapse_duplicate_summaries(db) == [(1, day)]
+
+    rows = db.query(DailyNutritionSummary).filter_by(user_id=1, summary_date=day).all()
+    assert [row.id for row in rows] == [latest_id]
+    assert rows[0].water_intake == Decimal("1.5")
+    assert rows[0].exercise_calories == 300
+    assert rows[0].health_level == Decimal("0.8")
+    assert db.query(DailyNutritionSummary).count() == 3
+
+
+def test_collapse_without_duplicates_changes_nothing(db):
+    db.add(summary(1, date(2024, 5, 1), datetime(2024, 5, 1, 8), total_calories=800))
+    db.flush()
+    assert collapse_duplicate_summaries(db) == []
+    assert db.query(DailyNutritionSummary).count() == 1
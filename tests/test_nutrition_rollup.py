@@ -0,0 +1,61 @@
+"""周/月营养汇总：周期边界与日期范围拆分"""
+
+from datetime import date, timedelta
+
+import pytest
+
+from shared.utils.nutrition_rollup import period_bounds, split_range
+
+
+def expand(segments):
+    """把片段展开为逐日日期，用于检查片段无重叠、无遗漏"""
+    days = []
+    for kind, start in segments:
+        end = start if kind == "day" else period_bounds(kind, start)[1]
+        days.extend(start + timedelta(days=i) for i in range((end - start).days + 1))
+    return days
+
+
+def test_period_bounds():
+    # 2024-05-01 为周三
+    assert period_bounds("week", date(2024, 5, 1)) == (date(2024, 4, 29), date(2024, 5, 5))
+    assert period_bounds("month", date(2024, 2, 15)) == (date(2024, 2, 1), date(2024, 2, 29))
+    assert period_bounds("month", date(2024, 12, 31)) == (date(2024, 12, 1), date(2024, 12, 31))
+
+
+def test_split_range_uses_months_weeks_and_days():
+    assert split_range(date(2024, 4, 25), date(2024, 5, 5)) == [
+        ("day", date(2024, 4, 25)), ("day", date(2024, 4, 26)), ("day", date(2024, 4, 27)),
+        ("day", date(2024, 4, 28)), ("week", date(2024, 4, 29)),
+    ]
+    assert split_range(date(2024, 5, 1), date(2024, 6, 12)) == [
+        ("month", date(2024, 5, 1)),
+        ("day", date(2024, 6, 1)), ("day", date(2024, 6, 2)),
+        ("week", date(2024, 6, 3)),
+        ("day", date(2024, 6, 10)), ("day", date(2024, 6, 11)), ("day", date(2024, 6, 12)),
+    ]
+
+
+@pytest.mark.parametrize("granularity", [None, "week", "month"])
+@pytest.mark.parametrize("start, end", [
+    (date(2024, 4, 25), date(2024, 6, 12)),
+    (date(2024, 1, 1), date(2024, 12, 31)),
+    (date(2024, 2, 28), date(2024, 3, 4)),
+    (date(2024, 5, 6), date(2024, 5, 6)),
+])
+def test_split_range_covers_each_day_once(granularity, start, end):
+    segments = split_range(start, end, granularity)
+    assert expand(segments) == [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    if granularity == "week":
+        assert all(kind != "month" for kind, _ in segments)
+    if granularity == "month":
+        # 周片段不跨月，才能按月分组
+        assert all(period_bounds("week", start)[1].month == start.month for kind, start in segments if kind == "week")
+
+
+def test_split_range_month_granularity_keeps_weeks_within_month():
+    # 2024-04-29 所在周跨到5月，按月分组时拆为单日
+    segments = split_range(date(2024, 4, 29), date(2024, 5, 12), "month")
+    assert ("week", date(2024, 4, 29)) not in segments
+    assert ("week", date(2024, 5, 6)) in segments
+    assert ("week", date(2024, 4, 29)) in split_range(date(2024, 4, 29), date(2024, 5, 12), "week")
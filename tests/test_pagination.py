@@ -0,0 +1,74 @@
+"""游标分页：游标编解码与按排序键翻页"""
+
+import base64
+import json
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import Column, Date, Integer, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from shared.utils.pagination import decode_cursor, encode_cursor, paginate_keyset
+
+Base = declarative_base()
+
+
+class Record(Base):
+    __tablename__ = "records"
+    id = Column(Integer, primary_key=True)
+    record_date = Column(Date, nullable=False)
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    values = (datetime(2024, 5, 1, 12, 30), date(2024, 5, 1), 42)
+    cursor = encode_cursor(values)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, (datetime, date, int)) == values
+
+
+@pytest.mark.parametrize("cursor", [
+    "不是base64",
+    raw_cursor({"id": 1}),
+    raw_cursor([1]),
+    raw_cursor(["x", "y"]),
+    raw_cursor([None, 1]),
+    raw_cursor(["2024-05-01", [1]]),
+    raw_cursor(["2024-13-01", 1]),
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match="无效的分页游标"):
+        decode_cursor(cursor, (date, int))
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        # 每天两条记录，排序键 (record_date, id) 中日期有重复
+        session.add_all([Record(id=i, record_date=date(2024, 5, 1 + (i - 1) // 2)) for i in range(1, 8)])
+        session.commit()
+        yield session
+
+
+@pytest.mark.parametrize("descending", [True, False])
+def test_paginate_keyset_visits_every_row_once(db, descending):
+    columns = [Record.record_date, Record.id]
+    seen, cursor = [], None
+    while True:
+        rows, cursor = paginate_keyset(db.query(Record), columns, cursor, 3, (date, int), descending)
+        seen.extend(row.id for row in rows)
+        if cursor is None:
+            break
+    expected = sorted(range(1, 8), key=lambda i: ((i - 1) // 2, i), reverse=descending)
+    assert seen == expected
+
+
+def test_last_full_page_has_no_next_cursor(db):
+    rows, cursor = paginate_keyset(db.query(Record), [Record.record_date, Record.id], None, 7, (date, int))
+    assert len(rows) == 7
+    assert cursor is None
@@ -0,0 +1,51 @@
+"""营养知识检索缓存：查询标识的规范化与食物清单解析"""
+
+from types import SimpleNamespace
+
+from agents.common_utils.rag_cache import (
+    RetrievalCache, food_items_identity, normalize_text, parse_food_names, text_identity
+)
+from agents.nutrition_agent.utils.nodes import retrieval_identity
+
+DESCRIPTION = """**食物清单**：米饭、红烧肉（约150克）、清炒青菜。
+1. **米饭**：一碗白米饭，约200克。
+2. **红烧肉**：色泽红亮，肥瘦相间。"""
+
+
+def test_normalize_text_ignores_width_case_and_punctuation():
+    assert normalize_text("Ｃoca-Cola， 可乐！") == normalize_text("coca cola可乐") == "cocacola可乐"
+
+
+def test_food_items_identity_ignores_order_duplicates_and_close_values():
+    first = food_items_identity(["红烧肉", "米饭", "米饭 "], 512, {"protein": 21, "fat": 30})
+    second = food_items_identity(["米饭", "红烧肉"], 538, {"fat": 28, "protein": 19})
+    assert first == second
+    assert food_items_identity(["米饭", "红烧肉"], 720) != food_items_identity(["米饭", "红烧肉"], 512)
+
+
+def test_parse_food_names():
+    assert parse_food_names(DESCRIPTION) == ["米饭", "红烧肉", "清炒青菜"]
+    assert parse_food_names("食物清单: Rice, Egg / Milk") == ["Rice", "Egg", "Milk"]
+    assert parse_food_names("1. 米饭\n2. 红烧肉") == []
+
+
+def test_parallel_retrieval_keys_on_food_names_not_description():
+    reworded = DESCRIPTION.replace("一碗白米饭，约200克", "一小碗米饭")
+    reordered = "食物清单：清炒青菜、米饭、红烧肉\n三道家常菜。"
+    identity = retrieval_identity({"image_analysis": DESCRIPTION, "nutrition_analysis": None})
+    assert identity == {"items": ["清炒青菜", "米饭", "红烧肉"]}
+    assert retrieval_identity({"image_analysis": reworded}) == identity
+    assert retrieval_identity({"image_analysis": reordered}) == identity
+
+
+def test_retrieval_identity_fallbacks():
+    analysis = SimpleNamespace(food_items=["米饭"], total_calories=230, macronutrients={"protein": 4})
+    assert retrieval_identity({"image_analysis": DESCRIPTION, "nutrition_analysis": analysis}) == \
+        food_items_identity(["米饭"], 230, {"protein": 4})
+    assert retrieval_identity({"image_analysis": "一碗米饭"}) == text_identity("一碗米饭")
+
+
+def test_cache_namespace_includes_version_and_variant():
+    cache = RetrievalCache(None, "7", "nutrition", "hybrid")
+    assert cache.key({"items": ["米饭"]}, 2).startswith("rag:retrieval:nutrition:7:hybrid:k2:")
+    assert cache.key({"items": ["米饭"]}, 2) != RetrievalCache(None, "8", "nutrition", "hybrid").key({"items": ["米饭"]}, 2)
@@ -0,0 +1,101 @@
+"""混合检索：分词、BM25索引的构建与原子保存、倒数排名融合与重排序"""
+
+import os
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from agents.common_utils.rag_hybrid import (
+    BM25Index, coverage_scores, fuse_and_rerank, get_bm25_index, reciprocal_rank_fusion, tokenize
+)
+from agents.common_utils.rag_utils import SearchHit
+from shared.config.settings import settings
+
+DOCUMENTS = {
+    "rice": "米饭是主要的碳水化合物来源，每100克约116大卡。",
+    "egg": "鸡蛋富含优质蛋白质，每个约70大卡。",
+    "salt": "成年人每天食盐不超过5克。",
+}
+
+
+@pytest.fixture
+def index():
+    return BM25Index.build(list(DOCUMENTS), list(DOCUMENTS.values()))
+
+
+def test_tokenize_uses_cjk_unigrams_bigrams_and_ascii_words():
+    assert tokenize("鸡蛋 Protein 5.5克") == ["鸡", "蛋", "鸡蛋", "protein", "5.5", "克"]
+
+
+def test_bm25_ranks_documents_containing_query_terms(index):
+    hits = index.search("鸡蛋蛋白质", 3)
+    assert hits[0][0] == "egg"
+    assert all(score > 0 for _, score in hits)
+    assert index.search("咖啡因", 3) == []
+    # 出现在较少文档中的词权重更高
+    assert index.idf("鸡蛋") > index.idf("大卡")
+
+
+def test_save_swaps_directory_atomically_and_loads_memory_mapped(index, tmp_path):
+    path = str(tmp_path / "bm25")
+    index.save(path)
+    first = os.path.realpath(path)
+    loaded = BM25Index.load(path)
+    assert isinstance(loaded.postings, np.memmap)
+    assert loaded.search("食盐", 1) == index.search("食盐", 1)
+
+    BM25Index.build(["tea"], ["绿茶含有咖啡因。"]).save(path)
+    assert os.path.islink(path)
+    assert os.path.realpath(path) != first and not os.path.exists(first)
+    assert BM25Index.load(path).ids == ["tea"]
+    assert [entry for entry in os.listdir(tmp_path) if not entry.startswith(".bm25-")] == ["bm25"]
+
+
+def test_save_replaces_index_written_as_plain_directory(index, tmp_path):
+    path = tmp_path / "bm25"
+    path.mkdir()
+    (path / "meta.json").write_text("{}")
+    index.save(str(path))
+    assert os.path.islink(path)
+    assert BM25Index.load(str(path)).ids == list(DOCUMENTS)
+
+
+def test_get_bm25_index_does_not_build_on_the_request_path(index, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_BM25_INDEX_PATH", str(tmp_path / "bm25"))
+    assert get_bm25_index() is None
+    assert not os.path.exists(tmp_path / "bm25")
+
+    index.save(str(tmp_path / "bm25"))
+    assert get_bm25_index().ids == list(DOCUMENTS)
+    BM25Index.build(["tea"], ["绿茶含有咖啡因。"]).save(str(tmp_path / "bm25"))
+    # 重新导入后按新目录重新加载
+    assert get_bm25_index().ids == ["tea"]
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], rrf_k=60)
+    assert list(fused) == ["b", "a", "d", "c"]
+    assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+
+
+def test_coverage_scores_weight_terms_by_idf(index):
+    scores = coverage_scores(index, "鸡蛋热量", list(DOCUMENTS.values()))
+    assert scores[1] == max(scores) and scores[2] == 0
+    assert coverage_scores(None, "", ["任何内容"]) == [0.0]
+
+
+def test_fuse_and_rerank_combines_rankings_and_filters_low_scores(index, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_RERANKER", "overlap")
+    monkeypatch.setattr(settings, "RAG_RERANK_WEIGHT", 0.5)
+    monkeypatch.setattr(settings, "RAG_RERANK_MIN_SCORE", 0.0)
+    documents = {doc_id: Document(page_content=text) for doc_id, text in DOCUMENTS.items()}
+    vector_hits = [SearchHit(doc_id, documents[doc_id], 0.1) for doc_id in ("rice", "salt", "egg")]
+    keyword_hits = index.search("鸡蛋蛋白质", 3)
+
+    results = fuse_and_rerank(index, "鸡蛋蛋白质", vector_hits, keyword_hits, documents, 2)
+    assert [document.page_content for document in results] == [DOCUMENTS["egg"], DOCUMENTS["rice"]]
+
+    monkeypatch.setattr(settings, "RAG_RERANK_MIN_SCORE", 0.9)
+    assert fuse_and_rerank(index, "鸡蛋蛋白质", vector_hits, keyword_hits, documents, 2) == \
+        [documents["egg"]]
@@ -0,0 +1,97 @@
+"""营养知识库导入：OCR文本清洗、切块去重与按清单增量导入"""
+
+import json
+import os
+
+import pytest
+
+from agents.common_utils import rag_ingest
+from agents.common_utils.rag_ingest import chunk_text, clean_lines, ingest, is_spaced_line, manifest_path, split_sections
+
+OCR_TEXT = """中国居民膳食指南（2022）
+中 国 居 民 膳 食 指 南 (2022)
+食物多样，合理搭配
+食 物 多 样 , 合 理 搭 配
+群
+平衡膳食能最大程度满足人体正常生长发育、免疫力和生理
+功能的需要。
+每天的膳食应包括谷薯类、蔬菜水果、畜禽鱼蛋奶和豆类食物。
+吃动平衡，健康体重
+各年龄段人群都应天天进行身体活动，保持健康体重。
+"""
+
+
+def test_is_spaced_line():
+    assert is_spaced_line("中 国 居 民 膳 食 指 南 (2022)")
+    assert not is_spaced_line("与 2016 版中国居民膳食指南相比，2022 版膳食指南")
+    assert not is_spaced_line("Dietary Guidelines for Chinese")
+
+
+def test_clean_lines_drops_spaced_duplicates_and_fragments():
+    lines = list(clean_lines("中 国 居 民 膳 食 指 南\n群\n每天 饮水 1500 毫升。\n 少盐少油。"))
+    assert lines == ["每天饮水 1500 毫升。", "少盐少油。"]
+
+
+def test_split_sections_merges_broken_lines_under_headings():
+    sections = split_sections(OCR_TEXT)
+    # 以句末标点结尾的首行（标题带括号）作为无标题的段落保留
+    assert [section["heading"] for section in sections] == ["", "食物多样,合理搭配", "吃动平衡,健康体重"]
+    assert sections[1]["text"].split("\n\n") == [
+        "平衡膳食能最大程度满足人体正常生长发育、免疫力和生理功能的需要。",
+        "每天的膳食应包括谷薯类、蔬菜水果、畜禽鱼蛋奶和豆类食物。",
+    ]
+
+
+def test_chunk_text_keeps_one_copy_of_repeated_content():
+    text = """食物多样，合理搭配
+每天的膳食应包括谷薯类、蔬菜水果、畜禽鱼蛋奶和豆类食物。
+平均每天摄入12种以上食物。
+每天的膳食应包括谷薯类、蔬菜水果、畜禽鱼蛋奶和豆类食物。
+"""
+    chunks = chunk_text(text, "kb.txt", chunk_size=40, chunk_overlap=0)
+    assert [chunk.text for chunk in chunks] == [
+        "食物多样,合理搭配\n每天的膳食应包括谷薯类、蔬菜水果、畜禽鱼蛋奶和豆类食物。",
+        "食物多样,合理搭配\n平均每天摄入12种以上食物。",
+    ]
+    assert [chunk.metadata["chunk_index"] for chunk in chunks] == [0, 1]
+    assert len({chunk.id for chunk in chunks}) == 2
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_ingest_only_writes_changed_chunks(knowledge_base, tmp_path):
+    source = write(tmp_path / "kb.txt", OCR_TEXT)
+    first = ingest([source])
+    assert first["rebuild"] and first["added"] == first["chunks"] > 0
+    assert os.path.exists(os.path.join(os.path.dirname(manifest_path()), "bm25", "meta.json"))
+
+    second = ingest([source])
+    assert (second["added"], second["deleted"], second["rebuild"]) == (0, 0, False)
+    assert len(knowledge_base) == 1
+
+    write(tmp_path / "kb.txt", OCR_TEXT.replace("保持健康体重。", "减少久坐时间。"))
+    assert ingest([source], dry_run=True)["added"] == 1
+    third = ingest([source])
+    assert (third["added"], third["deleted"]) == (1, 1)
+    assert len(knowledge_base) == 2
+    assert rag_ingest.rag_loader()._collection.count() == third["chunks"]
+
+    with open(manifest_path(), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert len(manifest["files"][os.path.relpath(source)]["chunks"]) == third["chunks"]
+
+
+def test_manifest_is_saved_after_the_bm25_index(knowledge_base, tmp_path, monkeypatch):
+    source = write(tmp_path / "kb.txt", OCR_TEXT)
+
+    def fail(vectorstore):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(rag_ingest, "build_bm25_index", fail)
+    with pytest.raises(OSError):
+        ingest([source])
+    # 清单未写入，下次导入重新计算差异并重建索引
+    assert not os.path.exists(manifest_path())